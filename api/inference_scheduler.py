@@ -0,0 +1,108 @@
+import asyncio
+import os
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, Optional, Set, Tuple
+
+from sailor import SailorEngine
+from api.metrics import scheduler_batch_size, scheduler_queue_depth
+
+_MAX_WAIT_MS = float(os.getenv("SAILOR_BATCH_MAX_WAIT_MS", "2"))
+_MAX_BATCH_SIZE = int(os.getenv("SAILOR_BATCH_MAX_SIZE", "64"))
+_MAX_WORKERS = int(os.getenv("SAILOR_INFERENCE_WORKERS", "4"))
+
+_BatchKey = Tuple[int, Optional[int], str]
+
+class _PendingBatch:
+    def __init__(self, model: SailorEngine, top_k: Optional[int], method: str):
+        self.model = model
+        self.top_k = top_k
+        self.method = method
+        self.queries: List[str] = []
+        self.futures: List[asyncio.Future] = []
+        self.timer: Optional[asyncio.TimerHandle] = None
+
+class InferenceScheduler:
+    """
+    Collects single queries arriving within a short window and runs them as one
+    `predict_batch` call on a worker thread, keeping sklearn off the event loop.
+    `method` names another batch method of the engine with the same signature.
+    """
+
+    def __init__(self,
+                 max_wait_ms: float = _MAX_WAIT_MS,
+                 max_batch_size: int = _MAX_BATCH_SIZE,
+                 max_workers: int = _MAX_WORKERS,
+                ):
+        self.max_wait = max_wait_ms / 1000
+        self.max_batch_size = max_batch_size
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="sailor-inference")
+        self._pending: Dict[_BatchKey, _PendingBatch] = {}
+        # Running batches, the loop only keeps weak references to its tasks
+        self._tasks: Set[asyncio.Task] = set()
+        self._queued = 0
+
+    async def predict(self,
+                      model: SailorEngine,
+                      query: str,
+                      top_k: Optional[int] = None,
+                      method: str = "predict_batch",
+                     ) -> Any:
+        loop = asyncio.get_running_loop()
+        key = (id(model), top_k, method)
+
+        batch = self._pending.get(key)
+        if batch is None:
+            batch = _PendingBatch(model, top_k, method)
+            batch.timer = loop.call_later(self.max_wait, self._flush, key)
+            self._pending[key] = batch
+
+        future = loop.create_future()
+        batch.queries.append(query)
+        batch.futures.append(future)
+        self._queued += 1
+        scheduler_queue_depth.set(self._queued)
+
+        if len(batch.queries) >= self.max_batch_size:
+            self._flush(key)
+
+        return await future
+
+    async def predict_batch(self,
+                            model: SailorEngine,
+                            queries: List[str],
+                            top_k: Optional[int] = None,
+                            method: str = "predict_batch",
+                           ) -> List[Any]:
+        scheduler_batch_size.observe(len(queries), method=method)
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, getattr(model, method), queries, top_k)
+
+    async def run(self, fn: Callable[..., Any], *args: Any) -> Any:
+        """Run any other model work, e.g. building an index, on the inference workers"""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, fn, *args)
+
+    def _flush(self, key: _BatchKey):
+        batch = self._pending.pop(key, None)
+        if batch is None: return
+        if batch.timer is not None:
+            batch.timer.cancel()
+        self._queued -= len(batch.queries)
+        scheduler_queue_depth.set(self._queued)
+        task = asyncio.ensure_future(self._run(batch))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _run(self, batch: _PendingBatch):
+        try:
+            results = await self.predict_batch(batch.model, batch.queries, batch.top_k, batch.method)
+        except Exception as e:
+            for future in batch.futures:
+                if not future.done(): future.set_exception(e)
+            return
+
+        for future, result in zip(batch.futures, results):
+            if not future.done(): future.set_result(result)
+
+    def shutdown(self):
+        self._executor.shutdown(wait=True)
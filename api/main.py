@@ -1,33 +1,194 @@
+import time
 import uvicorn
-import asyncio
-from fastapi import FastAPI
-from pydantic import BaseModel
+from contextlib import asynccontextmanager
+from typing import List, Literal, Optional
+from fastapi import FastAPI, HTTPException
+from fastapi.responses import PlainTextResponse
+from pydantic import BaseModel, Field
 
-from api.models_loader import SearchModelLoader
+from sailor import SailorEngine, TypeaheadState
+from sailor.instrumentation import set_stage_observer
+from sailor.types import RouteContextResult
+from api.models_loader import SearchModelLoader, model_id, _SVC_MODEL, _KNN_MODEL, _CASCADE_MODEL
+from api.inference_scheduler import InferenceScheduler
+from api.metrics import registry, stage_seconds, cache_hit_ratio, cache_size
+from api.profiler import SamplingProfiler
+from api.result_cache import QueryResultCache, SessionStateCache
 
-app = FastAPI()
-model_loader = SearchModelLoader()
+result_cache = QueryResultCache()
+session_states = SessionStateCache(ttl_seconds=60, name="sessions")
+model_loader = SearchModelLoader(cache=result_cache)
+scheduler = InferenceScheduler()
+profiler = SamplingProfiler()
+
+def _observe_stage(engine: str, stage: str, seconds: float):
+    stage_seconds.observe(seconds, engine=engine, stage=stage)
+
+set_stage_observer(_observe_stage)
+
+@asynccontextmanager
+async def lifespan(_: FastAPI):
+    await model_loader.preload_models()
+    model_loader.start_watching()
+    yield
+    await model_loader.stop_watching()
+    profiler.stop()
+    scheduler.shutdown()
+
+app = FastAPI(lifespan=lifespan)
+
+_ENGINE_MODELS = {"svc": _SVC_MODEL, "knn": _KNN_MODEL}
 
 class QueryRequest(BaseModel):
     query: str
+    top_k: Optional[int] = Field(default=None, gt=0)
+    context: Optional[str] = Field(default=None, description="Tenant context hash, default models when empty")
+
+class BatchQueryRequest(BaseModel):
+    queries: List[str]
+    engine: Literal["svc", "knn"] = "svc"
+    top_k: Optional[int] = Field(default=None, gt=0)
+    context: Optional[str] = Field(default=None, description="Tenant context hash, default models when empty")
+
+class TypeaheadRequest(BaseModel):
+    query: str
+    engine: Literal["svc", "knn"] = "svc"
+    top_k: int = Field(default=10, gt=0)
+    context: Optional[str] = Field(default=None, description="Tenant context hash, default models when empty")
+    session_id: Optional[str] = Field(default=None, description="Client typing session, reuses the previous keystroke")
 
 class RoutePrediction(BaseModel):
     id: str
     path: str
 
+def _to_predictions(model: SailorEngine, routes: List[RouteContextResult]) -> List[RoutePrediction]:
+    with stage_seconds.time(engine=type(model).__name__, stage="serialize"):
+        return [RoutePrediction(id=route.id, path=route.path) for route in routes]
+
+async def _load_model(model_name: str, context: Optional[str]) -> SailorEngine:
+    start = time.perf_counter()
+    try:
+        model = await model_loader.load(model_name, context)
+    except (FileNotFoundError, ValueError) as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    stage_seconds.observe(time.perf_counter() - start, engine=type(model).__name__, stage="lookup")
+    return model
+
+async def _predict(model_name: str, request: QueryRequest):
+    model = await _load_model(model_name, request.context)
+    key = result_cache.key(model_id((request.context, model_name)), model.version, request.query, request.top_k)
+    predictions = result_cache.get(key)
+    if predictions is None:
+        routes = await scheduler.predict(model, request.query, top_k=request.top_k)
+        predictions = _to_predictions(model, routes)
+        result_cache.set(key, predictions)
+    return predictions
+
 @app.post("/predict/svc")
 async def predict_svc(request: QueryRequest):
-    model = await model_loader.load_svc()
-    predictions = model.predict(request.query)
-    return {"predictions": [RoutePrediction(id=route.id, path=route.path) for route in predictions]}
+    predictions = await _predict(_SVC_MODEL, request)
+    return {"predictions": predictions}
 
 @app.post("/predict/knn")
 async def predict_knn(request: QueryRequest):
-    model = await model_loader.load_knn()
-    predictions = model.predict(request.query)
-    return {"predictions": [RoutePrediction(id=route.id, path=route.path) for route in predictions]}
+    predictions = await _predict(_KNN_MODEL, request)
+    return {"predictions": predictions}
+
+@app.post("/predict/cascade")
+async def predict_cascade(request: QueryRequest):
+    model = await _load_model(_CASCADE_MODEL, request.context)
+    key = result_cache.key(model_id((request.context, _CASCADE_MODEL)), model.version, request.query, request.top_k)
+    cached = result_cache.get(key)
+    if cached is None:
+        routes, stage = await scheduler.predict(model, request.query, top_k=request.top_k, method="predict_batch_with_stages")
+        cached = (_to_predictions(model, routes), stage)
+        result_cache.set(key, cached)
+
+    predictions, stage = cached
+    return {"predictions": predictions, "stage": stage}
+
+@app.post("/predict/batch")
+async def predict_batch(request: BatchQueryRequest):
+    model_name = _ENGINE_MODELS[request.engine]
+    model = await _load_model(model_name, request.context)
+
+    engine_id = model_id((request.context, model_name))
+    keys = [result_cache.key(engine_id, model.version, q, request.top_k) for q in request.queries]
+    batch = [result_cache.get(key) for key in keys]
+    missing = [i for i, predictions in enumerate(batch) if predictions is None]
+    if missing:
+        queries = [request.queries[i] for i in missing]
+        routes = await scheduler.predict_batch(model, queries, top_k=request.top_k)
+        for i, result in zip(missing, routes):
+            batch[i] = _to_predictions(model, result)
+            result_cache.set(keys[i], batch[i])
+
+    return {"predictions": batch}
+
+def _suggest(model: SailorEngine, query: str, top_k: int, state: Optional[TypeaheadState]):
+    # First call builds the model's prefix index, on the worker thread as well
+    return model.typeahead.suggest(query, top_k=top_k, state=state)
+
+@app.post("/suggest/typeahead")
+async def suggest_typeahead(request: TypeaheadRequest):
+    model_name = _ENGINE_MODELS[request.engine]
+    model = await _load_model(model_name, request.context)
+
+    state = state_key = None
+    if request.session_id is not None:
+        state_key = session_states.key(model_id((request.context, model_name)), model.version, request.session_id, "typeahead")
+        state = session_states.get(state_key)
+
+    routes, state = await scheduler.run(_suggest, model, request.query, request.top_k, state)
+    if state_key is not None:
+        session_states.set(state_key, state)
+
+    return {"predictions": _to_predictions(model, routes)}
+
+@app.get("/cache")
+async def cache_stats():
+    return result_cache.stats()
+
+@app.get("/metrics", response_class=PlainTextResponse)
+async def metrics():
+    for cache in (result_cache, session_states):
+        stats = cache.stats()
+        cache_hit_ratio.set(stats["hit_ratio"], cache=cache.name)
+        cache_size.set(stats["size"], cache=cache.name)
+    return PlainTextResponse(registry.render(), media_type="text/plain; version=0.0.4")
+
+@app.get("/admin/profiler")
+async def profiler_stats():
+    return profiler.stats()
+
+@app.post("/admin/profiler/start")
+async def start_profiler(interval_ms: Optional[float] = None):
+    if interval_ms is not None and interval_ms <= 0:
+        raise HTTPException(status_code=422, detail="interval_ms must be positive.")
+    profiler.start(interval_ms)
+    return profiler.stats()
+
+@app.post("/admin/profiler/stop", response_class=PlainTextResponse)
+async def stop_profiler():
+    """Folded stacks of the profiling session, e.g. for `flamegraph.pl`"""
+    return PlainTextResponse(profiler.stop())
+
+@app.get("/admin/models")
+async def loaded_models():
+    return {
+        "memory_usage_bytes": model_loader.memory_usage,
+        "memory_budget_bytes": model_loader.memory_budget,
+        "models": model_loader.stats(),
+    }
+
+@app.post("/admin/models/{model_name}/reload")
+async def reload_model(model_name: str, context: Optional[str] = None):
+    try:
+        model = await model_loader.reload(model_name, context)
+    except (FileNotFoundError, ValueError) as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    return {"model": model_id((context, model_name)), "version": model.version}
 
 def run():
     """Launched with `poetry run start` at root level"""
-    asyncio.run(model_loader.preload_models())
     uvicorn.run("api.main:app", host="0.0.0.0", port=8000, reload=True)
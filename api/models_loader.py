@@ -1,40 +1,244 @@
 import asyncio
 import os
 import pickle
+import re
+import time
 import aiofiles
+import numpy as np
+from collections import OrderedDict
 from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+from sailor import SailorEngine
+from sailor.model_artifact import manifest_path
+from api.metrics import model_load_seconds, model_size_bytes
+from api.result_cache import QueryResultCache
 
 _SVC_MODEL = "svc_model"
 _KNN_MODEL = "knn_model"
+_CASCADE_MODEL = "cascade_model"
 
 _MODEL_DIR = Path(os.path.dirname(__file__)) / "../build/models"
+_WATCH_INTERVAL = float(os.getenv("SAILOR_MODEL_WATCH_SECONDS", "0"))
+# Budget on the estimated resident size of the loaded models
+_MEMORY_BUDGET_MB = float(os.getenv("SAILOR_MODEL_MEMORY_BUDGET_MB", "0"))
+# Re-hash every array on load, checksums are already recorded when artifacts are written
+_VERIFY_ARTIFACTS = os.getenv("SAILOR_MODEL_VERIFY_ARTIFACTS", "0") == "1"
+
+_NAME_PATTERN = re.compile(r"^[A-Za-z0-9_-]+$")
+
+# (context, model name), the default context lives directly in the model directory
+ModelKey = Tuple[Optional[str], str]
+
+def model_id(key: ModelKey) -> str:
+    context, model_name = key
+    return model_name if context is None else f"{context}/{model_name}"
+
+class _ResidentSizer(pickle.Pickler):
+    """
+    Pickles a model into a byte counter with its arrays left out, their
+    nbytes are added instead. Memory mapped arrays count in full, every
+    prediction reads them through so their pages end up resident.
+    """
 
-class SearchModelLoader:
     def __init__(self):
-        self.models = {}
+        super().__init__(self, protocol=pickle.HIGHEST_PROTOCOL)
+        self.size = 0
+        self._arrays = set()
+
+    def write(self, data) -> int:
+        self.size += len(data)
+        return len(data)
+
+    def persistent_id(self, obj):
+        if not isinstance(obj, np.ndarray) or obj.dtype.hasobject:
+            return None
+        if id(obj) not in self._arrays:
+            self._arrays.add(id(obj))
+            self.size += obj.nbytes
+        return id(obj)
+
+def resident_size(model: SailorEngine) -> int:
+    sizer = _ResidentSizer()
+    sizer.dump(model)
+    return sizer.size
+
+class SearchModelLoader:
+    """
+    Registry of engines keyed by tenant context and model name. Models are
+    loaded lazily and the least recently used ones are evicted once their
+    estimated resident size exceeds the memory budget.
+    """
+
+    def __init__(self,
+                 cache: Optional[QueryResultCache] = None,
+                 watch_interval: float = _WATCH_INTERVAL,
+                 memory_budget_mb: float = _MEMORY_BUDGET_MB,
+                ):
+        self.models: OrderedDict[ModelKey, SailorEngine] = OrderedDict()
+        self.cache = cache
+        self.watch_interval = watch_interval
+        self.memory_budget = int(memory_budget_mb * 1024 * 1024)
+        self._sizes: Dict[ModelKey, int] = {}
+        self._disk_sizes: Dict[ModelKey, int] = {}
+        self._sources: Dict[ModelKey, int] = {}
+        self._loading: Dict[ModelKey, asyncio.Task] = {}
+        self._generations: Dict[ModelKey, int] = {}
+        self._watcher: Optional[asyncio.Task] = None
+
+    @property
+    def memory_usage(self) -> int:
+        return sum(self._sizes.values())
 
     async def preload_models(self):
         print("Preloading models...")
         models_coroutine = (
-            self._load(model_name)
-            for model_name in [_SVC_MODEL, _KNN_MODEL]
+            self.load(model_name)
+            for model_name in [_SVC_MODEL, _KNN_MODEL, _CASCADE_MODEL]
+            if self._source_stamp((None, model_name)) is not None
         )
         await asyncio.gather(*models_coroutine)
 
-    async def _load(self, model_name: str):
-      if model_name in self.models:
-        return self.models[model_name]
+    async def load(self, model_name: str, context: Optional[str] = None) -> SailorEngine:
+        key = (context, model_name)
+        model = self.models.get(key)
+        if model is not None:
+            self.models.move_to_end(key)
+            return model
+        return await self._load_once(key)
+
+    async def reload(self, model_name: str, context: Optional[str] = None) -> SailorEngine:
+        """
+        Load the current file for a model in the background and swap it in.
+        Requests holding the previous model keep using it until they finish.
+        A load already in flight may be reading the previous files, so a new
+        one is always started.
+        """
+        return await self._start_load((context, model_name))
+
+    async def _load_once(self, key: ModelKey) -> SailorEngine:
+        # Single-flight, concurrent callers share the same load
+        task = self._loading.get(key)
+        if task is None:
+            return await self._start_load(key)
+        return await asyncio.shield(task)
+
+    async def _start_load(self, key: ModelKey) -> SailorEngine:
+        generation = self._generations[key] = self._generations.get(key, 0) + 1
+        task = asyncio.ensure_future(self._read_model(key, generation))
+        task.add_done_callback(lambda done: self._loading.pop(key) if self._loading.get(key) is done else None)
+        self._loading[key] = task
+        return await asyncio.shield(task)
+
+    def _model_path(self, key: ModelKey) -> Path:
+        context, model_name = key
+        for name in (context, model_name):
+            if name is not None and not _NAME_PATTERN.match(name):
+                raise ValueError(f"Invalid model name {name}.")
+        return _MODEL_DIR / model_name if context is None else _MODEL_DIR / context / model_name
+
+    async def _read_model(self, key: ModelKey, generation: int) -> SailorEngine:
+        model_path = self._model_path(key)
+        source_stamp = self._source_stamp(key)
+        if source_stamp is None:
+            raise FileNotFoundError(f"Model {model_id(key)} not found in {_MODEL_DIR.resolve()}.")
+
+        start = time.perf_counter()
+        source = "artifact" if os.path.exists(manifest_path(str(model_path))) else "pickle"
+        if source == "artifact":
+            print(f"Loading model artifact from {model_path.resolve()}")
+            model = await asyncio.to_thread(SailorEngine.load_artifact, str(model_path), "r", _VERIFY_ARTIFACTS)
+            disk_size = sum(f.stat().st_size for f in model_path.iterdir() if f.is_file())
+        else:
+            pickle_path = model_path.with_suffix(".pkl")
+            print(f"Loading model from {pickle_path.resolve()}")
+            async with aiofiles.open(pickle_path, "rb") as f:
+                file = await f.read()
+            model = await asyncio.to_thread(pickle.loads, file)
+            disk_size = len(file)
+        size = await asyncio.to_thread(resident_size, model)
+
+        # A newer load started meanwhile, don't swap in an older version over it
+        if generation != self._generations[key]:
+            newer = self._loading.get(key)
+            return await asyncio.shield(newer) if newer is not None else self.models.get(key, model)
+
+        model_load_seconds.observe(time.perf_counter() - start, model=model_id(key), source=source)
+        model_size_bytes.set(size, model=model_id(key))
+        self.models[key] = model
+        self.models.move_to_end(key)
+        self._sizes[key] = size
+        self._disk_sizes[key] = disk_size
+        self._sources[key] = source_stamp
+
+        if self.cache is not None:
+            self.cache.invalidate(model_id(key))
+
+        self._evict(keep=key)
+        return model
+
+    def _evict(self, keep: ModelKey):
+        if self.memory_budget <= 0: return
+        for key in list(self.models):
+            if self.memory_usage <= self.memory_budget: break
+            if key == keep: continue
+            self.unload(key)
+
+    def unload(self, key: ModelKey):
+        print(f"Unloading model {model_id(key)}")
+        self.models.pop(key, None)
+        self._sizes.pop(key, None)
+        self._disk_sizes.pop(key, None)
+        self._sources.pop(key, None)
+        model_size_bytes.remove(model=model_id(key))
+        if self.cache is not None:
+            self.cache.invalidate(model_id(key))
+
+    def _source_stamp(self, key: ModelKey) -> Optional[int]:
+        # The artifact manifest is written last, its mtime marks a complete new version
+        model_path = self._model_path(key)
+        for path in (manifest_path(str(model_path)), str(model_path.with_suffix(".pkl"))):
+            if os.path.exists(path):
+                return os.stat(path).st_mtime_ns
+        return None
+
+    def stats(self) -> List[Dict]:
+        return [
+            {"model": model_id(key), "version": model.version, "size_bytes": self._sizes.get(key, 0),
+             "disk_bytes": self._disk_sizes.get(key, 0)}
+            for key, model in self.models.items()
+        ]
+
+    def start_watching(self):
+        if self.watch_interval <= 0 or self._watcher is not None: return
+        self._watcher = asyncio.ensure_future(self._watch())
+
+    async def stop_watching(self):
+        if self._watcher is None: return
+        self._watcher.cancel()
+        try:
+            await self._watcher
+        except asyncio.CancelledError:
+            pass
+        self._watcher = None
 
-      model_path = _MODEL_DIR / f"{model_name}.pkl"
-      print(f"Loading model from {model_path.resolve()}")
-      async with aiofiles.open(model_path, "rb") as f:
-          file = await f.read()
-          self.models.update({model_name: pickle.loads(file)})
+    async def _watch(self):
+        while True:
+            await asyncio.sleep(self.watch_interval)
+            for key in list(self.models):
+                source_stamp = self._source_stamp(key)
+                if source_stamp is None or source_stamp == self._sources.get(key):
+                    continue
+                try:
+                    await self._start_load(key)
+                except Exception as e:
+                    print(f"Failed to reload model {model_id(key)}, keeping the loaded version: {e}")
 
-      return self.models[model_name]
+    async def load_svc(self, context: Optional[str] = None):
+        return await self.load(_SVC_MODEL, context)
 
-    async def load_svc(self):
-        return await self._load(_SVC_MODEL)
+    async def load_knn(self, context: Optional[str] = None):
+        return await self.load(_KNN_MODEL, context)
 
-    async def load_knn(self):
-        return await self._load(_KNN_MODEL)
+    async def load_cascade(self, context: Optional[str] = None):
+        return await self.load(_CASCADE_MODEL, context)
@@ -0,0 +1,78 @@
+import os
+import sys
+import threading
+import time
+from collections import Counter
+from typing import Any, Dict, Optional
+
+_PROFILER_INTERVAL_MS = float(os.getenv("SAILOR_PROFILER_INTERVAL_MS", "10"))
+_max_depth = 64
+
+class SamplingProfiler:
+    """
+    Wall-clock sampling profiler toggled at runtime. A daemon thread snapshots
+    every other thread's stack each `interval_ms` and counts the stacks in
+    folded format (`outer;inner count`), ready for flamegraph tools.
+    Costs nothing while stopped.
+    """
+
+    def __init__(self, interval_ms: float = _PROFILER_INTERVAL_MS):
+        self.interval_ms = interval_ms
+        self.samples = 0
+        self._stacks: Counter = Counter()
+        self._thread: Optional[threading.Thread] = None
+        self._stop = threading.Event()
+        self._started_at: Optional[float] = None
+
+    @property
+    def running(self) -> bool:
+        return self._thread is not None
+
+    def start(self, interval_ms: Optional[float] = None):
+        if self.running: return
+        if interval_ms is not None:
+            self.interval_ms = interval_ms
+        self.samples = 0
+        self._stacks = Counter()
+        self._stop.clear()
+        self._started_at = time.monotonic()
+        self._thread = threading.Thread(target=self._sample_loop, name="sailor-profiler", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> str:
+        """Stop sampling and return the folded stacks collected since `start`"""
+        if self._thread is not None:
+            self._stop.set()
+            self._thread.join()
+            self._thread = None
+        return self.folded()
+
+    def folded(self) -> str:
+        return "\n".join(f"{stack} {count}" for stack, count in self._stacks.most_common())
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "running": self.running,
+            "interval_ms": self.interval_ms,
+            "samples": self.samples,
+            "stacks": len(self._stacks),
+            "seconds": time.monotonic() - self._started_at if self.running and self._started_at else 0.0,
+        }
+
+    def _sample_loop(self):
+        own_id = threading.get_ident()
+        interval = self.interval_ms / 1000
+        while not self._stop.wait(interval):
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id == own_id: continue
+                self._stacks[self._fold(frame)] += 1
+            self.samples += 1
+
+    @staticmethod
+    def _fold(frame) -> str:
+        names = []
+        while frame is not None and len(names) < _max_depth:
+            code = frame.f_code
+            names.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})")
+            frame = frame.f_back
+        return ";".join(reversed(names))
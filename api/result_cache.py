@@ -0,0 +1,99 @@
+import os
+import re
+import string
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Hashable, Optional, Tuple
+
+from api.metrics import cache_requests
+
+_CACHE_MAX_SIZE = int(os.getenv("SAILOR_CACHE_MAX_SIZE", "10000"))
+_CACHE_TTL_SECONDS = float(os.getenv("SAILOR_CACHE_TTL_SECONDS", "300"))
+
+_whitespace = re.compile(r"\s+")
+# Token patterns split on punctuation but keep `_` inside terms
+_punctuation_table = str.maketrans({c: " " for c in string.punctuation if c != "_"})
+
+def normalize_query(query: str) -> str:
+    """
+    Lowercase, punctuation as spaces and collapsed whitespace, which no engine
+    tells apart. `_` is kept, the token pattern reads `user_list` as one term.
+    """
+    return _whitespace.sub(" ", query.lower().translate(_punctuation_table)).strip()
+
+_CacheKey = Tuple[str, Optional[str], str, Hashable]
+
+class QueryResultCache:
+    """
+    In-process LRU cache with TTL eviction for prediction results, keyed by
+    engine name, model version and normalized query.
+    """
+
+    def __init__(self, max_size: int = _CACHE_MAX_SIZE, ttl_seconds: float = _CACHE_TTL_SECONDS, name: str = "results"):
+        self.name = name
+        self.max_size = max_size
+        self.ttl = ttl_seconds
+        self.hits = 0
+        self.misses = 0
+        self._entries: OrderedDict[_CacheKey, Tuple[float, Any]] = OrderedDict()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def key(engine: str, version: Optional[str], query: str, variant: Hashable = None) -> _CacheKey:
+        return (engine, version, normalize_query(query), variant)
+
+    def get(self, key: _CacheKey) -> Optional[Any]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[0] < time.monotonic():
+                if entry is not None: del self._entries[key]
+                self.misses += 1
+                value = None
+            else:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                value = entry[1]
+
+        cache_requests.inc(cache=self.name, result="miss" if value is None else "hit")
+        return value
+
+    def set(self, key: _CacheKey, value: Any):
+        if self.max_size <= 0: return
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, engine: Optional[str] = None):
+        with self._lock:
+            if engine is None:
+                self._entries.clear()
+                return
+            for key in [k for k in self._entries if k[0] == engine]:
+                del self._entries[key]
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            hits, misses, size = self.hits, self.misses, len(self._entries)
+        total = hits + misses
+        return {
+            "size": size,
+            "max_size": self.max_size,
+            "ttl_seconds": self.ttl,
+            "hits": hits,
+            "misses": misses,
+            "hit_ratio": hits / total if total else 0.0,
+        }
+
+class SessionStateCache(QueryResultCache):
+    """
+    Per-client state kept between requests, e.g. the previous typeahead keystroke,
+    keyed by engine name, model version, session id and the feature storing it.
+    """
+
+    @staticmethod
+    def key(engine: str, version: Optional[str], session_id: str, variant: Hashable = None) -> _CacheKey:
+        # Session ids are opaque, unlike queries they aren't normalized
+        return (engine, version, session_id, variant)
@@ -2,9 +2,19 @@
 Search Suggestion: AI-powered search suggestion.
 """
 
-from .sailor_engine import SailorEngine, SVCSailorEngine, KNNSailorEngine
+from .sailor_engine import SailorEngine, SVCSailorEngine, KNNSailorEngine, IncrementalSailorEngine
 from .sailor_data_engineer import RouteGenConfig, SailorDataEngineer, SailorDataWarehouse
+from .rate_controller import AdaptiveRateController
+from .session_dedup import MinHashDeduplicator
+from .cascade_engine import CascadeSailorEngine
+from .inverted_index_engine import InvertedIndexSailorEngine
 from .route_documentor import RouteDocumentor
+from .route_typeahead import RouteTypeahead, TypeaheadState
+from .synthetic_data import SyntheticDataGenerator
+from .training_pipeline import TrainingPipeline
+from .model_evaluation import ModelEvaluator
+from .model_compaction import ModelCompactor
+from .vector_engine import VectorSailorEngine, WordVectorizer
 
 __version__ = "0.0.1"
 
@@ -12,8 +22,21 @@ __all__ = [
     "SailorEngine",
     "SVCSailorEngine",
     "KNNSailorEngine",
+    "IncrementalSailorEngine",
+    "CascadeSailorEngine",
+    "InvertedIndexSailorEngine",
+    "VectorSailorEngine",
+    "WordVectorizer",
+    "TrainingPipeline",
+    "ModelEvaluator",
+    "ModelCompactor",
     "RouteDocumentor",
+    "RouteTypeahead",
+    "TypeaheadState",
     "SailorDataEngineer",
     "RouteGenConfig",
-    "SailorDataWarehouse"
+    "SailorDataWarehouse",
+    "AdaptiveRateController",
+    "MinHashDeduplicator",
+    "SyntheticDataGenerator"
 ]
@@ -0,0 +1,119 @@
+from typing import Dict, Iterable, List, Optional, Tuple
+import warnings
+import numpy as np
+from scipy import sparse
+from sklearn.pipeline import Pipeline
+from sklearn.feature_extraction.text import TfidfVectorizer
+from sklearn.svm import LinearSVC
+
+from .compact_components import QuantizedLinearClassifier
+from .instrumentation import timed_stage
+from .sailor_engine import (
+    SailorEngine, _svc_scores, _svc_arrays, _load_svc_arrays, _svc_importance,
+    _StoredKNeighborsClassifier, _knn_arrays, _load_knn_arrays, _knn_importance, _compact_knn,
+)
+from .types import RouteContextResult
+
+STAGE_SVC = "svc"
+STAGE_SVC_KNN = "svc+knn"
+
+class CascadeSailorEngine(SailorEngine):
+    """
+    LinearSVC first, KNN only when the SVC is unsure.
+
+    Both classifiers share one TF-IDF stage. A query is answered by the SVC
+    alone when the margin between its two best routes reaches `margin_threshold`,
+    otherwise KNN scores it too and both rankings are fused with reciprocal
+    rank fusion, `1 / (fusion_k + rank)` summed over the two stages.
+    """
+
+    def __init__(self, margin_threshold: float = 0.25, fusion_k: int = 60):
+        super().__init__()
+        self.margin_threshold = margin_threshold
+        self.fusion_k = fusion_k
+        self.pipeline = Pipeline([
+            ('tfidf', TfidfVectorizer(stop_words='english')),
+            ])
+        self.svc = LinearSVC(class_weight='balanced', max_iter=2000)
+        self.knn = _StoredKNeighborsClassifier(weights='distance')
+
+    def _fit_documents(self, documents: Iterable[str], labels: np.ndarray):
+        self._fit_classifier(self.pipeline.fit_transform(documents), labels)
+
+    def _fit_classifier(self, features: sparse.csr_matrix, labels: np.ndarray):
+        self.svc.fit(features, labels)
+        with warnings.catch_warnings():
+            warnings.simplefilter("ignore", UserWarning)
+            self.knn.fit(features, labels)
+
+    def decision_scores(self, queries: List[str]) -> np.ndarray:
+        return self.decision_stages(queries)[0]
+
+    def decision_stages(self, queries: List[str]) -> Tuple[np.ndarray, List[str]]:
+        with timed_stage(type(self).__name__, "transform"):
+            features = self.pipeline.transform(queries)
+        with timed_stage(type(self).__name__, "classify"):
+            scores = _svc_scores(self.svc.decision_function(features))
+
+        if scores.shape[1] < 2:
+            return scores, [STAGE_SVC] * len(queries)
+
+        top_two = np.partition(scores, scores.shape[1] - 2, axis=1)[:, -2:]
+        ambiguous = np.flatnonzero(top_two[:, 1] - top_two[:, 0] < self.margin_threshold)
+        stages = [STAGE_SVC] * len(queries)
+        if len(ambiguous) == 0:
+            return scores, stages
+
+        with timed_stage(type(self).__name__, "escalate"):
+            knn_scores = self.knn.predict_proba(features[ambiguous])
+            fused = self._rank_fusion(scores[ambiguous]) + self._rank_fusion(knn_scores)
+
+        scores = scores.copy()
+        scores[ambiguous] = fused
+        for i in ambiguous:
+            stages[i] = STAGE_SVC_KNN
+        return scores, stages
+
+    def _rank_fusion(self, scores: np.ndarray) -> np.ndarray:
+        ranks = np.empty_like(scores)
+        order = np.argsort(-scores, axis=1, kind="stable")
+        np.put_along_axis(ranks, order, np.arange(1, scores.shape[1] + 1, dtype=scores.dtype), axis=1)
+        return 1.0 / (self.fusion_k + ranks)
+
+    def predict_batch_with_stages(self,
+                                  queries: List[Optional[str]],
+                                  top_k: Optional[int] = None,
+                                 ) -> List[Tuple[List[RouteContextResult], Optional[str]]]:
+        """Same as `predict_batch`, each result paired with the stage that answered it"""
+        results: List[Tuple[List[RouteContextResult], Optional[str]]] = [([], None) for _ in queries]
+        valid = [i for i, q in enumerate(queries) if q is not None]
+        if not valid:
+            return results
+
+        scores, stages = self.decision_stages([queries[i] for i in valid])
+        with timed_stage(type(self).__name__, "rank"):
+            for row, i in enumerate(valid):
+                results[i] = (self.scored_routes(scores[row], top_k=top_k), stages[row])
+        return results
+
+    def _term_importance(self, tfidf: TfidfVectorizer) -> np.ndarray:
+        # A term is kept when either stage relies on it, each scaled to its own maximum
+        importances = [_svc_importance(self.svc, tfidf), _knn_importance(self.knn)]
+        return np.max([i / i.max() if i.max() > 0 else i for i in importances], axis=0)
+
+    def _compact_classifier(self, columns: np.ndarray, dtype: str):
+        self.svc = QuantizedLinearClassifier.from_linear(self.svc, columns, dtype)
+        self.knn = _compact_knn(self.knn, columns, self.pipeline.named_steps['tfidf'])
+
+    def _classifier_arrays(self) -> Dict[str, np.ndarray]:
+        return {
+            **_svc_arrays(self.svc),
+            **_knn_arrays(self.knn),
+            "cascade_params": np.array([self.margin_threshold, self.fusion_k], dtype=np.float64),
+        }
+
+    def _load_classifier(self, arrays: Dict[str, np.ndarray]):
+        self.svc = _load_svc_arrays(self.svc, arrays)
+        _load_knn_arrays(self.knn, arrays)
+        self.margin_threshold = float(arrays["cascade_params"][0])
+        self.fusion_k = int(arrays["cascade_params"][1])
@@ -0,0 +1,174 @@
+"""
+Low-memory serving components produced by `SailorEngine.compact`.
+
+`CompactTfidfVectorizer` keeps its vocabulary as one sorted fixed-width byte
+array instead of a `{term: column}` dict, query tokens are resolved with a
+single `searchsorted` per batch. `QuantizedLinearClassifier` holds linear
+weights as float32 or as int8 with one scale factor per class, only the
+columns a batch actually uses are dequantized.
+"""
+from typing import Any, Dict, List, Optional
+import numpy as np
+from scipy import sparse
+from sklearn.base import BaseEstimator
+from sklearn.feature_extraction.text import TfidfVectorizer
+from sklearn.preprocessing import normalize
+
+COMPACT_DTYPES = ("float32", "int8")
+
+_int8_max = 127
+
+def _encode_terms(terms: List[str]) -> np.ndarray:
+    encoded = [t.encode("utf-8") for t in terms]
+    return np.array(encoded, dtype=f"S{max(map(len, encoded), default=1)}")
+
+def sorted_columns(tfidf: TfidfVectorizer, columns: np.ndarray) -> np.ndarray:
+    """`columns` reordered by their term bytes, the order `CompactTfidfVectorizer` looks them up in"""
+    terms = sorted(tfidf.vocabulary_, key=tfidf.vocabulary_.__getitem__)
+    encoded = _encode_terms([terms[c] for c in columns])
+    return columns[np.argsort(encoded, kind="stable")]
+
+class SortedVocabulary:
+    def __init__(self, terms: np.ndarray):
+        self.terms = terms
+
+    def __len__(self) -> int:
+        return len(self.terms)
+
+    def lookup(self, tokens: List[str]) -> np.ndarray:
+        """Column of each token, -1 when it isn't in the vocabulary"""
+        columns = np.full(len(tokens), -1, dtype=np.int64)
+        if not tokens or not len(self.terms): return columns
+
+        encoded = [t.encode("utf-8") for t in tokens]
+        # Longer tokens would be truncated by the fixed width and match a wrong term
+        fits = np.fromiter((len(e) <= self.terms.itemsize for e in encoded), dtype=bool, count=len(encoded))
+        keys = np.array(encoded, dtype=self.terms.dtype)
+
+        positions = np.searchsorted(self.terms, keys)
+        positions[positions == len(self.terms)] = 0
+        found = fits & (self.terms[positions] == keys)
+        columns[found] = positions[found]
+        return columns
+
+class CompactTfidfVectorizer(TfidfVectorizer):
+    """
+    `TfidfVectorizer` with the same params and float32 output, for serving only.
+    Terms missing from the pruned vocabulary are ignored, the query vector is
+    normalized over the terms that are left.
+    """
+
+    @classmethod
+    def from_tfidf(cls, tfidf: TfidfVectorizer, columns: np.ndarray) -> 'CompactTfidfVectorizer':
+        """Keep the `columns` of a fitted vectorizer, in `sorted_columns` order"""
+        terms = sorted(tfidf.vocabulary_, key=tfidf.vocabulary_.__getitem__)
+        compact = cls(**tfidf.get_params())
+        compact.vocabulary_terms_ = SortedVocabulary(_encode_terms([terms[c] for c in columns]))
+        compact.term_idf_ = np.asarray(tfidf.idf_[columns], dtype=np.float32) if tfidf.use_idf else None
+        return compact
+
+    def fit(self, raw_documents, y=None):
+        tfidf = TfidfVectorizer(**self.get_params()).fit(raw_documents)
+        fitted = self.from_tfidf(tfidf, np.arange(len(tfidf.vocabulary_)))
+        self.vocabulary_terms_, self.term_idf_ = fitted.vocabulary_terms_, fitted.term_idf_
+        return self
+
+    def fit_transform(self, raw_documents, y=None):
+        raw_documents = list(raw_documents)
+        return self.fit(raw_documents).transform(raw_documents)
+
+    def transform(self, raw_documents) -> sparse.csr_matrix:
+        analyzer = self.build_analyzer()
+        tokens: List[str] = []
+        indptr = [0]
+        for document in raw_documents:
+            tokens.extend(analyzer(document))
+            indptr.append(len(tokens))
+
+        columns = self.vocabulary_terms_.lookup(tokens)
+        rows = np.repeat(np.arange(len(indptr) - 1), np.diff(indptr))
+        found = columns >= 0
+        features = sparse.csr_matrix(
+            (np.ones(np.count_nonzero(found), dtype=np.float32), (rows[found], columns[found])),
+            shape=(len(indptr) - 1, len(self.vocabulary_terms_)))
+        features.sum_duplicates()
+
+        if self.binary:
+            features.data[:] = 1
+        elif self.sublinear_tf:
+            np.log(features.data, out=features.data)
+            features.data += 1
+        if self.term_idf_ is not None:
+            features.data *= self.term_idf_[features.indices]
+        if self.norm is not None:
+            features = normalize(features, norm=self.norm, copy=False)
+        return features
+
+    def to_arrays(self) -> Dict[str, np.ndarray]:
+        arrays = {"compact_tfidf_terms": self.vocabulary_terms_.terms}
+        if self.term_idf_ is not None:
+            arrays["compact_tfidf_idf"] = self.term_idf_
+        return arrays
+
+    @classmethod
+    def from_arrays(cls, params: Dict[str, Any], arrays: Dict[str, np.ndarray]) -> 'CompactTfidfVectorizer':
+        compact = cls(**params)
+        compact.vocabulary_terms_ = SortedVocabulary(arrays["compact_tfidf_terms"])
+        compact.term_idf_ = arrays.get("compact_tfidf_idf")
+        return compact
+
+class QuantizedLinearClassifier(BaseEstimator):
+    """
+    Decision function of a fitted linear classifier with smaller weights. Takes no
+    params, artifacts keep the params of the classifier it replaces.
+    """
+
+    @classmethod
+    def from_linear(cls, linear: Any, columns: np.ndarray, dtype: str = "int8") -> 'QuantizedLinearClassifier':
+        if dtype not in COMPACT_DTYPES:
+            raise ValueError(f"Unsupported compact dtype {dtype}, expected one of {', '.join(COMPACT_DTYPES)}.")
+
+        coef = np.asarray(linear.coef_)[:, columns]
+        quantized = cls()
+        if dtype == "int8":
+            # Symmetric per-class scale, each class row keeps its own range
+            scale = np.abs(coef).max(axis=1) / _int8_max
+            scale[scale == 0] = 1.0
+            quantized.coef_ = np.round(coef / scale[:, None]).astype(np.int8)
+            quantized.coef_scale_ = scale.astype(np.float32)
+        else:
+            quantized.coef_ = coef.astype(np.float32)
+            quantized.coef_scale_ = np.ones(coef.shape[0], dtype=np.float32)
+        quantized.intercept_ = np.asarray(linear.intercept_, dtype=np.float32)
+        quantized.classes_ = linear.classes_
+        return quantized
+
+    def decision_function(self, features: sparse.csr_matrix) -> np.ndarray:
+        features = sparse.csr_matrix(features)
+        used = np.unique(features.indices)
+        weights = self.coef_[:, used].astype(np.float32) * self.coef_scale_[:, None]
+        scores = np.asarray(features[:, used] @ weights.T) + self.intercept_
+        # Binary models have one row of weights, as LinearSVC returns a single column
+        return scores.ravel() if scores.shape[1] == 1 else scores
+
+    def to_arrays(self, prefix: str) -> Dict[str, np.ndarray]:
+        return {
+            f"{prefix}_coef_quantized": self.coef_,
+            f"{prefix}_coef_scale": self.coef_scale_,
+            f"{prefix}_intercept": self.intercept_,
+            f"{prefix}_classes": self.classes_,
+        }
+
+    @classmethod
+    def from_arrays(cls, prefix: str, arrays: Dict[str, np.ndarray]) -> 'QuantizedLinearClassifier':
+        quantized = cls()
+        quantized.coef_ = arrays[f"{prefix}_coef_quantized"]
+        quantized.coef_scale_ = arrays[f"{prefix}_coef_scale"]
+        quantized.intercept_ = arrays[f"{prefix}_intercept"]
+        quantized.classes_ = arrays[f"{prefix}_classes"]
+        return quantized
+
+def compact_knn_features(features: sparse.spmatrix, columns: np.ndarray, norm: Optional[str]) -> sparse.csr_matrix:
+    """KNN training rows restricted to `columns` as float32, renormalized like the queries"""
+    features = sparse.csr_matrix(features)[:, columns].astype(np.float32)
+    return normalize(features, norm=norm, copy=False) if norm is not None else features
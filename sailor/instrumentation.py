@@ -0,0 +1,40 @@
+"""
+Hot-path stage timings of the engines.
+
+Engines wrap their inference stages in `timed_stage`. Nothing is measured until
+an observer is registered with `set_stage_observer`, e.g. the API metrics,
+the disabled path returns a shared no-op context manager.
+"""
+import time
+from contextlib import nullcontext
+from typing import Callable, Optional
+
+StageObserver = Callable[[str, str, float], None]
+
+_observer: Optional[StageObserver] = None
+_disabled = nullcontext()
+
+def set_stage_observer(observer: Optional[StageObserver]):
+    """Receives `(engine, stage, seconds)` for every timed stage, `None` disables timing"""
+    global _observer
+    _observer = observer
+
+class _StageTimer:
+    __slots__ = ("engine", "stage", "observer", "start")
+
+    def __init__(self, engine: str, stage: str, observer: StageObserver):
+        self.engine = engine
+        self.stage = stage
+        self.observer = observer
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+
+    def __exit__(self, *_):
+        self.observer(self.engine, self.stage, time.perf_counter() - self.start)
+
+def timed_stage(engine: str, stage: str):
+    observer = _observer
+    if observer is None:
+        return _disabled
+    return _StageTimer(engine, stage, observer)
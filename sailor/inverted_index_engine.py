@@ -0,0 +1,151 @@
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+import numpy as np
+from scipy import sparse
+from sklearn.pipeline import Pipeline
+from sklearn.feature_extraction.text import TfidfVectorizer
+
+from .instrumentation import timed_stage
+from .sailor_engine import SailorEngine
+from .types import RouteContextResult
+
+class InvertedIndexSailorEngine(SailorEngine):
+    """
+    Sparse retrieval over a term -> postings index of the route documents.
+
+    Scores are the cosine similarity between the query and route TF-IDF vectors,
+    only routes sharing a term with the query are touched. With a `top_k`, query
+    terms are visited by decreasing upper bound (MaxScore): once the k-th best
+    score beats what the remaining terms could add, no new candidate is admitted
+    and only routes still able to reach the top-k are scored further.
+    """
+
+    def __init__(self):
+        super().__init__()
+        self.pipeline = Pipeline([
+            ('tfidf', TfidfVectorizer(stop_words='english')),
+            ])
+        self._postings_indptr: np.ndarray
+        self._postings_routes: np.ndarray
+        self._postings_weights: np.ndarray
+        self._term_max_weight: np.ndarray
+
+    def _fit_documents(self, documents: Iterable[str], labels: np.ndarray):
+        self._fit_classifier(self.pipeline.named_steps['tfidf'].fit_transform(documents), labels)
+
+    def _fit_classifier(self, features: sparse.csr_matrix, labels: np.ndarray):
+        # Rows follow the route labels so postings point straight at score columns
+        features = features[np.argsort(labels)]
+        self._build_index(sparse.csc_matrix(features))
+
+    def _build_index(self, features: sparse.csc_matrix):
+        features.sort_indices()
+        self._postings_indptr = features.indptr.astype(np.int64)
+        self._postings_routes = features.indices.astype(np.int32)
+        self._postings_weights = features.data
+        self._term_max_weight = features.max(axis=0).toarray().ravel()
+
+    @property
+    def _n_routes(self) -> int:
+        return len(self.documentor.label_routes)
+
+    def decision_scores(self, queries: List[str]) -> np.ndarray:
+        analyzer = self.pipeline.named_steps['tfidf'].build_analyzer()
+        return np.vstack([self._score(*self._query_terms(analyzer, q), None) for q in queries])
+
+    def predict_batch(self, queries: List[str], top_k: Optional[int] = None) -> List[List[RouteContextResult]]:
+        engine = type(self).__name__
+        analyzer = self.pipeline.named_steps['tfidf'].build_analyzer()
+        results: List[List[RouteContextResult]] = []
+        for query in queries:
+            if query is None:
+                results.append([])
+                continue
+            with timed_stage(engine, "transform"):
+                terms, weights = self._query_terms(analyzer, query)
+            with timed_stage(engine, "classify"):
+                scores = self._score(terms, weights, top_k)
+            with timed_stage(engine, "rank"):
+                results.append(self.scored_routes(scores, top_k=top_k))
+        return results
+
+    def _query_terms(self, analyzer: Callable[[str], List[str]], query: str) -> Tuple[np.ndarray, np.ndarray]:
+        """Same vector as `TfidfVectorizer.transform`, without its per-call sparse matrix overhead"""
+        tfidf: TfidfVectorizer = self.pipeline.named_steps['tfidf']
+        vocabulary = tfidf.vocabulary_
+        counts: Dict[int, int] = {}
+        for token in analyzer(query):
+            term = vocabulary.get(token)
+            if term is not None:
+                counts[term] = counts.get(term, 0) + 1
+
+        terms = np.fromiter(counts.keys(), dtype=np.int64, count=len(counts))
+        weights = np.fromiter(counts.values(), dtype=np.float64, count=len(counts))
+        if tfidf.sublinear_tf:
+            weights = 1 + np.log(weights)
+        weights *= tfidf.idf_[terms]
+
+        if tfidf.norm == 'l2' and len(weights):
+            weights /= np.linalg.norm(weights)
+        elif tfidf.norm == 'l1' and len(weights):
+            weights /= np.abs(weights).sum()
+        return terms, weights
+
+    def _postings(self, term: int):
+        start, end = self._postings_indptr[term], self._postings_indptr[term + 1]
+        return self._postings_routes[start:end], self._postings_weights[start:end]
+
+    def _score(self, terms: np.ndarray, weights: np.ndarray, top_k: Optional[int]) -> np.ndarray:
+        upper_bounds = weights * self._term_max_weight[terms]
+        order = np.argsort(-upper_bounds, kind="stable")
+        terms, weights, upper_bounds = terms[order], weights[order], upper_bounds[order]
+        # remaining[i] bounds what terms i.. can still add to any route
+        remaining = np.append(np.cumsum(upper_bounds[::-1])[::-1], 0.0)
+
+        scores = np.zeros(self._n_routes)
+        candidates = np.zeros(self._n_routes, dtype=bool)
+        n_candidates = 0
+        threshold = 0.0
+
+        i = 0
+        while i < len(terms):
+            if top_k is not None and n_candidates >= top_k:
+                candidate_scores = scores[candidates]
+                threshold = np.partition(candidate_scores, len(candidate_scores) - top_k)[-top_k]
+                if threshold >= remaining[i]: break
+
+            routes, route_weights = self._postings(terms[i])
+            scores[routes] += weights[i] * route_weights
+            n_candidates += np.count_nonzero(~candidates[routes])
+            candidates[routes] = True
+            i += 1
+
+        if i == len(terms):
+            return scores
+
+        # Non-essential terms, only refine routes that can still reach the top-k
+        pool = np.flatnonzero(candidates)
+        for j in range(i, len(terms)):
+            pool = pool[scores[pool] + remaining[j] > threshold]
+            if len(pool) == 0: break
+
+            routes, route_weights = self._postings(terms[j])
+            positions = np.searchsorted(routes, pool)
+            positions[positions == len(routes)] = 0
+            hits = routes[positions] == pool
+            scores[pool[hits]] += weights[j] * route_weights[positions[hits]]
+
+        return scores
+
+    def _classifier_arrays(self) -> Dict[str, np.ndarray]:
+        return {
+            "index_indptr": self._postings_indptr,
+            "index_routes": self._postings_routes,
+            "index_weights": self._postings_weights,
+            "index_term_max": self._term_max_weight,
+        }
+
+    def _load_classifier(self, arrays: Dict[str, np.ndarray]):
+        self._postings_indptr = arrays["index_indptr"]
+        self._postings_routes = arrays["index_routes"]
+        self._postings_weights = arrays["index_weights"]
+        self._term_max_weight = arrays["index_term_max"]
@@ -0,0 +1,161 @@
+"""
+Memory-mappable model artifacts: a JSON manifest plus one `.npy` file per array.
+
+Arrays are loaded with `np.load(mmap_mode=...)` and `allow_pickle=False`, so
+server workers mapping the same artifact share one page-cache copy and loading
+never executes pickled code.
+
+Each write goes to a new hidden version directory next to the artifact, the
+artifact path is a symlink flipped to it with `os.replace`. Readers resolve the
+link once, so they never mix files of two versions.
+"""
+import hashlib
+import json
+import os
+import re
+import shutil
+import uuid
+from typing import Any, Dict, List, Optional, Tuple
+import numpy as np
+
+ARTIFACT_FORMAT_VERSION = 1
+
+_MANIFEST_FILE = "manifest.json"
+
+# Previous versions kept around for readers that resolved the link before a flip
+_KEEP_VERSIONS = 2
+
+_version_token = re.compile(r"[0-9a-f]{32}")
+
+def pack_strings(values: List[str]) -> Tuple[np.ndarray, np.ndarray]:
+    """Encode strings as one utf-8 byte buffer plus an offsets array"""
+    encoded = [v.encode("utf-8") for v in values]
+    offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+    np.cumsum([len(e) for e in encoded], out=offsets[1:])
+    data = np.frombuffer(b"".join(encoded), dtype=np.uint8)
+    return data, offsets
+
+def unpack_strings(data: np.ndarray, offsets: np.ndarray) -> List[str]:
+    buffer = np.asarray(data).tobytes()
+    bounds = np.asarray(offsets).tolist()
+    return [buffer[start:end].decode("utf-8") for start, end in zip(bounds[:-1], bounds[1:])]
+
+def manifest_path(artifact_dir: str) -> str:
+    return os.path.join(artifact_dir, _MANIFEST_FILE)
+
+def _file_digest(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+def _artifact_checksum(arrays: Dict[str, Dict[str, Any]]) -> str:
+    digest = hashlib.sha256()
+    for name in sorted(arrays):
+        digest.update(f"{name}:{arrays[name]['sha256']}".encode())
+    return digest.hexdigest()
+
+def _version_prefix(artifact_dir: str) -> str:
+    parent, name = os.path.split(artifact_dir)
+    return os.path.join(parent, f".{name}@")
+
+def _version_dirs(artifact_dir: str) -> List[str]:
+    prefix = _version_prefix(artifact_dir)
+    parent, name_prefix = os.path.split(prefix)
+    return [
+        os.path.join(parent, entry) for entry in os.listdir(parent or ".")
+        if entry.startswith(name_prefix) and _version_token.fullmatch(entry[len(name_prefix):])
+    ]
+
+def _publish(artifact_dir: str, version_dir: str):
+    if os.path.isdir(artifact_dir) and not os.path.islink(artifact_dir):
+        # Artifact written before versioned directories, a directory can't be replaced
+        # by a link atomically so it's moved aside as a previous version first
+        os.rename(artifact_dir, _version_prefix(artifact_dir) + uuid.uuid4().hex)
+
+    link_path = f"{artifact_dir}.{uuid.uuid4().hex}.link"
+    os.symlink(os.path.basename(version_dir), link_path)
+    os.replace(link_path, artifact_dir)
+
+def _prune_versions(artifact_dir: str, current: str):
+    # Only versions older than the published one, a concurrent writer's directory is newer
+    current_mtime = os.stat(current).st_mtime_ns
+    previous = sorted(
+        (d for d in _version_dirs(artifact_dir) if d != current and os.stat(d).st_mtime_ns <= current_mtime),
+        key=lambda d: os.stat(d).st_mtime_ns, reverse=True)
+    for version_dir in previous[_KEEP_VERSIONS:]:
+        shutil.rmtree(version_dir, ignore_errors=True)
+
+def write_artifact(artifact_dir: str,
+                   engine: str,
+                   model_version: Optional[str],
+                   params: Dict[str, Any],
+                   arrays: Dict[str, np.ndarray],
+                  ) -> str:
+    artifact_dir = os.path.normpath(artifact_dir)
+    os.makedirs(os.path.dirname(artifact_dir) or ".", exist_ok=True)
+    version_dir = _version_prefix(artifact_dir) + uuid.uuid4().hex
+    os.makedirs(version_dir)
+
+    entries: Dict[str, Dict[str, Any]] = {}
+    for name, array in arrays.items():
+        file_name = f"{name}.npy"
+        file_path = os.path.join(version_dir, file_name)
+        with open(file_path, "wb") as f:
+            np.save(f, np.ascontiguousarray(array), allow_pickle=False)
+        entries[name] = {
+            "file": file_name,
+            "dtype": str(array.dtype),
+            "shape": list(array.shape),
+            "sha256": _file_digest(file_path),
+        }
+
+    manifest = {
+        "format_version": ARTIFACT_FORMAT_VERSION,
+        "engine": engine,
+        "model_version": model_version,
+        "params": params,
+        "arrays": entries,
+        "checksum": _artifact_checksum(entries),
+    }
+    with open(manifest_path(version_dir), "w") as f:
+        json.dump(manifest, f, indent=2)
+
+    # Readers see either the previous version or this complete one
+    _publish(artifact_dir, version_dir)
+    _prune_versions(artifact_dir, version_dir)
+    return artifact_dir
+
+def read_manifest(artifact_dir: str) -> Dict[str, Any]:
+    with open(manifest_path(artifact_dir)) as f:
+        manifest = json.load(f)
+
+    version = manifest.get("format_version")
+    if version != ARTIFACT_FORMAT_VERSION:
+        raise ValueError(f"Unsupported artifact format version {version} in {artifact_dir}.")
+    return manifest
+
+def read_artifact(artifact_dir: str,
+                  mmap_mode: Optional[str] = "r",
+                  verify: bool = False,
+                 ) -> Tuple[Dict[str, Any], Dict[str, np.ndarray]]:
+    # Resolved once, a version published meanwhile doesn't mix into this read
+    artifact_dir = os.path.realpath(artifact_dir)
+    manifest = read_manifest(artifact_dir)
+    entries: Dict[str, Dict[str, Any]] = manifest["arrays"]
+
+    if verify:
+        if _artifact_checksum(entries) != manifest["checksum"]:
+            raise ValueError(f"Artifact manifest checksum mismatch in {artifact_dir}.")
+        for name, entry in entries.items():
+            if _file_digest(os.path.join(artifact_dir, entry["file"])) != entry["sha256"]:
+                raise ValueError(f"Artifact array {name} is corrupted in {artifact_dir}.")
+
+    arrays: Dict[str, np.ndarray] = {}
+    for name, entry in entries.items():
+        # Empty files can't be memory mapped
+        array_mmap_mode = mmap_mode if all(entry["shape"]) else None
+        arrays[name] = np.load(os.path.join(artifact_dir, entry["file"]), mmap_mode=array_mmap_mode, allow_pickle=False)
+
+    return manifest, arrays
@@ -0,0 +1,116 @@
+"""
+Post-training compaction of engines for low-memory serving.
+
+`ModelCompactor` compacts a fitted engine (`SailorEngine.compact`) at increasing
+vocabulary fractions and keeps the smallest one whose top-k accuracy stays
+within `tolerance` of the full engine on the given sessions. Pass held-out
+sessions for an accuracy figure, training sessions still measure how far the
+compacted engine drifts from the full one.
+"""
+import json
+import os
+import sys
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+import numpy as np
+from sklearn.feature_extraction.text import TfidfVectorizer
+
+from .compact_components import CompactTfidfVectorizer
+from .sailor_engine import SailorEngine
+from .types import SessionSpec
+
+DEFAULT_VOCABULARY_FRACTIONS = (0.1, 0.25, 0.5, 0.75, 1.0)
+
+def _vocabulary_bytes(tfidf: TfidfVectorizer) -> int:
+    """Resident size of the term lookup, the dict with its keys or the sorted array"""
+    if isinstance(tfidf, CompactTfidfVectorizer):
+        return tfidf.vocabulary_terms_.terms.nbytes
+    vocabulary = tfidf.vocabulary_
+    return sys.getsizeof(vocabulary) + sum(sys.getsizeof(term) for term in vocabulary)
+
+def model_footprint(engine: SailorEngine) -> Dict[str, int]:
+    arrays = {**engine.documentor.to_arrays(), **engine._vectorizer_arrays(), **engine._classifier_arrays()}
+    tfidf = engine.pipeline.named_steps['tfidf']
+    return {
+        "terms": len(tfidf.vocabulary_terms_) if isinstance(tfidf, CompactTfidfVectorizer) else len(tfidf.vocabulary_),
+        "artifact_bytes": int(sum(array.nbytes for array in arrays.values())),
+        "vocabulary_bytes": _vocabulary_bytes(tfidf),
+    }
+
+def _evaluate(engine: SailorEngine, queries: List[str], y_true: np.ndarray, top_k: int) -> Tuple[Dict[str, Any], np.ndarray]:
+    ranking = np.argsort(-engine.decision_scores(queries), axis=1, kind="stable")
+    metrics = {
+        "top1_accuracy": float(np.mean(ranking[:, 0] == y_true)),
+        "top_k_accuracy": float(np.mean((ranking[:, :top_k] == y_true[:, None]).any(axis=1))),
+        **model_footprint(engine),
+    }
+    return metrics, ranking[:, 0]
+
+class ModelCompactor:
+    def __init__(self,
+                 vocabulary_fractions: Sequence[float] = DEFAULT_VOCABULARY_FRACTIONS,
+                 dtype: str = "int8",
+                 tolerance: float = 0.01,
+                 top_k: int = 5,
+                 verbose: bool = False,
+                ):
+        self.vocabulary_fractions = sorted(vocabulary_fractions)
+        self.dtype = dtype
+        self.tolerance = tolerance
+        self.top_k = top_k
+        self._verbose = verbose
+
+    def compact(self,
+                engine: SailorEngine,
+                sessions: List[SessionSpec],
+                report_path: Optional[str] = None,
+               ) -> Tuple[SailorEngine, Dict[str, Any]]:
+        """
+        Smallest compacted engine within `tolerance` of the full engine's top-k
+        accuracy, or the largest fraction tried when none is. The report lists
+        every fraction tried and is written to `report_path` as JSON.
+        """
+        labels = set(engine.documentor.labels_)
+        sessions = [s for s in sessions if s.target in labels]
+        if not sessions:
+            raise ValueError("No sessions of the engine routes to evaluate compaction on.")
+
+        queries = [s.context for s in sessions]
+        y_true = engine.documentor.transform([s.target for s in sessions])
+        baseline, baseline_top1 = _evaluate(engine, queries, y_true, self.top_k)
+
+        candidates: List[Dict[str, Any]] = []
+        compacted: Optional[SailorEngine] = None
+        for fraction in self.vocabulary_fractions:
+            compacted = engine.compact(fraction, self.dtype)
+            metrics, top1 = _evaluate(compacted, queries, y_true, self.top_k)
+            candidate = {
+                "vocabulary_fraction": fraction,
+                **metrics,
+                "top1_delta": metrics["top1_accuracy"] - baseline["top1_accuracy"],
+                "top_k_delta": metrics["top_k_accuracy"] - baseline["top_k_accuracy"],
+                # Share of queries whose best route didn't move
+                "top1_agreement": float(np.mean(top1 == baseline_top1)),
+                "within_tolerance": baseline["top_k_accuracy"] - metrics["top_k_accuracy"] <= self.tolerance,
+            }
+            candidates.append(candidate)
+            if self._verbose:
+                print(f"[COMPACT] {type(engine).__name__} {fraction:.0%} of {baseline['terms']} terms: "
+                      f"top-{self.top_k} {candidate['top_k_delta']:+.3f}, {candidate['artifact_bytes']} bytes")
+            if candidate["within_tolerance"]: break
+
+        report = {
+            "engine": type(engine).__name__,
+            "dtype": self.dtype,
+            "top_k": self.top_k,
+            "tolerance": self.tolerance,
+            "n_queries": len(queries),
+            "baseline": baseline,
+            "compacted": candidates[-1],
+            "candidates": candidates,
+        }
+
+        if report_path is not None:
+            os.makedirs(os.path.dirname(report_path) or ".", exist_ok=True)
+            with open(report_path, "w") as f:
+                json.dump(report, f, indent=2)
+        return compacted, report # type: ignore
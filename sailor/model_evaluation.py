@@ -0,0 +1,202 @@
+"""
+Cross-validated evaluation and hyperparameter search across engines.
+
+Sessions are split in stratified folds, the held-out session contexts are the
+test queries. Each fold is tokenized once and vectorized once per TF-IDF config
+through `sailor.training_pipeline`, every classifier config of that fold then
+fits from the cached features. Folds and configs run on a process pool.
+"""
+import json
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Dict, List, Mapping, Optional, Sequence, Tuple, Type
+import numpy as np
+from sklearn.feature_extraction.text import TfidfVectorizer
+from sklearn.metrics import f1_score
+from sklearn.model_selection import ParameterGrid, StratifiedKFold
+
+from .model_artifact import manifest_path
+from .route_documentor import RouteDocumentor
+from .sailor_engine import SailorEngine, SVCSailorEngine, KNNSailorEngine
+from .training_pipeline import data_hash, load_features, save_features
+from .types import RouteSpec, SessionSpec
+
+_latency_queries = 100
+
+DEFAULT_TFIDF_GRID = {"ngram_range": [(1, 1), (1, 2)], "min_df": [1, 2]}
+
+DEFAULT_ENGINE_GRID: Dict[str, Tuple[Type[SailorEngine], Dict[str, Sequence[Any]]]] = {
+    "svc": (SVCSailorEngine, {"svc__C": [0.1, 1.0, 10.0]}),
+    "knn": (KNNSailorEngine, {"knn__n_neighbors": [3, 5, 10]}),
+}
+
+def _fits_samples(params: Mapping[str, Any], n_samples: int) -> bool:
+    """Whether a config can fit on `n_samples` rows, KNN can't ask for more neighbors than it has"""
+    return all(value <= n_samples for name, value in params.items() if name.endswith("n_neighbors"))
+
+def _tfidf(params: Mapping[str, Any]) -> TfidfVectorizer:
+    return TfidfVectorizer(stop_words='english', **params)
+
+def _fold_features(routes: List[RouteSpec],
+                   sessions: List[SessionSpec],
+                   tfidf_configs: List[Dict[str, Any]],
+                   cache_dir: str,
+                  ) -> List[str]:
+    """Features of one training fold for every TF-IDF config, the fold is tokenized at most once"""
+    features_dirs = [os.path.join(cache_dir, data_hash(routes, sessions, _tfidf(p))) for p in tfidf_configs]
+    missing = [i for i, d in enumerate(features_dirs) if not os.path.exists(manifest_path(d))]
+    if missing:
+        documentor = RouteDocumentor()
+        labels = documentor.fit_transform(routes, sessions)
+        for i in missing:
+            save_features(documentor, labels, _tfidf(tfidf_configs[i]), features_dirs[i])
+    return features_dirs
+
+def _evaluate_config(engine_cls: Type[SailorEngine],
+                     params: Dict[str, Any],
+                     features_dir: str,
+                     queries: List[str],
+                     targets: List[str],
+                     top_k: int,
+                    ) -> Dict[str, Any]:
+    documentor, documents, labels, tfidf, features = load_features(features_dir)
+    engine = engine_cls()
+    engine.pipeline.set_params(**params)
+    if 'tfidf' in engine.pipeline.named_steps:
+        # Same vectorizer config as the cached features, so only the classifier is fitted
+        engine.pipeline.named_steps['tfidf'].set_params(**tfidf.get_params())
+
+    start = time.perf_counter()
+    engine.fit_features(documentor, documents, labels, tfidf, features)
+    fit_seconds = time.perf_counter() - start
+
+    start = time.perf_counter()
+    scores = engine.decision_scores(queries)
+    batch_seconds = time.perf_counter() - start
+
+    latencies = []
+    for query in queries[:_latency_queries]:
+        start = time.perf_counter()
+        engine.predict(query, top_k=top_k)
+        latencies.append(time.perf_counter() - start)
+
+    n_routes = scores.shape[1]
+    y_true = documentor.transform(targets)
+    ranking = np.argsort(-scores, axis=1, kind="stable")
+    top_k_hits = (ranking[:, :top_k] == y_true[:, None]).any(axis=1)
+    route_f1 = f1_score(y_true, ranking[:, 0], labels=np.arange(n_routes), average=None, zero_division=0)
+
+    return {
+        "top1_accuracy": float(np.mean(ranking[:, 0] == y_true)),
+        "top_k_accuracy": float(np.mean(top_k_hits)),
+        "macro_f1": float(np.mean(route_f1)),
+        "route_f1": {documentor.label_routes[i].id: float(f1) for i, f1 in enumerate(route_f1)},
+        "fit_seconds": fit_seconds,
+        "batch_ms_per_query": 1000 * batch_seconds / max(len(queries), 1),
+        "predict_ms_p50": 1000 * float(np.percentile(latencies, 50)),
+        "predict_ms_p95": 1000 * float(np.percentile(latencies, 95)),
+        "predict_ms_p99": 1000 * float(np.percentile(latencies, 99)),
+    }
+
+def _mean_results(fold_results: List[Dict[str, Any]]) -> Dict[str, Any]:
+    summary: Dict[str, Any] = {}
+    for key, value in fold_results[0].items():
+        if key == "route_f1":
+            routes = {route for r in fold_results for route in r["route_f1"]}
+            summary[key] = {route: float(np.mean([r["route_f1"].get(route, 0.0) for r in fold_results])) for route in sorted(routes)}
+        else:
+            summary[key] = float(np.mean([r[key] for r in fold_results]))
+    return summary
+
+class ModelEvaluator:
+    """
+    K-fold evaluation of every engine config in `engine_grid` crossed with
+    every TF-IDF config in `tfidf_grid`, params of `engine_grid` use the engine
+    pipeline names (`svc__C`, `knn__n_neighbors`). Engines train on one document
+    per route, so KNN configs with more neighbors than routes are skipped.
+    """
+
+    def __init__(self,
+                 cache_dir: str,
+                 engine_grid: Optional[Dict[str, Tuple[Type[SailorEngine], Dict[str, Sequence[Any]]]]] = None,
+                 tfidf_grid: Optional[Dict[str, Sequence[Any]]] = None,
+                 n_splits: int = 5,
+                 top_k: int = 5,
+                 max_workers: Optional[int] = None,
+                 random_state: int = 14,
+                 verbose: bool = False,
+                ):
+        self.cache_dir = cache_dir
+        self.engine_grid = engine_grid if engine_grid is not None else DEFAULT_ENGINE_GRID
+        self.tfidf_grid = tfidf_grid if tfidf_grid is not None else DEFAULT_TFIDF_GRID
+        self.n_splits = n_splits
+        self.top_k = top_k
+        self.max_workers = max_workers
+        self.random_state = random_state
+        self._verbose = verbose
+
+    def folds(self, sessions: List[SessionSpec]) -> List[Tuple[List[SessionSpec], List[SessionSpec]]]:
+        splitter = StratifiedKFold(n_splits=self.n_splits, shuffle=True, random_state=self.random_state)
+        targets = [s.target for s in sessions]
+        return [
+            ([sessions[i] for i in train], [sessions[i] for i in test])
+            for train, test in splitter.split(np.zeros(len(sessions)), targets)
+        ]
+
+    def evaluate(self,
+                 routes: List[RouteSpec],
+                 sessions: List[SessionSpec],
+                 report_path: Optional[str] = None,
+                ) -> Dict[str, Any]:
+        """Run the whole grid, results are sorted by top-k accuracy and written to `report_path` as JSON"""
+        tfidf_configs = list(ParameterGrid(self.tfidf_grid))
+        folds = self.folds(sessions)
+
+        with ProcessPoolExecutor(max_workers=self.max_workers) as executor:
+            if self._verbose: print("[EVALUATE] Vectorizing", len(folds), "folds for", len(tfidf_configs), "TF-IDF configs")
+            fold_dirs = list(executor.map(
+                _fold_features,
+                [routes] * len(folds),
+                [train for train, _ in folds],
+                [tfidf_configs] * len(folds),
+                [self.cache_dir] * len(folds)))
+
+            jobs = []
+            for engine_name, (engine_cls, grid) in self.engine_grid.items():
+                for t, tfidf_params in enumerate(tfidf_configs):
+                    for params in ParameterGrid(grid):
+                        if not _fits_samples(params, len(routes)):
+                            if self._verbose and t == 0: print("[EVALUATE] Skipping", engine_name, params, "for", len(routes), "routes")
+                            continue
+                        futures = [
+                            executor.submit(
+                                _evaluate_config, engine_cls, params, fold_dirs[f][t],
+                                [s.context for s in test], [s.target for s in test], self.top_k)
+                            for f, (_, test) in enumerate(folds)
+                        ]
+                        jobs.append((engine_name, {**{f"tfidf__{k}": v for k, v in tfidf_params.items()}, **params}, futures))
+
+            if self._verbose: print("[EVALUATE] Running", len(jobs), "configs on", len(folds), "folds")
+            results = []
+            for engine_name, params, futures in jobs:
+                summary = _mean_results([future.result() for future in futures])
+                results.append({"engine": engine_name, "params": params, **summary})
+                if self._verbose:
+                    print(f"[EVALUATE] {engine_name} {params}: top-{self.top_k} {summary['top_k_accuracy']:.3f}, macro F1 {summary['macro_f1']:.3f}")
+
+        results.sort(key=lambda r: (r["top_k_accuracy"], r["macro_f1"]), reverse=True)
+        report = {
+            "n_splits": self.n_splits,
+            "top_k": self.top_k,
+            "n_routes": len(routes),
+            "n_sessions": len(sessions),
+            "best": {engine: next(r for r in results if r["engine"] == engine) for engine in self.engine_grid if any(r["engine"] == engine for r in results)},
+            "results": results,
+        }
+
+        if report_path is not None:
+            os.makedirs(os.path.dirname(report_path) or ".", exist_ok=True)
+            with open(report_path, "w") as f:
+                json.dump(report, f, indent=2)
+        return report
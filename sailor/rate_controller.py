@@ -0,0 +1,177 @@
+"""
+Adaptive concurrency and rate limiting for LLM generation requests.
+
+One controller is shared by every request of a `SailorDataEngineer`. The
+concurrency limit follows AIMD: it grows by one per window of successful
+requests, and shrinks multiplicatively on 429s and when latency climbs above
+its floor. After a 429 every request waits out the provider's retry hint
+(or a jittered backoff), not only the one that was rejected. An optional
+token bucket caps the request rate at the account quota.
+"""
+import asyncio
+import random
+import time
+from email.utils import parsedate_to_datetime
+from typing import Any, Awaitable, Callable, Dict, Optional, TypeVar
+from openai import APIConnectionError, InternalServerError, RateLimitError
+
+_T = TypeVar("_T")
+
+_latency_backoff = 0.9
+_rate_limit_backoff = 0.5
+# Retry hints are spread a little so paused requests don't resume together
+_retry_jitter = 0.1
+
+def retry_after(error: Exception) -> Optional[float]:
+    """Seconds to wait from the `retry-after-ms` or `retry-after` headers of an API error"""
+    response = getattr(error, "response", None)
+    if response is None: return None
+    headers = response.headers
+
+    value = headers.get("retry-after-ms")
+    if value is not None:
+        try:
+            return float(value) / 1000
+        except ValueError:
+            pass
+
+    value = headers.get("retry-after")
+    if value is None: return None
+    try:
+        return float(value)
+    except ValueError:
+        pass
+    try:
+        return max(parsedate_to_datetime(value).timestamp() - time.time(), 0.0)
+    except (TypeError, ValueError):
+        return None
+
+class AdaptiveRateController:
+    def __init__(self,
+                 initial_concurrency: int = 5,
+                 min_concurrency: int = 1,
+                 max_concurrency: int = 64,
+                 requests_per_minute: Optional[float] = None,
+                 burst: int = 1,
+                 latency_tolerance: float = 2.0,
+                 backoff_base: float = 1.0,
+                 backoff_cap: float = 60.0,
+                 max_retries: int = 8,
+                 verbose: bool = False,
+                ):
+        self.min_concurrency = min_concurrency
+        self.max_concurrency = max_concurrency
+        self.limit = float(min(max(initial_concurrency, min_concurrency), max_concurrency))
+        self.requests_per_minute = requests_per_minute
+        self.burst = max(burst, 1)
+        self.latency_tolerance = latency_tolerance
+        self.backoff_base = backoff_base
+        self.backoff_cap = backoff_cap
+        self.max_retries = max_retries
+        self._verbose = verbose
+
+        self._in_flight = 0
+        self._condition = asyncio.Condition()
+        self._paused_until = 0.0
+        self._next_token = 0.0
+        self._min_latency: Optional[float] = None
+        self._since_decrease = 0
+        self.stats: Dict[str, Any] = {"requests": 0, "rate_limited": 0, "retried": 0, "failed": 0}
+
+    async def run(self, request: Callable[[], Awaitable[_T]]) -> _T:
+        """Run `request` within the limits, retrying rate limits and transient errors"""
+        attempt = 0
+        while True:
+            delay = 0.0
+            await self._acquire()
+            # The slot is released however the attempt ends, cancellation included
+            try:
+                await self._wait_turn()
+                start = time.monotonic()
+                result = await request()
+                await self._on_success(time.monotonic() - start)
+                return result
+            except RateLimitError as e:
+                if attempt >= self.max_retries:
+                    self.stats["failed"] += 1
+                    raise
+                self._on_rate_limited(retry_after(e), attempt)
+            except (APIConnectionError, InternalServerError) as e:
+                if attempt >= self.max_retries:
+                    self.stats["failed"] += 1
+                    raise
+                delay = self._backoff(attempt)
+                if self._verbose: print(f"[RATE_CONTROL] {type(e).__name__}, retrying in {delay:.1f}s")
+            finally:
+                await asyncio.shield(self._release())
+
+            if delay > 0:
+                await asyncio.sleep(delay)
+            attempt += 1
+            self.stats["retried"] += 1
+
+    async def _acquire(self):
+        async with self._condition:
+            await self._condition.wait_for(lambda: self._in_flight < int(self.limit))
+            self._in_flight += 1
+
+    async def _wait_turn(self):
+        while True:
+            # Pause is re-read after each sleep, a new 429 may have extended it
+            delay = self._paused_until - time.monotonic()
+            if delay <= 0: break
+            await asyncio.sleep(delay)
+        token_delay = self._take_token()
+        if token_delay > 0:
+            await asyncio.sleep(token_delay)
+        self.stats["requests"] += 1
+
+    async def _release(self):
+        async with self._condition:
+            self._in_flight -= 1
+            self._condition.notify_all()
+
+    def _take_token(self) -> float:
+        """Reserve the next request slot of the token bucket, returns how long to wait for it"""
+        if not self.requests_per_minute: return 0.0
+        interval = 60 / self.requests_per_minute
+        now = time.monotonic()
+        # Up to `burst` requests may go ahead of the steady rate
+        start = max(self._next_token, now - (self.burst - 1) * interval)
+        self._next_token = start + interval
+        return max(start - now, 0.0)
+
+    def _backoff(self, attempt: int) -> float:
+        """Full jitter exponential backoff"""
+        return random.uniform(0, min(self.backoff_cap, self.backoff_base * 2 ** attempt))
+
+    async def _on_success(self, latency: float):
+        if self._min_latency is None or latency < self._min_latency:
+            self._min_latency = latency
+
+        self._since_decrease += 1
+        if latency > self.latency_tolerance * self._min_latency:
+            # Queueing on the provider side, back off at most once per window
+            if self._since_decrease >= self.limit:
+                self._decrease(_latency_backoff)
+            return
+
+        async with self._condition:
+            self.limit = min(self.limit + 1 / self.limit, float(self.max_concurrency))
+            # A raised limit may admit waiting requests on its own
+            self._condition.notify_all()
+
+    def _on_rate_limited(self, hint: Optional[float], attempt: int):
+        self.stats["rate_limited"] += 1
+        now = time.monotonic()
+        delay = hint * (1 + random.uniform(0, _retry_jitter)) if hint is not None else self._backoff(attempt)
+
+        # 429s answered within the same pause come from the same burst, halve once
+        if now >= self._paused_until:
+            self._decrease(_rate_limit_backoff)
+            if self._verbose: print(f"[RATE_CONTROL] Rate limited, pausing {delay:.1f}s with concurrency {int(self.limit)}")
+        self._paused_until = max(self._paused_until, now + delay)
+
+    def _decrease(self, factor: float):
+        self.limit = max(self.limit * factor, float(self.min_concurrency))
+        self._since_decrease = 0
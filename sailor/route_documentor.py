@@ -1,20 +1,45 @@
-import spacy
+import io
 import string
 import numpy as np
-from typing import Dict, List
+from functools import lru_cache
+from typing import Dict, Iterable, Iterator, List, Set, Tuple
 from sklearn.preprocessing import LabelEncoder
 from sailor.types import RouteSpec, SessionSpec, RouteContext
+from sailor.model_artifact import pack_strings, unpack_strings
+
+_SPACY_MODEL = "en_core_web_lg"
+
+# Session parsing only reads lexical attributes (is_stop, is_alpha), which the
+# tokenizer sets on its own, so every trained component and the vectors are skipped.
+_SPACY_EXCLUDE = ["tok2vec", "tagger", "parser", "senter", "attribute_ruler", "lemmatizer", "ner", "vectors"]
+
+@lru_cache(maxsize=None)
+def _load_tokenizer(model: str = _SPACY_MODEL):
+    import spacy
+    return spacy.load(model, exclude=_SPACY_EXCLUDE)
 
 class RouteDocumentor:
-    def __init__(self):
+    def __init__(self, batch_size: int = 1000, n_process: int = 1):
         self._label_encoder = LabelEncoder()
-        self._tokenizer = spacy.load("en_core_web_lg")
-        self._routes: Dict[str, RouteContext]
+        self._batch_size = batch_size
+        self._n_process = n_process
+        self._routes: Dict[str, RouteContext] = {}
+        self._label_routes: List[RouteContext] = []
+
+    @property
+    def _tokenizer(self):
+        # Loaded on first fit only, inference never tokenizes with spaCy
+        return _load_tokenizer()
 
     @property
     def labels_(self):
         return self._label_encoder.classes_
 
+    @property
+    def label_routes(self) -> List[RouteContext]:
+        """Routes indexed by their encoded label"""
+        return self._label_routes
+
     @property
     def documents(self):
         return [r.context for r in self._routes.values()]
@@ -27,16 +52,82 @@ class RouteDocumentor:
 
     def fit_transform(self, routes: List[RouteSpec], sessions: List[SessionSpec]):
         self._fit(routes, sessions)
+        return self._fit_labels()
+
+    def fit_transform_stream(self, routes: List[RouteSpec], session_chunks: Iterable[Iterable[SessionSpec]]):
+        """
+        Out-of-core fit, sessions are consumed chunk by chunk and only their kept
+        tokens are accumulated. Routes get the same contexts as `fit_transform`.
+        """
+        self._fit(routes, (s for chunk in session_chunks for s in chunk))
+        return self._fit_labels()
+
+    def partial_fit_transform(self, routes: List[RouteSpec], sessions: List[SessionSpec]) -> Tuple[List[str], np.ndarray]:
+        """
+        Incremental fit, unseen routes take the next free label and known routes are
+        updated in place. Returns one training document per route and per session,
+        session contexts are kept raw for the online engine's own tokenizer.
+        """
+        label_index = {r.id: label for label, r in enumerate(self._label_routes)}
+        documents: List[str] = []
+        labels: List[int] = []
+
+        for route in routes:
+            parsed_route = self._parse_route(route, "")
+            label = label_index.get(route.id)
+            if label is None:
+                label = label_index[route.id] = len(self._label_routes)
+                self._label_routes.append(parsed_route)
+            else:
+                self._label_routes[label] = parsed_route
+            self._routes[route.id] = parsed_route
+            documents.append(parsed_route.context)
+            labels.append(label)
+
+        for session in sessions:
+            label = label_index.get(session.target)
+            if label is None: continue
+            documents.append(session.context)
+            labels.append(label)
+
+        # Labels follow arrival order here, `transform` doesn't rely on sorted classes
+        self._label_encoder.classes_ = np.array([r.id for r in self._label_routes], dtype=object)
+        return documents, np.array(labels, dtype=np.int64)
+
+    def _fit_labels(self):
         route_labels = list(self._routes.keys())
         labels = self._label_encoder.fit_transform(route_labels)
+        self._label_routes = [self._routes[route_id] for route_id in self._label_encoder.classes_]
         return np.array(labels)
 
-    def _fit(self, routes: List[RouteSpec], sessions: List[SessionSpec]):
-        sessions = sessions.copy()
-        parsed_routes = [self._parse_route(r, sessions) for r in routes]
+    def _fit(self, routes: List[RouteSpec], sessions: Iterable[SessionSpec]):
+        session_texts = self._session_texts(routes, sessions)
+        parsed_routes = [self._parse_route(r, session_texts[r.id]) for r in routes]
         self._routes = {r.id: r for r in parsed_routes}
 
-    def _parse_route(self, route: RouteSpec, sessions: List[SessionSpec]) -> RouteContext:
+    def _session_texts(self, routes: List[RouteSpec], sessions: Iterable[SessionSpec]) -> Dict[str, str]:
+        """Kept tokens of each route's sessions in arrival order, sessions are dropped once tokenized"""
+        session_texts: Dict[str, io.StringIO] = {r.id: io.StringIO() for r in routes}
+        for route_id, tokens in self._iter_session_tokens(set(session_texts), sessions):
+            if not tokens: continue
+            text = session_texts[route_id]
+            if text.tell():
+                text.write(" ")
+            text.write(" ".join(tokens))
+        return {route_id: text.getvalue() for route_id, text in session_texts.items()}
+
+    def _iter_session_tokens(self, route_ids: Set[str], sessions: Iterable[SessionSpec]) -> Iterator[Tuple[str, List[str]]]:
+        session_contexts = ((s.context, s.target) for s in sessions if s.target in route_ids)
+
+        docs = self._tokenizer.pipe(
+            session_contexts,
+            as_tuples=True,
+            batch_size=self._batch_size,
+            n_process=self._n_process)
+        for doc, route_id in docs:
+            yield route_id, [t.text for t in doc if not t.is_stop and t.is_alpha]
+
+    def _parse_route(self, route: RouteSpec, session_text: str) -> RouteContext:
         context: List[str] = []
 
         for path in route.path.split('/'):
@@ -46,21 +137,36 @@ class RouteDocumentor:
         for tag in route.tags:
             context.append(tag)
 
-        session_context: List[str] = []
-        for i, s in enumerate(sessions):
-            if s.target == route.id:
-                session_context.append(s.context)
-                sessions.pop(i)
-
-        docs = self._tokenizer.pipe(session_context)
-        session_tokens = [t.text for d in docs for t in d if not t.is_stop and t.is_alpha]
-        context.append(" ".join(session_tokens))
+        context.append(session_text)
 
         return RouteContext(id=route.id, path=route.path, context=" ".join(context))
 
     def transform(self, labels: list[str]):
-        return self._label_encoder.transform(labels)
+        label_index = {route_id: label for label, route_id in enumerate(self.labels_)}
+        try:
+            return np.array([label_index[route_id] for route_id in labels])
+        except KeyError as e:
+            raise ValueError(f"Route with id {e.args[0]} not found.")
 
     def inverse_transform(self, label: int) -> RouteContext:
-        route_id = self._label_encoder.inverse_transform([label])[0]
-        return self.get_route(route_id)
+        return self._label_routes[label]
+
+    def to_arrays(self) -> Dict[str, np.ndarray]:
+        """Route table ordered by label, as packed string arrays"""
+        arrays: Dict[str, np.ndarray] = {}
+        for field in ("id", "path", "context"):
+            values = [getattr(r, field) for r in self._label_routes]
+            arrays[f"route_{field}_data"], arrays[f"route_{field}_offsets"] = pack_strings(values)
+        return arrays
+
+    def load_arrays(self, arrays: Dict[str, np.ndarray]):
+        ids, paths, contexts = (
+            unpack_strings(arrays[f"route_{field}_data"], arrays[f"route_{field}_offsets"])
+            for field in ("id", "path", "context")
+        )
+        self._label_routes = [
+            RouteContext(id=route_id, path=path, context=context)
+            for route_id, path, context in zip(ids, paths, contexts)
+        ]
+        self._routes = {r.id: r for r in self._label_routes}
+        self._label_encoder.classes_ = np.array(ids, dtype=object)
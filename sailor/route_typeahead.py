@@ -0,0 +1,124 @@
+import re
+from bisect import bisect_left
+from collections import Counter
+from dataclasses import dataclass
+from typing import List, Optional, Tuple
+import numpy as np
+
+from .route_documentor import RouteDocumentor
+from .types import RouteContextResult
+
+_token_pattern = re.compile(r"[a-z0-9]+")
+
+# Any char sorting after every token char, closes a prefix range
+_prefix_end = "\uffff"
+
+@dataclass(frozen=True)
+class TypeaheadState:
+    """What a keystroke computed, handed back on the next one to narrow instead of re-scoring"""
+    completed: Tuple[str, ...]
+    base_scores: np.ndarray
+    prefix: str
+    lo: int
+    hi: int
+
+class RouteTypeahead:
+    """
+    As-you-type route suggestions over a sorted term array built from the route
+    paths, tags and session tokens gathered by the `RouteDocumentor`.
+
+    Completed words add their exact term weight, the word being typed adds the
+    weights of every term it prefixes. Terms are sorted, so a prefix is one
+    contiguous range of postings and each keystroke only narrows that range.
+    """
+
+    def __init__(self, documentor: RouteDocumentor):
+        self._routes = documentor.label_routes
+        self._build([route.context for route in self._routes])
+
+    def _build(self, contexts: List[str]):
+        route_counts = [Counter(_token_pattern.findall(context.lower())) for context in contexts]
+        document_frequency: Counter = Counter()
+        for counts in route_counts:
+            document_frequency.update(counts.keys())
+
+        self.terms: List[str] = sorted(document_frequency)
+        term_index = {term: i for i, term in enumerate(self.terms)}
+        n_routes = len(contexts)
+        idf = {term: np.log((1 + n_routes) / (1 + df)) + 1 for term, df in document_frequency.items()}
+
+        postings: List[List[Tuple[int, float]]] = [[] for _ in self.terms]
+        for route, counts in enumerate(route_counts):
+            weights = {term: (1 + np.log(count)) * idf[term] for term, count in counts.items()}
+            norm = np.sqrt(sum(w * w for w in weights.values())) or 1.0
+            for term, weight in weights.items():
+                postings[term_index[term]].append((route, weight / norm))
+
+        self._indptr = np.zeros(len(self.terms) + 1, dtype=np.int64)
+        np.cumsum([len(p) for p in postings], out=self._indptr[1:])
+        self._posting_routes = np.array([route for p in postings for route, _ in p], dtype=np.int64)
+        self._posting_weights = np.array([weight for p in postings for _, weight in p], dtype=np.float64)
+
+    def suggest(self,
+                query: str,
+                top_k: int = 10,
+                state: Optional[TypeaheadState] = None,
+               ) -> Tuple[List[RouteContextResult], TypeaheadState]:
+        tokens = _token_pattern.findall(query.lower())
+        typing = bool(tokens) and not query[-1:].isspace()
+        completed = tuple(tokens[:-1] if typing else tokens)
+        prefix = tokens[-1] if typing else ""
+
+        base_scores = self._base_scores(completed, state)
+
+        if state is not None and state.prefix and state.completed == completed and prefix.startswith(state.prefix):
+            lo, hi = self._prefix_range(prefix, state.lo, state.hi)
+        else:
+            lo, hi = self._prefix_range(prefix, 0, len(self.terms))
+
+        scores = base_scores
+        if prefix:
+            start, end = self._indptr[lo], self._indptr[hi]
+            scores = base_scores + np.bincount(
+                self._posting_routes[start:end],
+                weights=self._posting_weights[start:end],
+                minlength=len(self._routes))
+
+        next_state = TypeaheadState(completed=completed, base_scores=base_scores, prefix=prefix, lo=lo, hi=hi)
+        return self._top_routes(scores, top_k), next_state
+
+    def _base_scores(self, completed: Tuple[str, ...], state: Optional[TypeaheadState]) -> np.ndarray:
+        if state is not None and state.completed == completed:
+            return state.base_scores
+
+        start = 0
+        scores = np.zeros(len(self._routes))
+        if state is not None and completed[:len(state.completed)] == state.completed:
+            start = len(state.completed)
+            scores = state.base_scores.copy()
+
+        for token in completed[start:]:
+            lo, hi = self._prefix_range(token, 0, len(self.terms))
+            # Exact word when known, otherwise it still counts as a prefix
+            if lo < hi and self.terms[lo] == token:
+                hi = lo + 1
+            begin, end = self._indptr[lo], self._indptr[hi]
+            scores += np.bincount(
+                self._posting_routes[begin:end],
+                weights=self._posting_weights[begin:end],
+                minlength=len(self._routes))
+        return scores
+
+    def _prefix_range(self, prefix: str, lo: int, hi: int) -> Tuple[int, int]:
+        if not prefix:
+            return lo, lo
+        start = bisect_left(self.terms, prefix, lo, hi)
+        end = bisect_left(self.terms, prefix + _prefix_end, start, hi)
+        return start, end
+
+    def _top_routes(self, scores: np.ndarray, top_k: int) -> List[RouteContextResult]:
+        candidates = np.flatnonzero(scores)
+        if len(candidates) > top_k:
+            candidates = candidates[np.argpartition(-scores[candidates], top_k - 1)[:top_k]]
+        candidates = candidates[np.argsort(-scores[candidates], kind="stable")]
+        return [self._routes[i].copy_with_score(float(scores[i])) for i in candidates]
@@ -1,16 +1,29 @@
 import asyncio
+import json
 import os
 import sqlite3
 import hashlib
 import uuid
-from typing import AsyncGenerator, Awaitable, List, Optional
-from openai import AsyncOpenAI, RateLimitError
+from abc import ABC, abstractmethod
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from itertools import zip_longest
+from typing import Any, AsyncGenerator, Callable, Dict, Iterator, List, Optional, Type, TypeVar
+from openai import AsyncOpenAI
 from openai.types.chat import ChatCompletionMessageParam
+from pydantic import BaseModel
+from sailor.rate_controller import AdaptiveRateController
+from sailor.session_dedup import MinHashDeduplicator, text_hash
 from sailor.types import RouteSpec, SessionSpec, RouteResponse, SessionResponse
 
-_rate_limit_timeout = 60
 _max_sessions_per_fetch = 50
-_max_semaphore = 5
+_initial_concurrency = 5
+_session_chunk_size = 10_000
+# Rounds of top-up batches when dedup drops part of a job's sessions
+_max_generation_rounds = 3
+
+_T = TypeVar("_T")
+_M = TypeVar("_M", bound=BaseModel)
 
 class RouteGenConfig:
     def __init__(self,
@@ -18,36 +31,97 @@ class RouteGenConfig:
                  model: str,
                  base_url: str | None = None,
                  temperature: float = 0.7,
+                 max_concurrency: int = 64,
+                 requests_per_minute: float | None = None,
                 ):
         self.api_key = api_key
         self.base_url = base_url
         self.model = model
         self.temperature = temperature
+        self.max_concurrency = max_concurrency
+        self.requests_per_minute = requests_per_minute
 
     @classmethod
     def from_env(cls):
+        requests_per_minute = os.getenv("AI_REQUESTS_PER_MINUTE")
         return cls(
             api_key=os.getenv("AI_API_KEY"), # type: ignore
             model=os.getenv("AI_MODEL"), # type: ignore
-            base_url=os.getenv("AI_MODEL_URL"))
+            base_url=os.getenv("AI_MODEL_URL"),
+            max_concurrency=int(os.getenv("AI_MAX_CONCURRENCY", "64")),
+            requests_per_minute=float(requests_per_minute) if requests_per_minute else None)
+
+def session_batches(count: int) -> List[int]:
+    """Split a session count in request sized batches"""
+    return [min(_max_sessions_per_fetch, count - start) for start in range(0, max(count, 0), _max_sessions_per_fetch)]
+
+class ResponseCache(ABC):
+    """Parsed generation responses by request hash, a request already paid for is never sent again"""
+
+    @abstractmethod
+    async def get(self, key: str) -> Optional[str]: ...
+
+    @abstractmethod
+    async def set(self, key: str, response: str): ...
 
 class SailorDataEngineer:
-    def __init__(self, config: RouteGenConfig, verbose: bool = False):
+    def __init__(self, config: RouteGenConfig, verbose: bool = False, controller: Optional[AdaptiveRateController] = None):
         self._verbose = verbose
         self._config = config
-        self._client = AsyncOpenAI(api_key=config.api_key, base_url=config.base_url).beta
-        self._fetch_semaphore = asyncio.Semaphore(_max_semaphore)
+        # Retries belong to the controller, the client would retry 429s on its own
+        self._client = AsyncOpenAI(api_key=config.api_key, base_url=config.base_url, max_retries=0).beta
+        self.controller = controller or AdaptiveRateController(
+            initial_concurrency=min(_initial_concurrency, config.max_concurrency),
+            max_concurrency=config.max_concurrency,
+            requests_per_minute=config.requests_per_minute,
+            verbose=verbose)
+        self.response_cache: Optional[ResponseCache] = None
+
+    def request_hash(self, messages: List[ChatCompletionMessageParam], response_format: Type[BaseModel], variant: str = "") -> str:
+        """
+        Identifies a generation request. `variant` tells apart requests sent with the
+        same prompt on purpose, e.g. the batches of a session job.
+        """
+        request = {
+            "model": self._config.model,
+            "temperature": self._config.temperature,
+            "messages": messages,
+            "response_format": response_format.__name__,
+            "variant": variant,
+        }
+        return hashlib.sha256(json.dumps(request, sort_keys=True).encode()).hexdigest()
+
+    async def _parse(self, messages: List[ChatCompletionMessageParam], response_format: Type[_M], variant: str) -> Optional[_M]:
+        key = None
+        if self.response_cache is not None:
+            key = self.request_hash(messages, response_format, variant)
+            cached = await self.response_cache.get(key)
+            if cached is not None:
+                if self._verbose: print("[GENERATE] Reusing cached response", key[:12])
+                return response_format.model_validate_json(cached)
+
+        response = await self.controller.run(lambda: self._client.chat.completions.parse(
+            model=self._config.model,
+            messages=messages,
+            temperature=self._config.temperature,
+            response_format=response_format
+        ))
 
-    async def generate_routes(self, context: str, count: int) -> List[RouteSpec]:
+        parsed = response.choices[0].message.parsed
+        if key is not None and parsed is not None:
+            await self.response_cache.set(key, parsed.model_dump_json()) # type: ignore
+        return parsed
+
+    async def generate_routes(self, context: str, count: int, variant: str = "") -> List[RouteSpec]:
         if self._verbose: print("[GENERATE_ROUTE] Generating", count, "routes for context:", context)
 
-        routes = await self._generate_routes(context, count)
+        routes = await self._generate_routes(context, count, variant)
         if routes is None:
             raise ValueError("No routes generated")
 
         return routes.routes
 
-    async def _generate_routes(self, context: str, count: int) -> RouteResponse | None:
+    async def _generate_routes(self, context: str, count: int, variant: str = "") -> RouteResponse | None:
         system_context = """
             Act as a UX data synthesis specialist for complex administrative systems.
             To generate the route data, you must follow the following rules:
@@ -65,32 +139,29 @@ class SailorDataEngineer:
         ]
 
         if self._verbose: print("[GENERATE_ROUTE] Generating routes for context:", context)
-        response = await self._client.chat.completions.parse(
-            model=self._config.model,
-            messages=messages,
-            temperature=self._config.temperature,
-            response_format=RouteResponse
-        )
-
-        return response.choices[0].message.parsed
+        return await self._parse(messages, RouteResponse, variant)
 
     async def generate_sessions(self, context: RouteSpec, count: int) -> AsyncGenerator[List[SessionSpec], None]:
         if self._verbose: print("[GENERATE_SESSION] Generating", count, "sessions for route:", context.id)
 
-        remaining = count
-        while remaining > 0:
-            try:
-                batch_count = min(remaining, _max_sessions_per_fetch)
-                async with self._fetch_semaphore:
-                    response = await self._generate_sessions(context, batch_count)
-                if response: yield response.sessions
-                remaining -= batch_count
-            except RateLimitError:
-                if self._verbose: print("[GENERATE_SESSION] Rate limit reached. Pausing for 1 minute...")
-                async with self._fetch_semaphore:
-                    await asyncio.sleep(_rate_limit_timeout)
-
-    async def _generate_sessions(self, context: RouteSpec, count: int) -> Optional[SessionResponse]:
+        # Every batch is queued at once, the controller decides how many run.
+        # Batches share a prompt, a distinct variant keeps them apart in the response cache
+        call_id = uuid.uuid4().hex
+        tasks = [asyncio.ensure_future(self.generate_session_batch(context, n, variant=f"{call_id}:{i}"))
+                 for i, n in enumerate(session_batches(count))]
+        try:
+            for task in asyncio.as_completed(tasks):
+                sessions = await task
+                if sessions: yield sessions
+        finally:
+            for task in tasks: task.cancel()
+
+    async def generate_session_batch(self, context: RouteSpec, count: int, variant: str = "") -> List[SessionSpec]:
+        """One generation request of at most `_max_sessions_per_fetch` sessions"""
+        response = await self._generate_sessions(context, count, variant)
+        return response.sessions if response else []
+
+    async def _generate_sessions(self, context: RouteSpec, count: int, variant: str = "") -> Optional[SessionResponse]:
         system_context = """
             Act as a UX data synthesis specialist for complex administrative systems.
             To generate the session data, you must follow the following rules:
@@ -113,19 +184,86 @@ class SailorDataEngineer:
         ]
 
         if self._verbose: print("[GENERATE_SESSION] Generating sessions for route:", context.id)
-        response = await self._client.chat.completions.parse(
-            model=self._config.model,
-            messages=messages,
-            temperature=self._config.temperature,
-            response_format=SessionResponse
-        )
+        return await self._parse(messages, SessionResponse, variant)
+
+def _fetchall(db: sqlite3.Connection, query: str, params: tuple) -> List[tuple]:
+    return db.execute(query, params).fetchall()
+
+def _execute(db: sqlite3.Connection, query: str, params: tuple) -> sqlite3.Cursor:
+    return db.execute(query, params)
+
+def _fetchmany(_: sqlite3.Connection, cursor: sqlite3.Cursor, size: int) -> List[tuple]:
+    return cursor.fetchmany(size)
+
+def _close_cursor(_: sqlite3.Connection, cursor: sqlite3.Cursor):
+    cursor.close()
+
+def _executemany(db: sqlite3.Connection, query: str, rows: List[tuple]):
+    with db:
+        db.executemany(query, rows)
+
+class _SQLiteWorker:
+    """Owns a sqlite connection on a dedicated thread so queries never block the event loop"""
+
+    def __init__(self, db_path: str):
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="sailor-db")
+        self._db = self._executor.submit(self._connect, db_path).result()
+
+    @staticmethod
+    def _connect(db_path: str) -> sqlite3.Connection:
+        db = sqlite3.connect(db_path)
+        db.execute("PRAGMA journal_mode=WAL")
+        db.execute("PRAGMA synchronous=NORMAL")
+        return db
+
+    def run_sync(self, fn: Callable[..., _T], *args: Any) -> _T:
+        return self._executor.submit(fn, self._db, *args).result()
+
+    async def run(self, fn: Callable[..., _T], *args: Any) -> _T:
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, fn, self._db, *args)
+
+    def close(self):
+        self._executor.submit(self._db.close).result()
+        self._executor.shutdown()
 
-        return response.choices[0].message.parsed
+def _column_names(db: sqlite3.Connection, table: str) -> List[str]:
+    return [row[1] for row in db.execute(f'PRAGMA table_info({table})')]
+
+class _SQLiteResponseCache(ResponseCache):
+    def __init__(self, db: _SQLiteWorker):
+        self._db = db
+
+    async def get(self, key: str) -> Optional[str]:
+        rows = await self._db.run(_fetchall, 'SELECT response FROM generation_cache WHERE request_hash = ?', (key,))
+        return rows[0][0] if rows else None
+
+    async def set(self, key: str, response: str):
+        await self._db.run(_executemany, 'INSERT OR REPLACE INTO generation_cache (request_hash, response) VALUES (?, ?)', [(key, response)])
 
 class SailorDataWarehouse:
-    def __init__(self, config: RouteGenConfig, context: str, db_path: str, verbose: bool = False):
+    """
+    Generated routes and sessions of a context, persisted in sqlite.
+
+    Session generation runs as resumable jobs: each route's target and completed
+    counts, and every planned batch, are stored before requests are sent, so a
+    rerun after a crash only requests what is still missing. Responses are cached
+    by request hash and sessions are deduplicated as each batch is ingested.
+    """
+
+    def __init__(self,
+                 config: RouteGenConfig,
+                 context: str,
+                 db_path: str,
+                 verbose: bool = False,
+                 near_duplicate_threshold: Optional[float] = None,
+                ):
         self._verbose = verbose
         self.enginner = SailorDataEngineer(config, verbose=verbose)
+        self.near_duplicate_threshold = near_duplicate_threshold
+        self._near_duplicates: Dict[str, MinHashDeduplicator] = {}
+        # Batches of a route are filtered and stored one at a time
+        self._ingest_locks: Dict[str, asyncio.Lock] = defaultdict(asyncio.Lock)
 
         context_hash = hashlib.md5(context.encode()).hexdigest()
         self.context = context
@@ -134,11 +272,13 @@ class SailorDataWarehouse:
         db_path = os.path.join(db_path, f"{context_hash}.db")
         os.makedirs(os.path.dirname(db_path), exist_ok=True)
 
-        self.db = sqlite3.connect(db_path)
-        self._init()
+        self.db = _SQLiteWorker(db_path)
+        self.db.run_sync(self._init)
+        self.enginner.response_cache = _SQLiteResponseCache(self.db)
 
-    def _init(self):
-        cursor = self.db.cursor()
+    @staticmethod
+    def _init(db: sqlite3.Connection):
+        cursor = db.cursor()
         cursor.execute('''
             CREATE TABLE IF NOT EXISTS routes_registry (
                 id TEXT PRIMARY KEY,
@@ -155,20 +295,61 @@ class SailorDataWarehouse:
                 intention_context TEXT NOT NULL
             )
         ''')
-        self.db.commit()
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS generation_jobs (
+                route_id TEXT PRIMARY KEY,
+                run INTEGER NOT NULL,
+                target INTEGER NOT NULL,
+                completed INTEGER NOT NULL,
+                status TEXT NOT NULL,
+                updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+            )
+        ''')
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS generation_batches (
+                route_id TEXT NOT NULL,
+                run INTEGER NOT NULL,
+                batch_no INTEGER NOT NULL,
+                count INTEGER NOT NULL,
+                status TEXT NOT NULL,
+                PRIMARY KEY (route_id, run, batch_no)
+            )
+        ''')
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS generation_cache (
+                request_hash TEXT PRIMARY KEY,
+                response TEXT NOT NULL,
+                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+            )
+        ''')
+
+        # Databases from before dedup get the hash column filled in place
+        if 'context_hash' not in _column_names(db, 'sessions_registry'):
+            cursor.execute('ALTER TABLE sessions_registry ADD COLUMN context_hash TEXT')
+            rows = cursor.execute('SELECT id, intention_context FROM sessions_registry').fetchall()
+            cursor.executemany('UPDATE sessions_registry SET context_hash = ? WHERE id = ?', [(text_hash(context), id) for id, context in rows])
+        # Job run that generated each session, empty for sessions from before jobs
+        if 'generation_run' not in _column_names(db, 'sessions_registry'):
+            cursor.execute('ALTER TABLE sessions_registry ADD COLUMN generation_run INTEGER')
+
+        cursor.execute('CREATE INDEX IF NOT EXISTS idx_routes_context_id ON routes_registry (context_id)')
+        cursor.execute('CREATE INDEX IF NOT EXISTS idx_sessions_route_id ON sessions_registry (route_id)')
+        cursor.execute('CREATE INDEX IF NOT EXISTS idx_sessions_route_hash ON sessions_registry (route_id, context_hash)')
+        db.commit()
+
+    def close(self):
+        self.db.close()
 
     async def _get_routes(self, context_id: str, count: int) -> List[RouteSpec]:
         if self._verbose: print("[QUERY_ROUTE] Getting routes for context:", context_id)
 
-        cursor = self.db.cursor()
         query = 'SELECT id, path, tags FROM routes_registry WHERE context_id = ?'
         params = (context_id,)
         if count:
             query += ' LIMIT ?'
             params += (count,)
-        cursor.execute(query, params)
 
-        routes_data = cursor.fetchall()
+        routes_data = await self.db.run(_fetchall, query, params)
         if not routes_data: return []
 
         routes = []
@@ -185,37 +366,42 @@ class SailorDataWarehouse:
         return routes
 
     async def create_routes(self, count: int, force_new: bool = False) -> List[RouteSpec]:
-        routes = []
-        if not force_new:
-            routes = await self._get_routes(self.context_hash, count)
-            if routes and len(routes) >= count: return routes
+        stored = await self._get_routes(self.context_hash, 0)
+        if not force_new and len(stored) >= count: return stored[:count]
 
-        count -= len(routes)
-        routes = await self.enginner.generate_routes(self.context, count=count)
+        # Same stored state, same request: a rerun after a crash reuses the cached response
+        missing = count if force_new else count - len(stored)
+        variant = uuid.uuid4().hex if force_new else f"stored:{len(stored)}"
+        routes = await self.enginner.generate_routes(self.context, count=missing, variant=variant)
 
-        cursor = self.db.cursor()
-        for route in routes:
-            route_id = uuid.uuid4()
-            input = (route_id.hex, self.context_hash, route.path, ','.join(route.tags))
-            cursor.execute("INSERT INTO routes_registry (id, context_id, path, tags) VALUES (?, ?, ?, ?)", input)
+        rows = [(uuid.uuid4().hex, self.context_hash, route.path, ','.join(route.tags)) for route in routes]
+        await self.db.run(_executemany, "INSERT INTO routes_registry (id, context_id, path, tags) VALUES (?, ?, ?, ?)", rows)
 
-        self.db.commit()
+        if force_new:
+            return await self._get_routes_by_id([row[0] for row in rows])
+        return await self._get_routes(self.context_hash, count)
 
-        routes = await self._get_routes(self.context_hash, count)
-        return routes
+    async def _get_routes_by_id(self, ids: List[str]) -> List[RouteSpec]:
+        placeholders = ','.join('?' * len(ids))
+        rows = await self.db.run(_fetchall, f'SELECT id, path, tags FROM routes_registry WHERE id IN ({placeholders})', tuple(ids))
+        by_id = {row[0]: RouteSpec(id=row[0], path=row[1], tags=row[2].split(',')) for row in rows}
+        return [by_id[id] for id in ids if id in by_id]
 
-    async def _get_sessions(self, route_id: str, count: Optional[int] = None) -> List[SessionSpec]:
+    async def _get_sessions(self, route_id: str, count: Optional[int] = None, run: Optional[int] = None) -> List[SessionSpec]:
         if self._verbose: print("[QUERY_SESSION] Getting sessions for route:", route_id)
 
-        cursor = self.db.cursor()
         query = 'SELECT id, intention_context FROM sessions_registry WHERE route_id = ?'
-        params = (route_id,)
+        params: tuple = (route_id,)
+        if run is not None:
+            query += ' AND generation_run = ?'
+            params += (run,)
+        # Insertion order, the order `stream_sessions` reads a route's sessions in
+        query += ' ORDER BY rowid'
         if count:
             query += ' LIMIT ?'
             params += (count,)
-        cursor.execute(query, params)
 
-        sessions_data = cursor.fetchall()
+        sessions_data = await self.db.run(_fetchall, query, params)
         if not sessions_data: return []
 
         sessions = []
@@ -231,27 +417,188 @@ class SailorDataWarehouse:
 
         return sessions
 
+    _stream_sessions_query = '''
+        SELECT s.id, s.route_id, s.intention_context
+        FROM sessions_registry s JOIN routes_registry r ON r.id = s.route_id
+        WHERE r.context_id = ?
+        ORDER BY s.rowid
+    '''
+
+    def stream_sessions(self, chunk_size: int = _session_chunk_size) -> Iterator[List[SessionSpec]]:
+        """Yield every session of the context in chunks, reading through a single cursor"""
+        cursor = self.db.run_sync(_execute, self._stream_sessions_query, (self.context_hash,))
+        try:
+            while True:
+                rows = self.db.run_sync(_fetchmany, cursor, chunk_size)
+                if not rows: break
+                yield [SessionSpec(id=row[0], route_id=row[1], context=row[2]) for row in rows]
+        finally:
+            self.db.run_sync(_close_cursor, cursor)
+
+    async def iter_sessions(self, chunk_size: int = _session_chunk_size) -> AsyncGenerator[List[SessionSpec], None]:
+        cursor = await self.db.run(_execute, self._stream_sessions_query, (self.context_hash,))
+        try:
+            while True:
+                rows = await self.db.run(_fetchmany, cursor, chunk_size)
+                if not rows: break
+                yield [SessionSpec(id=row[0], route_id=row[1], context=row[2]) for row in rows]
+        finally:
+            await self.db.run(_close_cursor, cursor)
+
     async def create_route_sessions(self, route: RouteSpec, count: int, force_new: bool = False) -> List[SessionSpec]:
-        if not force_new:
-            cache = await self._get_sessions(route.id, count)
-            if cache and len(cache) >= count: return cache
-
-        count -= len(cache)
-        cursor = self.db.cursor()
-        async for session_batch in self.enginner.generate_sessions(route, count=count):
-            for session in session_batch:
-                session_id = uuid.uuid4()
-                input = (session_id.hex, route.id, session.context)
-                cursor.execute("INSERT INTO sessions_registry (id, route_id, intention_context) VALUES (?, ?, ?)", input)
-            self.db.commit()
-
-        sessions = await self._get_sessions(route.id, count)
-        return sessions
+        return (await self.create_sessions([route], count, force_new))[0]
 
     async def create_sessions(self, routes: List[RouteSpec], count: int, force_new: bool = False) -> List[List[SessionSpec]]:
-        coroutine: List[Awaitable[List[SessionSpec]]] = []
-        for route in routes:
-            coroutine.append(self.create_route_sessions(route, count, force_new=force_new))
+        """
+        Generate the missing sessions of every route. Batches are queued round-robin
+        across routes, so all routes progress together within the shared rate limits.
+        With `force_new`, `count` new sessions are added on top of the stored ones
+        and only those are returned.
+        """
+        runs = [await self.db.run(self._start_job, route.id, count, force_new) for route in routes]
 
-        responses = await asyncio.gather(*coroutine, return_exceptions=False)
-        return responses
+        for _ in range(_max_generation_rounds):
+            plan = await self.db.run(self._plan_batches, [route.id for route in routes])
+            if not plan: break
+
+            by_id = {route.id: route for route in routes}
+            if self._verbose: print("[GENERATE_SESSION] Generating", len(plan), "batches for", len(routes), "routes")
+            tasks = [asyncio.ensure_future(self._run_batch(by_id[route_id], run, batch_no, batch_count))
+                     for route_id, run, batch_no, batch_count in plan]
+            try:
+                inserted = await asyncio.gather(*tasks)
+            except BaseException:
+                # Stored batches stay pending, a rerun resumes them
+                for task in tasks: task.cancel()
+                await asyncio.gather(*tasks, return_exceptions=True)
+                raise
+            # Nothing new came back, the generator has run out of variety for these routes
+            if not any(inserted): break
+
+        await self.db.run(self._finish_jobs, [route.id for route in routes])
+        if force_new:
+            return [await self._get_sessions(route.id, count, run) if run is not None else [] for route, run in zip(routes, runs)]
+        return [await self._get_sessions(route.id, count) for route in routes]
+
+    @staticmethod
+    def _start_job(db: sqlite3.Connection, route_id: str, count: int, force_new: bool) -> Optional[int]:
+        """
+        Resume the route's unfinished job, or open a new one when sessions are missing.
+        A resumed job takes the requested count as its new target. Returns the job run,
+        None when nothing is missing.
+        """
+        job = db.execute('SELECT run, target, status FROM generation_jobs WHERE route_id = ?', (route_id,)).fetchone()
+        stored = db.execute('SELECT COUNT(*) FROM sessions_registry WHERE route_id = ?', (route_id,)).fetchone()[0]
+
+        if job is not None and job[2] == 'running':
+            run, previous_target = job[0], job[1]
+            generated = db.execute(
+                'SELECT COUNT(*) FROM sessions_registry WHERE route_id = ? AND generation_run = ?', (route_id, run)).fetchone()[0]
+            # A new-sessions job counts on top of what was stored before it started
+            target = stored - generated + count if force_new else count
+            if target != previous_target:
+                # Planned for the previous target, the next plan covers whatever is missing
+                db.execute("DELETE FROM generation_batches WHERE route_id = ? AND run = ? AND status = 'pending'", (route_id, run))
+            db.execute(
+                'UPDATE generation_jobs SET target = ?, completed = ?, status = ?, updated_at = CURRENT_TIMESTAMP WHERE route_id = ?',
+                (target, stored, 'running' if stored < target else 'done', route_id))
+            db.commit()
+            return run
+
+        target = stored + count if force_new else count
+        if stored >= target: return None
+
+        run = job[0] + 1 if job is not None else 0
+        db.execute(
+            'INSERT OR REPLACE INTO generation_jobs (route_id, run, target, completed, status) VALUES (?, ?, ?, ?, ?)',
+            (route_id, run, target, stored, 'running'))
+        db.commit()
+        return run
+
+    @staticmethod
+    def _plan_batches(db: sqlite3.Connection, route_ids: List[str]) -> List[tuple]:
+        """
+        Pending batches of the running jobs, plus new ones for whatever they don't cover.
+        Batches are stored before they are sent, a rerun sends the same requests again.
+        """
+        route_batches = []
+        for route_id in route_ids:
+            job = db.execute(
+                "SELECT run, target, completed FROM generation_jobs WHERE route_id = ? AND status = 'running'", (route_id,)).fetchone()
+            if job is None: continue
+            run, target, completed = job
+
+            pending = db.execute(
+                "SELECT batch_no, count FROM generation_batches WHERE route_id = ? AND run = ? AND status = 'pending' ORDER BY batch_no",
+                (route_id, run)).fetchall()
+            next_batch = db.execute(
+                'SELECT COALESCE(MAX(batch_no) + 1, 0) FROM generation_batches WHERE route_id = ? AND run = ?', (route_id, run)).fetchone()[0]
+
+            missing = target - completed - sum(batch_count for _, batch_count in pending)
+            new = [(next_batch + i, batch_count) for i, batch_count in enumerate(session_batches(missing))]
+            db.executemany(
+                "INSERT INTO generation_batches (route_id, run, batch_no, count, status) VALUES (?, ?, ?, ?, 'pending')",
+                [(route_id, run, batch_no, batch_count) for batch_no, batch_count in new])
+            route_batches.append([(route_id, run, batch_no, batch_count) for batch_no, batch_count in pending + new])
+
+        db.commit()
+        return [batch for batches in zip_longest(*route_batches) for batch in batches if batch is not None]
+
+    async def _run_batch(self, route: RouteSpec, run: int, batch_no: int, count: int) -> int:
+        sessions = await self.enginner.generate_session_batch(route, count, variant=f"{route.id}:{run}:{batch_no}")
+        contexts = [session.context for session in sessions]
+
+        # Concurrent batches of the route check against each other's sessions
+        async with self._ingest_locks[route.id]:
+            if self.near_duplicate_threshold is not None:
+                index = await self._near_duplicate_index(route.id)
+                contexts = [context for context, keep in zip(contexts, index.filter(contexts)) if keep]
+            inserted = await self.db.run(self._ingest_sessions, route.id, run, batch_no, contexts)
+        if self._verbose and inserted < len(sessions):
+            print("[GENERATE_SESSION] Dropped", len(sessions) - inserted, "duplicate sessions for route:", route.id)
+        return inserted
+
+    async def _near_duplicate_index(self, route_id: str) -> MinHashDeduplicator:
+        index = self._near_duplicates.get(route_id)
+        if index is None:
+            index = MinHashDeduplicator(self.near_duplicate_threshold) # type: ignore
+            rows = await self.db.run(_fetchall, 'SELECT intention_context FROM sessions_registry WHERE route_id = ?', (route_id,))
+            for row in rows:
+                index.add(row[0])
+            self._near_duplicates[route_id] = index
+        return index
+
+    @staticmethod
+    def _ingest_sessions(db: sqlite3.Connection, route_id: str, run: int, batch_no: int, contexts: List[str]) -> int:
+        """Store a batch without exact duplicates and count it in its job, in one transaction"""
+        rows: Dict[str, tuple] = {}
+        for context in contexts:
+            digest = text_hash(context)
+            rows.setdefault(digest, (uuid.uuid4().hex, route_id, context, digest, run))
+
+        if rows:
+            placeholders = ','.join('?' * len(rows))
+            # Sessions stored before dedup may share a hash
+            stored = db.execute(
+                f'SELECT DISTINCT context_hash FROM sessions_registry WHERE route_id = ? AND context_hash IN ({placeholders})',
+                (route_id, *rows)).fetchall()
+            for (digest,) in stored:
+                del rows[digest]
+
+        db.executemany(
+            'INSERT INTO sessions_registry (id, route_id, intention_context, context_hash, generation_run) VALUES (?, ?, ?, ?, ?)',
+            list(rows.values()))
+        db.execute(
+            'UPDATE generation_jobs SET completed = completed + ?, updated_at = CURRENT_TIMESTAMP WHERE route_id = ? AND run = ?',
+            (len(rows), route_id, run))
+        db.execute(
+            "UPDATE generation_batches SET status = 'done' WHERE route_id = ? AND run = ? AND batch_no = ?", (route_id, run, batch_no))
+        db.commit()
+        return len(rows)
+
+    @staticmethod
+    def _finish_jobs(db: sqlite3.Connection, route_ids: List[str]):
+        db.executemany(
+            "UPDATE generation_jobs SET status = 'done', updated_at = CURRENT_TIMESTAMP WHERE route_id = ? AND status = 'running' AND completed >= target",
+            [(route_id,) for route_id in route_ids])
+        db.commit()
@@ -1,40 +1,233 @@
 from abc import ABC, abstractmethod
+import copy
 import os
 import pickle
+import uuid
+import warnings
 import numpy as np
-from typing import List
+from scipy import sparse
+from typing import Any, Dict, Iterable, List, Optional, Type
+from sklearn.base import BaseEstimator, clone
 from sklearn.pipeline import Pipeline
-from sklearn.feature_extraction.text import TfidfVectorizer
+from sklearn.feature_extraction.text import HashingVectorizer, TfidfVectorizer
+from sklearn.linear_model import SGDClassifier
 from sklearn.svm import LinearSVC
 from sklearn.neighbors import KNeighborsClassifier
 
+from .compact_components import CompactTfidfVectorizer, QuantizedLinearClassifier, compact_knn_features, sorted_columns
+from .instrumentation import timed_stage
+from .model_artifact import pack_strings, unpack_strings, read_artifact, write_artifact
 from .route_documentor import RouteDocumentor
+from .route_typeahead import RouteTypeahead
 from .types import  RouteSpec, SessionSpec, RouteContextResult
 
+def _estimator_params(estimator: BaseEstimator) -> Dict[str, Any]:
+    """JSON-safe constructor params, anything else keeps the engine default"""
+    params: Dict[str, Any] = {}
+    for key, value in estimator.get_params(deep=False).items():
+        if isinstance(value, tuple):
+            value = list(value)
+        if value is None or isinstance(value, (str, int, float, bool, list)):
+            params[key] = value
+    return params
+
+def _restore_params(params: Dict[str, Any]) -> Dict[str, Any]:
+    return {k: tuple(v) if isinstance(v, list) else v for k, v in params.items()}
+
+def _tfidf_arrays(tfidf: TfidfVectorizer) -> Dict[str, np.ndarray]:
+    if isinstance(tfidf, CompactTfidfVectorizer):
+        return tfidf.to_arrays()
+    terms = sorted(tfidf.vocabulary_, key=tfidf.vocabulary_.__getitem__)
+    vocabulary_data, vocabulary_offsets = pack_strings(terms)
+    return {
+        "tfidf_vocabulary_data": vocabulary_data,
+        "tfidf_vocabulary_offsets": vocabulary_offsets,
+        "tfidf_idf": tfidf.idf_,
+    }
+
+def _load_tfidf_arrays(tfidf: TfidfVectorizer, arrays: Dict[str, np.ndarray]) -> TfidfVectorizer:
+    """Loads into `tfidf`, or returns a `CompactTfidfVectorizer` with its params for compacted artifacts"""
+    if "compact_tfidf_terms" in arrays:
+        return CompactTfidfVectorizer.from_arrays(tfidf.get_params(), arrays)
+    terms = unpack_strings(arrays["tfidf_vocabulary_data"], arrays["tfidf_vocabulary_offsets"])
+    tfidf.vocabulary_ = {term: i for i, term in enumerate(terms)}
+    tfidf.idf_ = arrays["tfidf_idf"]
+    return tfidf
+
+def _svc_scores(scores: np.ndarray) -> np.ndarray:
+    if scores.ndim == 1:
+        # Binary LinearSVC returns a single column with the positive class margin
+        scores = np.column_stack([-scores, scores])
+    return scores
+
+def _svc_arrays(svc: LinearSVC) -> Dict[str, np.ndarray]:
+    if isinstance(svc, QuantizedLinearClassifier):
+        return svc.to_arrays("svc")
+    return {
+        "svc_coef": svc.coef_,
+        "svc_intercept": svc.intercept_,
+        "svc_classes": svc.classes_,
+    }
+
+def _load_svc_arrays(svc: LinearSVC, arrays: Dict[str, np.ndarray]) -> LinearSVC | QuantizedLinearClassifier:
+    if "svc_coef_quantized" in arrays:
+        return QuantizedLinearClassifier.from_arrays("svc", arrays)
+    svc.coef_ = arrays["svc_coef"]
+    svc.intercept_ = arrays["svc_intercept"]
+    svc.classes_ = arrays["svc_classes"]
+    svc.n_features_in_ = svc.coef_.shape[1]
+    return svc
+
+def _svc_importance(svc: LinearSVC, tfidf: TfidfVectorizer) -> np.ndarray:
+    # Largest contribution a term can make to any class score
+    importance = np.abs(svc.coef_).max(axis=0)
+    return importance * tfidf.idf_ if tfidf.use_idf else importance
+
+class _StoredKNeighborsClassifier(KNeighborsClassifier):
+    """KNeighborsClassifier keeping its training set as public fitted attributes, artifacts never read sklearn internals"""
+
+    def fit(self, X, y):
+        self.training_features_ = sparse.csr_matrix(X)
+        self.training_labels_ = np.asarray(y)
+        return super().fit(X, y)
+
+def _knn_arrays(knn: _StoredKNeighborsClassifier) -> Dict[str, np.ndarray]:
+    # The training set itself, refitting keeps neighbor ties in the same order
+    features = knn.training_features_
+    labels = knn.training_labels_
+    return {
+        "knn_data": features.data,
+        "knn_indices": features.indices,
+        "knn_indptr": features.indptr,
+        "knn_shape": np.array(features.shape, dtype=np.int64),
+        "knn_labels": np.asarray(labels),
+    }
+
+def _knn_importance(knn: _StoredKNeighborsClassifier) -> np.ndarray:
+    return sparse.csc_matrix(knn.training_features_).max(axis=0).toarray().ravel()
+
+def _compact_knn(knn: _StoredKNeighborsClassifier, columns: np.ndarray, tfidf: TfidfVectorizer) -> _StoredKNeighborsClassifier:
+    compact = clone(knn)
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore", UserWarning)
+        compact.fit(compact_knn_features(knn.training_features_, columns, tfidf.norm), knn.training_labels_)
+    return compact
+
+def _load_knn_arrays(knn: _StoredKNeighborsClassifier, arrays: Dict[str, np.ndarray]):
+    # Brute-force neighbors over sparse input, fitting only stores the matrix
+    features = sparse.csr_matrix(
+        (arrays["knn_data"], arrays["knn_indices"], arrays["knn_indptr"]),
+        shape=tuple(arrays["knn_shape"]))
+    with warnings.catch_warnings():
+        # One training row per route always trips sklearn's "regression target" warning
+        warnings.simplefilter("ignore", UserWarning)
+        knn.fit(features, arrays["knn_labels"])
+
+_ENGINES: Dict[str, Type['SailorEngine']] = {}
+
 class SailorEngine(ABC):
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+        # Artifacts name their engine class, resolved here instead of unpickling
+        _ENGINES[cls.__name__] = cls
+
     def __init__(self):
         super().__init__()
         self.documentor = RouteDocumentor()
         self.pipeline: Pipeline
+        self.version: Optional[str] = None
+        self._typeahead: Optional[RouteTypeahead] = None
+
+    @property
+    def typeahead(self) -> RouteTypeahead:
+        """Prefix index over the fitted routes for as-you-type suggestions, built on first use"""
+        typeahead = getattr(self, "_typeahead", None)
+        if typeahead is None:
+            typeahead = self._typeahead = RouteTypeahead(self.documentor)
+        return typeahead
 
     def fit(self, routes: List[RouteSpec], sessions: List[SessionSpec]):
         labels = self.documentor.fit_transform(routes, sessions)
-        return self.pipeline.fit(self.documentor.documents, labels)
+        self._fit_documents(self.documentor.documents, labels)
+        self.version = uuid.uuid4().hex
+        self._typeahead = None
+        return self.pipeline
+
+    def fit_stream(self, routes: List[RouteSpec], session_chunks: Iterable[Iterable[SessionSpec]]):
+        """Fit from chunked sessions, e.g. `SailorDataWarehouse.stream_sessions`, without holding them all"""
+        labels = self.documentor.fit_transform_stream(routes, session_chunks)
+        self._fit_documents(self.documentor.documents, labels)
+        self.version = uuid.uuid4().hex
+        self._typeahead = None
+        return self.pipeline
+
+    def fit_features(self,
+                     documentor: RouteDocumentor,
+                     documents: List[str],
+                     labels: np.ndarray,
+                     tfidf: TfidfVectorizer,
+                     features: sparse.csr_matrix,
+                    ):
+        """
+        Fit on a vectorization stage shared between engines, `documentor` already
+        fitted and `features` its `documents` through the fitted `tfidf`.
+        """
+        self.documentor = documentor
+        self._fit_features(documents, labels, tfidf, features)
+        self.version = uuid.uuid4().hex
+        self._typeahead = None
+        return self.pipeline
+
+    def _fit_features(self, documents: List[str], labels: np.ndarray, tfidf: TfidfVectorizer, features: sparse.csr_matrix):
+        name, step = self.pipeline.steps[0]
+        if name != 'tfidf' or step.get_params() != tfidf.get_params():
+            # Not the shared vectorizer, only the documents are reused
+            self._fit_documents(documents, labels)
+            return
+
+        self.pipeline.steps[0] = ('tfidf', tfidf)
+        self._fit_classifier(features, labels)
+
+    def _fit_documents(self, documents: Iterable[str], labels: np.ndarray):
+        self.pipeline.fit(documents, labels)
+
+    def _fit_classifier(self, features: sparse.csr_matrix, labels: np.ndarray):
+        # Steps are shared with the engine pipeline, fitting them here fits it too
+        Pipeline(self.pipeline.steps[1:]).fit(features, labels)
 
     @abstractmethod
-    def predict(self, query: str) -> List[RouteContextResult]: ...
-
-    def scored_routes(self, scores) -> List[RouteContextResult]:
-        top_indices = np.argpartition(-scores, len(scores) - 1)
-        scored_routes: List[RouteContextResult] = []
-        for i in top_indices:
-            route = self.documentor.inverse_transform(i)
-            if route is not None:
-                score = float(scores[i])
-                route = route.copy_with_score(score)
-                scored_routes.append(route)
-        scored_routes.sort(key=lambda x: x.score, reverse=True)
-        return scored_routes
+    def decision_scores(self, queries: List[str]) -> np.ndarray:
+        """Score every route for each query, returns a (n_queries, n_routes) matrix"""
+        ...
+
+    def predict(self, query: str, top_k: Optional[int] = None) -> List[RouteContextResult]:
+        if query is None: return []
+        return self.predict_batch([query], top_k=top_k)[0]
+
+    def predict_batch(self, queries: List[str], top_k: Optional[int] = None) -> List[List[RouteContextResult]]:
+        valid = [i for i, q in enumerate(queries) if q is not None]
+        results: List[List[RouteContextResult]] = [[] for _ in queries]
+        if not valid: return results
+
+        scores = self.decision_scores([queries[i] for i in valid])
+        with timed_stage(type(self).__name__, "rank"):
+            for i, row in zip(valid, scores):
+                results[i] = self.scored_routes(row, top_k=top_k)
+        return results
+
+    def scored_routes(self, scores: np.ndarray, top_k: Optional[int] = None) -> List[RouteContextResult]:
+        if top_k is not None and top_k < len(scores):
+            kth = np.partition(scores, len(scores) - top_k)[len(scores) - top_k]
+            # Ties at the cut keep the lowest labels, the order of the full stable sort
+            above = np.flatnonzero(scores > kth)
+            tied = np.flatnonzero(scores == kth)[:top_k - len(above)]
+            top_indices = np.concatenate([above, tied])
+            top_indices = top_indices[np.argsort(-scores[top_indices], kind="stable")]
+        else:
+            top_indices = np.argsort(-scores, kind="stable")
+
+        routes = self.documentor.label_routes
+        return [routes[i].copy_with_score(float(scores[i])) for i in top_indices]
 
     def save_model(self, model_name: str, model_dir: str):
         if not os.path.exists(model_dir):
@@ -44,6 +237,75 @@ class SailorEngine(ABC):
             pickle.dump(self, f)
         return model_path
 
+    def save_artifact(self, model_name: str, model_dir: str) -> str:
+        """Write the engine as a memory-mappable artifact directory, see `sailor.model_artifact`"""
+        params = {name: _estimator_params(step) for name, step in self.pipeline.steps}
+        arrays = {**self.documentor.to_arrays(), **self._vectorizer_arrays(), **self._classifier_arrays()}
+        artifact_dir = os.path.join(model_dir, model_name)
+        return write_artifact(artifact_dir, type(self).__name__, self.version, params, arrays)
+
+    @staticmethod
+    def load_artifact(artifact_dir: str, mmap_mode: Optional[str] = "r", verify: bool = False) -> 'SailorEngine':
+        """
+        Checksums are recorded when the artifact is written and published artifacts
+        are never modified, `verify` re-hashes every array, e.g. after a copy.
+        """
+        manifest, arrays = read_artifact(artifact_dir, mmap_mode=mmap_mode, verify=verify)
+
+        engine_cls = _ENGINES.get(manifest["engine"])
+        if engine_cls is None:
+            raise ValueError(f"Unknown engine {manifest['engine']} in artifact {artifact_dir}.")
+
+        engine = engine_cls()
+        for name, step in engine.pipeline.steps:
+            step.set_params(**_restore_params(manifest["params"].get(name, {})))
+        engine.version = manifest["model_version"]
+        engine.documentor.load_arrays(arrays)
+        engine._load_vectorizer(arrays)
+        engine._load_classifier(arrays)
+        return engine
+
+    def compact(self, vocabulary_fraction: float = 0.5, dtype: str = "int8") -> 'SailorEngine':
+        """
+        Serving copy of a fitted engine keeping the `vocabulary_fraction` most important
+        TF-IDF terms, with linear weights stored as `dtype` (float32 or int8). Compacted
+        engines save and load as regular artifacts but can't be refitted.
+        `sailor.model_compaction.ModelCompactor` measures what it costs in accuracy.
+        """
+        tfidf = self.pipeline.named_steps.get('tfidf')
+        if not isinstance(tfidf, TfidfVectorizer):
+            raise ValueError(f"{type(self).__name__} has no TF-IDF vocabulary to compact.")
+        if isinstance(tfidf, CompactTfidfVectorizer):
+            raise ValueError(f"{type(self).__name__} is already compacted.")
+
+        importance = self._term_importance(tfidf)
+        n_terms = min(max(int(round(vocabulary_fraction * len(importance))), 1), len(importance))
+        columns = sorted_columns(tfidf, np.sort(np.argsort(-importance, kind="stable")[:n_terms]))
+
+        engine = copy.deepcopy(self)
+        engine.pipeline.steps[0] = ('tfidf', CompactTfidfVectorizer.from_tfidf(tfidf, columns))
+        engine._compact_classifier(columns, dtype)
+        return engine
+
+    def _term_importance(self, tfidf: TfidfVectorizer) -> np.ndarray:
+        """Weight of each vocabulary term in the classifier, the lowest are pruned first"""
+        raise ValueError(f"{type(self).__name__} doesn't support compaction.")
+
+    def _compact_classifier(self, columns: np.ndarray, dtype: str):
+        raise ValueError(f"{type(self).__name__} doesn't support compaction.")
+
+    def _vectorizer_arrays(self) -> Dict[str, np.ndarray]:
+        return _tfidf_arrays(self.pipeline.named_steps['tfidf'])
+
+    def _load_vectorizer(self, arrays: Dict[str, np.ndarray]):
+        self.pipeline.steps[0] = ('tfidf', _load_tfidf_arrays(self.pipeline.named_steps['tfidf'], arrays))
+
+    @abstractmethod
+    def _classifier_arrays(self) -> Dict[str, np.ndarray]: ...
+
+    @abstractmethod
+    def _load_classifier(self, arrays: Dict[str, np.ndarray]): ...
+
 class SVCSailorEngine(SailorEngine):
     def __init__(self):
         super().__init__()
@@ -52,21 +314,148 @@ class SVCSailorEngine(SailorEngine):
             ('svc', LinearSVC(class_weight='balanced', max_iter=2000)),
             ])
 
-    def predict(self, query: str):
-        if query is None: return []
-        scores = self.pipeline.decision_function([query])[0]
-        return self.scored_routes(scores)
+    def decision_scores(self, queries: List[str]) -> np.ndarray:
+        with timed_stage(type(self).__name__, "transform"):
+            features = self.pipeline.named_steps['tfidf'].transform(queries)
+        with timed_stage(type(self).__name__, "classify"):
+            return _svc_scores(self.pipeline.named_steps['svc'].decision_function(features))
+
+    def _term_importance(self, tfidf: TfidfVectorizer) -> np.ndarray:
+        return _svc_importance(self.pipeline.named_steps['svc'], tfidf)
+
+    def _compact_classifier(self, columns: np.ndarray, dtype: str):
+        svc = QuantizedLinearClassifier.from_linear(self.pipeline.named_steps['svc'], columns, dtype)
+        self.pipeline.steps[1] = ('svc', svc)
+
+    def _classifier_arrays(self) -> Dict[str, np.ndarray]:
+        return _svc_arrays(self.pipeline.named_steps['svc'])
+
+    def _load_classifier(self, arrays: Dict[str, np.ndarray]):
+        self.pipeline.steps[1] = ('svc', _load_svc_arrays(self.pipeline.named_steps['svc'], arrays))
 
 class KNNSailorEngine(SailorEngine):
     def __init__(self):
         super().__init__()
         self.pipeline = Pipeline([
             ('tfidf', TfidfVectorizer(stop_words='english')),
-            ('knn', KNeighborsClassifier(weights='distance')),
+            ('knn', _StoredKNeighborsClassifier(weights='distance')),
             ])
 
-    def predict(self, query: str):
-        if query is None: return []
-        scores = self.pipeline.predict_proba([query])[0]
-        return self.scored_routes(scores)
+    def decision_scores(self, queries: List[str]) -> np.ndarray:
+        with timed_stage(type(self).__name__, "transform"):
+            features = self.pipeline.named_steps['tfidf'].transform(queries)
+        with timed_stage(type(self).__name__, "classify"):
+            return self.pipeline.named_steps['knn'].predict_proba(features)
+
+    def _term_importance(self, tfidf: TfidfVectorizer) -> np.ndarray:
+        return _knn_importance(self.pipeline.named_steps['knn'])
+
+    def _compact_classifier(self, columns: np.ndarray, dtype: str):
+        # Distances need float rows, the training matrix is kept as float32 whatever `dtype`
+        knn = _compact_knn(self.pipeline.named_steps['knn'], columns, self.pipeline.named_steps['tfidf'])
+        self.pipeline.steps[1] = ('knn', knn)
+
+    def _classifier_arrays(self) -> Dict[str, np.ndarray]:
+        return _knn_arrays(self.pipeline.named_steps['knn'])
+
+    def _load_classifier(self, arrays: Dict[str, np.ndarray]):
+        _load_knn_arrays(self.pipeline.named_steps['knn'], arrays)
+
+class IncrementalSailorEngine(SailorEngine):
+    """
+    Online engine on a stateless hashing vectorizer and an SGD linear model.
+    `partial_fit` absorbs new routes and sessions in place, every route document
+    and session context is a training sample for its route.
+    """
+
+    def __init__(self, n_features: int = 2**16, label_capacity: int = 64, fit_epochs: int = 5):
+        super().__init__()
+        self.label_capacity = max(label_capacity, 3)
+        self.fit_epochs = fit_epochs
+        self.pipeline = Pipeline([
+            ('hashing', HashingVectorizer(stop_words='english', n_features=n_features, alternate_sign=False)),
+            ('sgd', SGDClassifier(loss='hinge', alpha=1e-5, random_state=14)),
+            ])
+
+    def fit(self, routes: List[RouteSpec], sessions: List[SessionSpec]):
+        self.documentor = RouteDocumentor()
+        # A fresh unfitted model, named_steps is a copy and assigning to it is lost
+        self.pipeline.steps[-1] = ('sgd', clone(self.pipeline.steps[-1][1]))
+        for _ in range(self.fit_epochs):
+            self.partial_fit(routes, sessions)
+        return self.pipeline
+
+    def _fit_documents(self, documents: Iterable[str], labels: np.ndarray):
+        # Route documents as samples, classes preallocated as in `partial_fit`
+        sgd: SGDClassifier = clone(self.pipeline.named_steps['sgd'])
+        self.pipeline.steps[-1] = ('sgd', sgd)
+        self.label_capacity = max(self.label_capacity, 2 * len(self.documentor.label_routes))
+        features = self.pipeline.named_steps['hashing'].transform(documents)
+        for _ in range(self.fit_epochs):
+            sgd.partial_fit(features, labels, classes=np.arange(self.label_capacity))
+
+    def partial_fit(self, routes: List[RouteSpec], sessions: List[SessionSpec]):
+        active_labels = len(self.documentor.label_routes)
+        documents, labels = self.documentor.partial_fit_transform(routes, sessions)
+        if len(labels) == 0: return self.pipeline
+
+        sgd: SGDClassifier = self.pipeline.named_steps['sgd']
+        features = self.pipeline.named_steps['hashing'].transform(documents)
+        if not hasattr(sgd, "classes_"):
+            self.label_capacity = max(self.label_capacity, 2 * len(self.documentor.label_routes))
+            sgd.partial_fit(features, labels, classes=np.arange(self.label_capacity))
+        else:
+            self._activate_labels(sgd, active_labels, len(self.documentor.label_routes))
+            sgd.partial_fit(features, labels)
+
+        self.version = uuid.uuid4().hex
+        self._typeahead = None
+        return self.pipeline
+
+    def _activate_labels(self, sgd: SGDClassifier, start: int, stop: int):
+        """
+        SGDClassifier can't learn new classes after the first call, so labels are
+        preallocated and the class table grows by doubling when new routes overflow it.
+        """
+        if stop > self.label_capacity:
+            capacity = max(2 * self.label_capacity, stop)
+            extra = capacity - self.label_capacity
+            sgd.coef_ = np.vstack([sgd.coef_, np.zeros((extra, sgd.coef_.shape[1]))])
+            sgd.intercept_ = np.concatenate([sgd.intercept_, np.zeros(extra)])
+            sgd.classes_ = np.arange(capacity)
+            self.label_capacity = capacity
+
+        # Reserved rows only ever saw negatives, new routes start from scratch
+        sgd.coef_[start:stop] = 0.0
+        sgd.intercept_[start:stop] = 0.0
+
+    def decision_scores(self, queries: List[str]) -> np.ndarray:
+        with timed_stage(type(self).__name__, "transform"):
+            features = self.pipeline.named_steps['hashing'].transform(queries)
+        with timed_stage(type(self).__name__, "classify"):
+            scores = self.pipeline.named_steps['sgd'].decision_function(features)
+        return scores[:, :len(self.documentor.label_routes)]
+
+    def _vectorizer_arrays(self) -> Dict[str, np.ndarray]:
+        return {}
+
+    def _load_vectorizer(self, arrays: Dict[str, np.ndarray]):
+        pass
+
+    def _classifier_arrays(self) -> Dict[str, np.ndarray]:
+        sgd: SGDClassifier = self.pipeline.named_steps['sgd']
+        return {
+            "sgd_coef": sgd.coef_,
+            "sgd_intercept": sgd.intercept_,
+            "sgd_t": np.array([sgd.t_]),
+        }
 
+    def _load_classifier(self, arrays: Dict[str, np.ndarray]):
+        sgd: SGDClassifier = self.pipeline.named_steps['sgd']
+        # Copies, partial_fit updates the weights in place
+        sgd.coef_ = np.array(arrays["sgd_coef"])
+        sgd.intercept_ = np.array(arrays["sgd_intercept"])
+        sgd.t_ = float(arrays["sgd_t"][0])
+        sgd.classes_ = np.arange(sgd.coef_.shape[0])
+        sgd.n_features_in_ = sgd.coef_.shape[1]
+        self.label_capacity = sgd.coef_.shape[0]
@@ -0,0 +1,87 @@
+"""
+Duplicate detection for generated sessions.
+
+`text_hash` catches sessions that only differ by case, punctuation or spacing.
+`MinHashDeduplicator` catches near duplicates: each text is reduced to a MinHash
+signature of its character shingles, and LSH bands narrow the comparison down
+to the few indexed texts sharing a band with it.
+"""
+import hashlib
+import re
+import zlib
+from collections import defaultdict
+from typing import Dict, Iterable, List, Set, Tuple
+import numpy as np
+
+_non_word = re.compile(r"[^\w]+")
+_mersenne_prime = (1 << 31) - 1
+
+def normalize_text(text: str) -> str:
+    return " ".join(_non_word.sub(" ", text.lower()).split())
+
+def text_hash(text: str) -> str:
+    return hashlib.sha1(normalize_text(text).encode()).hexdigest()
+
+def _lsh_bands(num_perm: int, threshold: float) -> int:
+    """Band count whose LSH curve `(1/b)^(1/r)` is the closest to the threshold"""
+    divisors = [b for b in range(1, num_perm + 1) if num_perm % b == 0]
+    return min(divisors, key=lambda b: abs((1 / b) ** (b / num_perm) - threshold))
+
+class MinHashDeduplicator:
+    def __init__(self, threshold: float = 0.8, num_perm: int = 64, shingle_size: int = 4, seed: int = 14):
+        self.threshold = threshold
+        self.num_perm = num_perm
+        self.shingle_size = shingle_size
+
+        rng = np.random.default_rng(seed)
+        self._a = rng.integers(1, _mersenne_prime, num_perm, dtype=np.uint64)
+        self._b = rng.integers(0, _mersenne_prime, num_perm, dtype=np.uint64)
+
+        self.bands = _lsh_bands(num_perm, threshold)
+        self._rows = num_perm // self.bands
+        self._buckets: List[Dict[bytes, List[int]]] = [defaultdict(list) for _ in range(self.bands)]
+        self._signatures: List[np.ndarray] = []
+
+    def __len__(self) -> int:
+        return len(self._signatures)
+
+    def _shingles(self, text: str) -> Set[int]:
+        text = normalize_text(text)
+        if len(text) <= self.shingle_size:
+            return {zlib.crc32(text.encode())}
+        return {zlib.crc32(text[i:i + self.shingle_size].encode()) for i in range(len(text) - self.shingle_size + 1)}
+
+    def signature(self, text: str) -> np.ndarray:
+        shingles = np.fromiter(self._shingles(text), dtype=np.uint64)
+        hashes = (np.outer(shingles, self._a) + self._b) % _mersenne_prime
+        return hashes.min(axis=0)
+
+    def _band_keys(self, signature: np.ndarray) -> Iterable[Tuple[int, bytes]]:
+        for band in range(self.bands):
+            yield band, signature[band * self._rows:(band + 1) * self._rows].tobytes()
+
+    def _is_duplicate(self, signature: np.ndarray) -> bool:
+        candidates: Set[int] = set()
+        for band, key in self._band_keys(signature):
+            candidates.update(self._buckets[band].get(key, ()))
+        return any(np.mean(self._signatures[c] == signature) >= self.threshold for c in candidates)
+
+    def add(self, text: str):
+        self._add(self.signature(text))
+
+    def _add(self, signature: np.ndarray):
+        index = len(self._signatures)
+        self._signatures.append(signature)
+        for band, key in self._band_keys(signature):
+            self._buckets[band][key].append(index)
+
+    def filter(self, texts: List[str]) -> List[bool]:
+        """Whether each text is kept, kept texts are indexed so later ones are compared to them too"""
+        keep = []
+        for text in texts:
+            signature = self.signature(text)
+            duplicate = self._is_duplicate(signature)
+            if not duplicate:
+                self._add(signature)
+            keep.append(not duplicate)
+        return keep
@@ -0,0 +1,114 @@
+"""
+Deterministic synthetic routes and sessions, no network needed.
+
+Same shapes as `SailorDataEngineer` output: routes are admin panel paths with
+tags, sessions are search intentions of a route with about a quarter of them
+varied by typos and synonyms. A given seed always yields the same data.
+"""
+import random
+import uuid
+from typing import List
+from .types import RouteSpec, SessionSpec
+
+_MODULES = [
+    "admin", "billing", "catalog", "crm", "finance", "inventory", "logistics",
+    "marketing", "orders", "reports", "sales", "settings", "support", "users",
+]
+
+_ENTITIES = [
+    "account", "invoice", "order", "product", "customer", "payment", "shipment",
+    "supplier", "role", "permission", "ticket", "campaign", "coupon", "warehouse",
+    "employee", "contract", "refund", "subscription", "budget", "audit",
+]
+
+_ACTIONS = ["list", "create", "edit", "view", "export", "import", "approve", "archive", "search", "history"]
+
+_SYNONYMS = {
+    "account": ["profile", "login"],
+    "invoice": ["bill", "receipt"],
+    "order": ["purchase", "request"],
+    "product": ["item", "sku"],
+    "customer": ["client", "buyer"],
+    "payment": ["charge", "transaction"],
+    "shipment": ["delivery", "package"],
+    "supplier": ["vendor", "provider"],
+    "role": ["group", "profile"],
+    "permission": ["access", "privilege"],
+    "ticket": ["issue", "case"],
+    "campaign": ["promotion", "ads"],
+    "coupon": ["voucher", "discount"],
+    "warehouse": ["depot", "storage"],
+    "employee": ["staff", "worker"],
+    "contract": ["agreement", "deal"],
+    "refund": ["reimbursement", "chargeback"],
+    "subscription": ["plan", "membership"],
+    "budget": ["forecast", "spending"],
+    "audit": ["log", "trail"],
+    "list": ["show", "see"],
+    "create": ["add", "new"],
+    "edit": ["change", "update"],
+    "view": ["open", "check"],
+    "export": ["download", "extract"],
+    "import": ["upload", "load"],
+    "approve": ["accept", "confirm"],
+    "archive": ["remove", "hide"],
+    "search": ["find", "lookup"],
+    "history": ["past", "previous"],
+}
+
+_TEMPLATES = [
+    "{action} {entity}",
+    "how do i {action} a {entity}",
+    "i want to {action} the {entity} in {module}",
+    "where can i {action} {entity} records",
+    "{module} {entity} {action}",
+    "need to {action} my {entity}",
+    "{action} all {entity} from {module}",
+]
+
+_variation_ratio = 0.25
+
+class SyntheticDataGenerator:
+    def __init__(self, seed: int = 14):
+        self.seed = seed
+
+    def _id(self, rng: random.Random) -> str:
+        return uuid.UUID(int=rng.getrandbits(128)).hex
+
+    def generate_routes(self, count: int) -> List[RouteSpec]:
+        rng = random.Random(f"{self.seed}:routes")
+        paths = [(m, e, a) for m in _MODULES for e in _ENTITIES for a in _ACTIONS]
+        if count > len(paths):
+            raise ValueError(f"At most {len(paths)} synthetic routes can be generated.")
+
+        routes: List[RouteSpec] = []
+        for module, entity, action in rng.sample(paths, count):
+            tags = [module, entity, action, f"{entity}s", *rng.sample(_SYNONYMS[entity], 1), *rng.sample(_SYNONYMS[action], 1)]
+            routes.append(RouteSpec(id=self._id(rng), path=f"/{module}/{entity}/{action}", tags=tags))
+        return routes
+
+    def generate_sessions(self, routes: List[RouteSpec], count: int) -> List[SessionSpec]:
+        """`count` sessions per route"""
+        rng = random.Random(f"{self.seed}:sessions:{len(routes)}")
+        sessions: List[SessionSpec] = []
+        for route in routes:
+            module, entity, action = route.path.strip("/").split("/")
+            for _ in range(count):
+                context = rng.choice(_TEMPLATES).format(module=module, entity=entity, action=action)
+                if rng.random() < _variation_ratio:
+                    context = self._vary(rng, context)
+                sessions.append(SessionSpec(id=self._id(rng), route_id=route.id, context=context))
+        return sessions
+
+    def _vary(self, rng: random.Random, context: str) -> str:
+        words = context.split()
+        i = rng.randrange(len(words))
+        synonyms = _SYNONYMS.get(words[i])
+        if synonyms and rng.random() < 0.5:
+            words[i] = rng.choice(synonyms)
+        elif len(words[i]) > 3:
+            # Swap two adjacent letters
+            j = rng.randrange(len(words[i]) - 1)
+            word = words[i]
+            words[i] = word[:j] + word[j + 1] + word[j] + word[j + 2:]
+        return " ".join(words)
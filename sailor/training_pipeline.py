@@ -0,0 +1,127 @@
+"""
+Multi-engine training on one shared vectorization stage.
+
+Route documents and their TF-IDF matrix are built once and cached on disk as an
+artifact keyed by a hash of the training data, then every engine is trained
+from that cache on a process pool and written as its own model artifact.
+"""
+import hashlib
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, List, Optional, Tuple
+import numpy as np
+from scipy import sparse
+from sklearn.feature_extraction.text import TfidfVectorizer
+
+from .model_artifact import ARTIFACT_FORMAT_VERSION, manifest_path, pack_strings, unpack_strings, read_artifact, write_artifact
+from .route_documentor import RouteDocumentor
+from .sailor_engine import SailorEngine, _estimator_params, _restore_params, _tfidf_arrays, _load_tfidf_arrays
+from .types import RouteSpec, SessionSpec
+
+SharedFeatures = Tuple[RouteDocumentor, List[str], np.ndarray, TfidfVectorizer, sparse.csr_matrix]
+
+def data_hash(routes: List[RouteSpec], sessions: List[SessionSpec], tfidf: TfidfVectorizer) -> str:
+    """Key of the shared features, changes with the training data and the vectorizer params"""
+    digest = hashlib.sha256(f"{ARTIFACT_FORMAT_VERSION}:{sorted(_estimator_params(tfidf).items())}".encode())
+    for route in routes:
+        digest.update(route.model_dump_json().encode())
+    for session in sessions:
+        digest.update(f"{session.route_id}\0{session.context}\0".encode())
+    return digest.hexdigest()
+
+def build_features(routes: List[RouteSpec],
+                   sessions: List[SessionSpec],
+                   features_dir: str,
+                   tfidf: Optional[TfidfVectorizer] = None,
+                  ) -> str:
+    tfidf = tfidf if tfidf is not None else TfidfVectorizer(stop_words='english')
+    documentor = RouteDocumentor()
+    labels = documentor.fit_transform(routes, sessions)
+    return save_features(documentor, labels, tfidf, features_dir)
+
+def save_features(documentor: RouteDocumentor, labels: np.ndarray, tfidf: TfidfVectorizer, features_dir: str) -> str:
+    """Vectorize the documents of an already fitted `documentor`, several vectorizers can share its tokenization"""
+    documents = documentor.documents
+    features = sparse.csr_matrix(tfidf.fit_transform(documents))
+
+    documents_data, documents_offsets = pack_strings(documents)
+    arrays = {
+        **documentor.to_arrays(),
+        **_tfidf_arrays(tfidf),
+        "documents_data": documents_data,
+        "documents_offsets": documents_offsets,
+        "labels": labels,
+        "features_data": features.data,
+        "features_indices": features.indices,
+        "features_indptr": features.indptr,
+        "features_shape": np.array(features.shape, dtype=np.int64),
+    }
+    return write_artifact(features_dir, "SharedFeatures", None, {"tfidf": _estimator_params(tfidf)}, arrays)
+
+def load_features(features_dir: str, mmap_mode: Optional[str] = "r") -> SharedFeatures:
+    manifest, arrays = read_artifact(features_dir, mmap_mode=mmap_mode)
+
+    documentor = RouteDocumentor()
+    documentor.load_arrays(arrays)
+    tfidf = TfidfVectorizer().set_params(**_restore_params(manifest["params"]["tfidf"]))
+    tfidf = _load_tfidf_arrays(tfidf, arrays)
+
+    documents = unpack_strings(arrays["documents_data"], arrays["documents_offsets"])
+    features = sparse.csr_matrix(
+        (arrays["features_data"], arrays["features_indices"], arrays["features_indptr"]),
+        shape=tuple(arrays["features_shape"]))
+    return documentor, documents, np.asarray(arrays["labels"]), tfidf, features
+
+def _train_engine(model_name: str, engine: SailorEngine, features_dir: str, model_dir: str) -> Tuple[str, str, float]:
+    start = time.perf_counter()
+    engine.fit_features(*load_features(features_dir))
+    fit_seconds = time.perf_counter() - start
+    return model_name, engine.save_artifact(model_name, model_dir), fit_seconds
+
+class TrainingPipeline:
+    """
+    Trains `engines`, keyed by model name, from one cached vectorization stage.
+    Engines configured with the same TF-IDF params only fit their classifier,
+    the others still reuse the cached route documents and skip spaCy.
+    """
+
+    def __init__(self,
+                 engines: Dict[str, SailorEngine],
+                 cache_dir: str,
+                 tfidf: Optional[TfidfVectorizer] = None,
+                 max_workers: Optional[int] = None,
+                 verbose: bool = False,
+                ):
+        self.engines = engines
+        self.cache_dir = cache_dir
+        self.tfidf = tfidf if tfidf is not None else TfidfVectorizer(stop_words='english')
+        self.max_workers = max_workers
+        self._verbose = verbose
+
+    def features(self, routes: List[RouteSpec], sessions: List[SessionSpec]) -> str:
+        """Shared features directory for this data, built only on a cache miss"""
+        features_dir = os.path.join(self.cache_dir, data_hash(routes, sessions, self.tfidf))
+        if os.path.exists(manifest_path(features_dir)):
+            if self._verbose: print("[TRAIN] Reusing cached features:", features_dir)
+            return features_dir
+
+        if self._verbose: print("[TRAIN] Building features for", len(routes), "routes and", len(sessions), "sessions")
+        return build_features(routes, sessions, features_dir, tfidf=self.tfidf)
+
+    def run(self, routes: List[RouteSpec], sessions: List[SessionSpec], model_dir: str) -> Dict[str, str]:
+        """Train every engine in parallel and write its artifact, returns the artifact paths"""
+        features_dir = self.features(routes, sessions)
+
+        artifacts: Dict[str, str] = {}
+        with ProcessPoolExecutor(max_workers=self.max_workers) as executor:
+            futures = [
+                executor.submit(_train_engine, model_name, engine, features_dir, model_dir)
+                for model_name, engine in self.engines.items()
+            ]
+            for future in futures:
+                model_name, artifact_dir, fit_seconds = future.result()
+                if self._verbose: print(f"[TRAIN] {model_name} trained in {fit_seconds:.2f}s")
+                artifacts[model_name] = artifact_dir
+
+        return artifacts
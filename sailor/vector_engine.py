@@ -0,0 +1,108 @@
+import re
+from typing import Dict, Iterable, List
+import numpy as np
+from sklearn.base import BaseEstimator, TransformerMixin
+from sklearn.pipeline import Pipeline
+
+from .model_artifact import pack_strings, unpack_strings
+from .route_documentor import _SPACY_MODEL, _SPACY_EXCLUDE
+from .instrumentation import timed_stage
+from .sailor_engine import SailorEngine
+
+_token_pattern = re.compile(r"[a-z]+")
+
+def _load_vectors(model: str):
+    import spacy
+    return spacy.load(model, exclude=[c for c in _SPACY_EXCLUDE if c != "vectors"])
+
+class WordVectorizer(TransformerMixin, BaseEstimator):
+    """
+    Embeds documents as the normalized mean of their word vectors.
+
+    spaCy is only loaded by `fit`, to copy a float32 lookup table holding the
+    `max_vectors` most frequent words plus every word of the fitted documents.
+    `transform` only does dict lookups and one mean per document.
+    """
+
+    def __init__(self, model: str = _SPACY_MODEL, max_vectors: int = 50_000):
+        self.model = model
+        self.max_vectors = max_vectors
+
+    def fit(self, documents: Iterable[str], y=None):
+        document_terms = {t for d in documents for t in _token_pattern.findall(d.lower())}
+
+        vocab = _load_vectors(self.model).vocab
+        table: Dict[str, int] = {}
+        for key, row in vocab.vectors.key2row.items():
+            word = vocab.strings[key] if key in vocab.strings else None
+            if word is None or not word.isalpha(): continue
+
+            term = word.lower()
+            # Vector tables are ordered by frequency, rarer words are kept only when the documents use them
+            if row >= self.max_vectors and term not in document_terms: continue
+            if term not in table or word == term:
+                table[term] = row
+
+        terms = sorted(table)
+        self.vocabulary_ = {term: i for i, term in enumerate(terms)}
+        self.vectors_ = np.asarray(vocab.vectors.data[[table[t] for t in terms]], dtype=np.float32)
+        return self
+
+    def transform(self, documents: Iterable[str]) -> np.ndarray:
+        documents = list(documents)
+        embeddings = np.zeros((len(documents), self.vectors_.shape[1]), dtype=np.float32)
+        for i, document in enumerate(documents):
+            rows = [self.vocabulary_[t] for t in _token_pattern.findall(document.lower()) if t in self.vocabulary_]
+            if rows:
+                embeddings[i] = self.vectors_[rows].mean(axis=0)
+
+        norms = np.linalg.norm(embeddings, axis=1, keepdims=True)
+        np.divide(embeddings, norms, out=embeddings, where=norms > 0)
+        return embeddings
+
+class VectorSailorEngine(SailorEngine):
+    """
+    Dense semantic engine, routes are ranked by cosine similarity between the
+    query and route embeddings, one matrix product for a whole batch.
+    Catches synonyms that share no TF-IDF term with the route.
+    """
+
+    def __init__(self, max_vectors: int = 50_000):
+        super().__init__()
+        self.pipeline = Pipeline([
+            ('vectors', WordVectorizer(max_vectors=max_vectors)),
+            ])
+        self._route_embeddings: np.ndarray
+
+    def _fit_documents(self, documents: Iterable[str], labels: np.ndarray):
+        embeddings = self.pipeline.fit_transform(list(documents))
+        # Rows follow the route labels so scores line up with the route table
+        self._route_embeddings = np.ascontiguousarray(embeddings[np.argsort(labels)])
+
+    def decision_scores(self, queries: List[str]) -> np.ndarray:
+        with timed_stage(type(self).__name__, "transform"):
+            embeddings = self.pipeline.transform(queries)
+        with timed_stage(type(self).__name__, "classify"):
+            return embeddings @ self._route_embeddings.T
+
+    def _vectorizer_arrays(self) -> Dict[str, np.ndarray]:
+        vectorizer: WordVectorizer = self.pipeline.named_steps['vectors']
+        terms = sorted(vectorizer.vocabulary_, key=vectorizer.vocabulary_.__getitem__)
+        vocabulary_data, vocabulary_offsets = pack_strings(terms)
+        return {
+            "vectors_vocabulary_data": vocabulary_data,
+            "vectors_vocabulary_offsets": vocabulary_offsets,
+            "vectors_table": vectorizer.vectors_,
+        }
+
+    def _load_vectorizer(self, arrays: Dict[str, np.ndarray]):
+        vectorizer: WordVectorizer = self.pipeline.named_steps['vectors']
+        terms = unpack_strings(arrays["vectors_vocabulary_data"], arrays["vectors_vocabulary_offsets"])
+        vectorizer.vocabulary_ = {term: i for i, term in enumerate(terms)}
+        vectorizer.vectors_ = arrays["vectors_table"]
+
+    def _classifier_arrays(self) -> Dict[str, np.ndarray]:
+        return {"vectors_routes": self._route_embeddings}
+
+    def _load_classifier(self, arrays: Dict[str, np.ndarray]):
+        self._route_embeddings = arrays["vectors_routes"]
@@ -0,0 +1,206 @@
+"""
+Offline performance benchmarks on synthetic data.
+
+Results are written as JSON and compared against a stored baseline, any metric
+worse than the baseline by more than the tolerance fails the run.
+Metrics ending in `_per_second` are better when higher, all others when lower.
+"""
+import argparse
+import asyncio
+import json
+import os
+import socket
+import sys
+import tempfile
+import threading
+import time
+from typing import Callable, Dict, List, Type
+import numpy as np
+
+from sailor import SailorEngine, SVCSailorEngine, KNNSailorEngine, CascadeSailorEngine, RouteDocumentor
+from sailor.synthetic_data import SyntheticDataGenerator
+
+_ENGINES: Dict[str, Type[SailorEngine]] = {
+    "svc": SVCSailorEngine,
+    "knn": KNNSailorEngine,
+    "cascade": CascadeSailorEngine,
+}
+
+_FIT_SIZES = [(20, 50), (20, 200), (100, 50), (100, 200)]
+_PREDICT_SIZE = (100, 100)
+_LATENCY_QUERIES = 500
+_BATCH_SIZE = 64
+_REPEATS = 3
+
+_results_dir = "./build/benchmarks"
+
+def _percentiles(name: str, seconds: List[float]) -> Dict[str, float]:
+    return {f"{name}_p{p}_ms": 1000 * float(np.percentile(seconds, p)) for p in (50, 95, 99)}
+
+def _timed(fn: Callable[[], object]) -> float:
+    start = time.perf_counter()
+    fn()
+    return time.perf_counter() - start
+
+def bench_fit(generator: SyntheticDataGenerator) -> Dict[str, float]:
+    results: Dict[str, float] = {}
+    for n_routes, n_sessions in _FIT_SIZES:
+        routes = generator.generate_routes(n_routes)
+        sessions = generator.generate_sessions(routes, n_sessions)
+        for name, engine_cls in _ENGINES.items():
+            # Best of a few runs, single timings are too noisy to compare against a baseline
+            results[f"fit_{name}_{n_routes}r_{n_sessions}s_seconds"] = min(
+                _timed(lambda: engine_cls().fit(routes, sessions)) for _ in range(_REPEATS))
+    return results
+
+def bench_tokenize(generator: SyntheticDataGenerator) -> Dict[str, float]:
+    routes = generator.generate_routes(_PREDICT_SIZE[0])
+    sessions = generator.generate_sessions(routes, _PREDICT_SIZE[1])
+    # First call pays the spaCy model load
+    RouteDocumentor().fit_transform(routes, sessions[:10])
+    seconds = min(_timed(lambda: RouteDocumentor().fit_transform(routes, sessions)) for _ in range(_REPEATS))
+    return {"tokenize_sessions_per_second": len(sessions) / seconds}
+
+def bench_predict(engines: Dict[str, SailorEngine], queries: List[str]) -> Dict[str, float]:
+    results: Dict[str, float] = {}
+    for name, engine in engines.items():
+        engine.predict(queries[0], top_k=5)
+        single = [_timed(lambda: engine.predict(q, top_k=5)) for q in queries]
+        batches = [queries[i:i + _BATCH_SIZE] for i in range(0, len(queries), _BATCH_SIZE)]
+        batched = [_timed(lambda: engine.predict_batch(b, top_k=5)) for b in batches]
+        results.update(_percentiles(f"predict_{name}", single))
+        results.update(_percentiles(f"predict_batch{_BATCH_SIZE}_{name}", batched))
+    return results
+
+def bench_load(model_dir: str) -> Dict[str, float]:
+    results: Dict[str, float] = {}
+    for name in _ENGINES:
+        artifact_dir = os.path.join(model_dir, f"{name}_model")
+        results[f"load_{name}_seconds"] = min(_timed(lambda: SailorEngine.load_artifact(artifact_dir)) for _ in range(_REPEATS))
+    return results
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+async def _http_load(port: int, queries: List[str], concurrency: int) -> Dict[str, float]:
+    import httpx
+
+    latencies: List[float] = []
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async with httpx.AsyncClient(base_url=f"http://127.0.0.1:{port}", limits=httpx.Limits(max_connections=concurrency)) as client:
+        async def request(query: str):
+            async with semaphore:
+                start = time.perf_counter()
+                response = await client.post("/predict/svc", json={"query": query, "top_k": 5})
+                latencies.append(time.perf_counter() - start)
+                response.raise_for_status()
+
+        await request(queries[0])
+        latencies.clear()
+        start = time.perf_counter()
+        await asyncio.gather(*(request(q) for q in queries))
+        elapsed = time.perf_counter() - start
+
+    return {"http_requests_per_second": len(queries) / elapsed, **_percentiles("http", latencies)}
+
+def bench_http(model_dir: str, queries: List[str], concurrency: int) -> Dict[str, float]:
+    import uvicorn
+    from pathlib import Path
+    import api.models_loader as models_loader
+    models_loader._MODEL_DIR = Path(model_dir)
+    import api.main as main
+    # Every request reaches the engine, the cache would only measure dict lookups
+    main.result_cache.max_size = 0
+
+    port = _free_port()
+    server = uvicorn.Server(uvicorn.Config(main.app, host="127.0.0.1", port=port, log_level="warning"))
+    thread = threading.Thread(target=server.run, daemon=True)
+    thread.start()
+    try:
+        while not server.started:
+            time.sleep(0.05)
+        return asyncio.run(_http_load(port, queries, concurrency))
+    finally:
+        server.should_exit = True
+        thread.join()
+
+def run_benchmarks(seed: int, concurrency: int) -> Dict[str, float]:
+    generator = SyntheticDataGenerator(seed=seed)
+    routes = generator.generate_routes(_PREDICT_SIZE[0])
+    sessions = generator.generate_sessions(routes, _PREDICT_SIZE[1])
+    queries = [s.context for s in SyntheticDataGenerator(seed=seed + 1).generate_sessions(routes, 5)][:_LATENCY_QUERIES]
+
+    results: Dict[str, float] = {}
+    print("Benchmarking tokenization...")
+    results.update(bench_tokenize(generator))
+    print("Benchmarking fit...")
+    results.update(bench_fit(generator))
+
+    engines = {name: engine_cls() for name, engine_cls in _ENGINES.items()}
+    for engine in engines.values():
+        engine.fit(routes, sessions)
+
+    print("Benchmarking predict...")
+    results.update(bench_predict(engines, queries))
+
+    with tempfile.TemporaryDirectory() as model_dir:
+        for name, engine in engines.items():
+            engine.save_artifact(f"{name}_model", model_dir)
+        print("Benchmarking model load...")
+        results.update(bench_load(model_dir))
+        print("Benchmarking HTTP...")
+        results.update(bench_http(model_dir, queries, concurrency))
+
+    return results
+
+def compare(results: Dict[str, float], baseline: Dict[str, float], tolerance: float) -> List[str]:
+    """Metrics regressed beyond `tolerance`, a ratio of the baseline value"""
+    regressions: List[str] = []
+    for name, value in results.items():
+        reference = baseline.get(name)
+        if not reference: continue
+
+        higher_is_better = name.endswith("_per_second")
+        change = (reference - value) / reference if higher_is_better else (value - reference) / reference
+        if change > tolerance:
+            regressions.append(f"{name}: {reference:.4g} -> {value:.4g} ({change:+.0%})")
+    return regressions
+
+def run():
+    """Launched with `poetry run benchmark` at root level"""
+    parser = argparse.ArgumentParser(description="Sailor offline performance benchmarks")
+    parser.add_argument("--seed", type=int, default=14)
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--output", default=os.path.join(_results_dir, "latest.json"))
+    parser.add_argument("--baseline", default=os.path.join(_results_dir, "baseline.json"))
+    parser.add_argument("--tolerance", type=float, default=0.2)
+    parser.add_argument("--update-baseline", action="store_true")
+    args = parser.parse_args()
+
+    results = run_benchmarks(args.seed, args.concurrency)
+    os.makedirs(os.path.dirname(args.output) or ".", exist_ok=True)
+    with open(args.output, "w") as f:
+        json.dump(results, f, indent=2, sort_keys=True)
+    print(f"Results saved to {args.output}")
+
+    if args.update_baseline or not os.path.exists(args.baseline):
+        os.makedirs(os.path.dirname(args.baseline) or ".", exist_ok=True)
+        with open(args.baseline, "w") as f:
+            json.dump(results, f, indent=2, sort_keys=True)
+        print(f"Baseline saved to {args.baseline}")
+        return
+
+    with open(args.baseline) as f:
+        regressions = compare(results, json.load(f), args.tolerance)
+    if regressions:
+        print("Regressions against baseline:")
+        for regression in regressions:
+            print(f"  {regression}")
+        sys.exit(1)
+    print("No regressions against baseline")
+
+if __name__ == "__main__":
+    run()
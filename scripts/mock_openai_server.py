@@ -0,0 +1,117 @@
+"""
+Local OpenAI-compatible endpoint answering route and session generation
+requests with synthetic data, with a provider-like quota and latency.
+
+Point `AI_MODEL_URL` at `http://127.0.0.1:8100/v1` to exercise
+`SailorDataEngineer` and its rate controller without a real provider.
+"""
+import argparse
+import asyncio
+import json
+import re
+import threading
+import time
+from typing import Any, Dict, List
+import uvicorn
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse
+
+from sailor.synthetic_data import SyntheticDataGenerator
+from sailor.types import RouteSpec
+
+_count_pattern = re.compile(r"Generate (\d+)")
+_route_pattern = re.compile(r"ID: (?P<id>[^,]+), Path: (?P<path>[^,]+), Tags: (?P<tags>.*)$")
+
+class _Quota:
+    """Fixed window request quota, like a provider's requests per minute limit"""
+
+    def __init__(self, requests_per_second: float):
+        self.requests_per_second = requests_per_second
+        self._window = 0
+        self._used = 0
+        self._lock = threading.Lock()
+        self.accepted = 0
+        self.rejected = 0
+
+    def take(self) -> float:
+        """0 when the request is accepted, otherwise seconds until the next window"""
+        if self.requests_per_second <= 0: return 0.0
+        now = time.monotonic()
+        with self._lock:
+            window = int(now)
+            if window != self._window:
+                self._window, self._used = window, 0
+            if self._used < self.requests_per_second:
+                self._used += 1
+                self.accepted += 1
+                return 0.0
+            self.rejected += 1
+            return window + 1 - now
+
+def create_app(requests_per_second: float = 10, latency_ms: float = 200, seed: int = 14) -> FastAPI:
+    app = FastAPI()
+    quota = _Quota(requests_per_second)
+    generator = SyntheticDataGenerator(seed=seed)
+
+    def _routes(count: int) -> Dict[str, Any]:
+        return {"routes": [r.model_dump() for r in generator.generate_routes(count)]}
+
+    def _sessions(route: RouteSpec, count: int) -> Dict[str, Any]:
+        if route.path.count("/") != 3:
+            route = RouteSpec(id=route.id, path=generator.generate_routes(1)[0].path, tags=route.tags)
+        return {"sessions": [s.model_dump() for s in generator.generate_sessions([route], count)]}
+
+    @app.post("/v1/chat/completions")
+    async def chat_completions(request: Request):
+        retry_after = quota.take()
+        if retry_after > 0:
+            return JSONResponse(
+                status_code=429,
+                headers={"retry-after-ms": str(int(retry_after * 1000))},
+                content={"error": {"message": "Rate limit reached", "type": "requests", "code": "rate_limit_exceeded"}})
+
+        body = await request.json()
+        await asyncio.sleep(latency_ms / 1000)
+
+        prompt: str = body["messages"][-1]["content"]
+        count_match = _count_pattern.search(prompt)
+        count = int(count_match.group(1)) if count_match else 1
+        schema = body.get("response_format", {}).get("json_schema", {}).get("name")
+
+        if schema == "SessionResponse":
+            match = _route_pattern.search(prompt)
+            tags: List[str] = match.group("tags").split(", ") if match else []
+            route = RouteSpec(id=match.group("id") if match else "route", path=match.group("path") if match else "/", tags=tags)
+            content = _sessions(route, count)
+        else:
+            content = _routes(count)
+
+        return {
+            "id": f"chatcmpl-{time.monotonic_ns()}",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": body.get("model", "mock"),
+            "choices": [{
+                "index": 0,
+                "finish_reason": "stop",
+                "message": {"role": "assistant", "content": json.dumps(content)},
+            }],
+            "usage": {"prompt_tokens": 0, "completion_tokens": 0, "total_tokens": 0},
+        }
+
+    @app.get("/stats")
+    async def stats():
+        return {"accepted": quota.accepted, "rejected": quota.rejected}
+
+    return app
+
+def run():
+    parser = argparse.ArgumentParser(description="Mock OpenAI-compatible generation endpoint")
+    parser.add_argument("--port", type=int, default=8100)
+    parser.add_argument("--requests-per-second", type=float, default=10)
+    parser.add_argument("--latency-ms", type=float, default=200)
+    args = parser.parse_args()
+    uvicorn.run(create_app(args.requests_per_second, args.latency_ms), host="127.0.0.1", port=args.port)
+
+if __name__ == "__main__":
+    run()
@@ -1,40 +1,70 @@
 import os
-import pickle
 import asyncio
-from sailor.sailor_data_engineer import RouteGenConfig, SailorDataEngineer
-from sailor.sailor_engine import SVCSailorEngine, KNNSailorEngine
-from sailor.route_vectorizer import TfidfRouteVectorizer
-
-async def train():
-    _config = RouteGenConfig.from_env(dir="./build/cache")
-    _enginner = SailorDataEngineer(
-        _config,
-        cache_key='validate_model',
-        route_description="flight agency admin panel")
-
-    route_context = await _enginner.generate_data(route_count=20, session_count=100)
-    if route_context is None:
+from typing import Dict, List
+from sailor import SailorEngine, SVCSailorEngine, KNNSailorEngine, CascadeSailorEngine, ModelCompactor
+from sailor.sailor_data_engineer import RouteGenConfig, SailorDataWarehouse
+from sailor.training_pipeline import TrainingPipeline
+from sailor.types import SessionSpec
+
+_context = os.getenv("SAILOR_TRAIN_CONTEXT", "flight agency admin panel")
+_route_count = int(os.getenv("SAILOR_TRAIN_ROUTES", "20"))
+_session_count = int(os.getenv("SAILOR_TRAIN_SESSIONS", "100"))
+# float32 or int8 to replace the artifacts with compacted ones, empty keeps the full models
+_compact_dtype = os.getenv("SAILOR_TRAIN_COMPACT", "")
+_compact_tolerance = float(os.getenv("SAILOR_TRAIN_COMPACT_TOLERANCE", "0.01"))
+
+_db_dir = "./build/db"
+_cache_dir = "./build/cache/features"
+_model_dir = "./build/models"
+_report_dir = "./build/reports"
+
+def _engines() -> Dict[str, SailorEngine]:
+    return {
+        "svc_model": SVCSailorEngine(),
+        "knn_model": KNNSailorEngine(),
+        "cascade_model": CascadeSailorEngine(),
+    }
+
+async def _load_data(warehouse: SailorDataWarehouse):
+    routes = await warehouse.create_routes(_route_count)
+    if not routes:
         raise ValueError("No data generated")
 
-    model_dir = "./build/models"
-    os.makedirs(model_dir, exist_ok=True)
-    for file in os.listdir(model_dir):
-        os.remove(os.path.join(model_dir, file))
-
-    # Train SVC Model
-    svc_vectorizer = TfidfRouteVectorizer()
-    svc_engine = SVCSailorEngine(svc_vectorizer)
-    svc_engine.train(route_context.routes, route_context.sessions)
-    with open(os.path.join(model_dir, "svc_model.pkl"), "wb") as f:
-        pickle.dump(svc_engine, f)
-
-    # Train KNN Model
-    knn_vectorizer = TfidfRouteVectorizer()
-    knn_engine = KNNSailorEngine(knn_vectorizer)
-    knn_engine.train(route_context.routes, route_context.sessions)
-    with open(os.path.join(model_dir, "knn_model.pkl"), "wb") as f:
-        pickle.dump(knn_engine, f)
+    route_sessions = await warehouse.create_sessions(routes, _session_count)
+    sessions = [session for chunk in route_sessions for session in chunk]
+    return routes, sessions
+
+def _compact(artifacts: Dict[str, str], sessions: List[SessionSpec]):
+    compactor = ModelCompactor(dtype=_compact_dtype, tolerance=_compact_tolerance, verbose=True)
+    for model_name, artifact_dir in artifacts.items():
+        engine = SailorEngine.load_artifact(artifact_dir, mmap_mode=None)
+        report_path = os.path.join(_report_dir, f"{model_name}_compaction.json")
+        compacted, report = compactor.compact(engine, sessions, report_path=report_path)
+
+        # Published as a new artifact version, the full model serves until the link flips
+        compacted.save_artifact(model_name, _model_dir)
+        print(f"Compacted {model_name}: {report['compacted']['terms']} of {report['baseline']['terms']} terms, "
+              f"top-{report['top_k']} accuracy {report['compacted']['top_k_delta']:+.3f}")
+
+def train():
+    _config = RouteGenConfig.from_env()
+    warehouse = SailorDataWarehouse(_config, _context, db_path=_db_dir, verbose=True)
+    try:
+        routes, sessions = asyncio.run(_load_data(warehouse))
+    finally:
+        warehouse.close()
+
+    pipeline = TrainingPipeline(_engines(), cache_dir=_cache_dir, verbose=True)
+    artifacts = pipeline.run(routes, sessions, _model_dir)
+    for model_name, artifact_dir in artifacts.items():
+        print(f"Saved {model_name} to {artifact_dir}")
+
+    if _compact_dtype:
+        _compact(artifacts, sessions)
 
 def run():
     """Launched with `poetry run train` at root level"""
-    asyncio.run(train())
+    train()
+
+if __name__ == "__main__":
+    run()
@@ -0,0 +1,51 @@
+import socket
+import threading
+import time
+from typing import Iterator, List, Tuple
+import pytest
+import spacy
+import uvicorn
+
+from sailor import route_documentor
+from sailor.synthetic_data import SyntheticDataGenerator
+from sailor.types import RouteSpec, SessionSpec
+
+@pytest.fixture(scope="session", autouse=True)
+def blank_tokenizer():
+    """
+    Session parsing only reads the tokenizer's lexical attributes, which a blank
+    English pipeline sets the same way, tests don't need the full spaCy model.
+    """
+    tokenizer = spacy.blank("en")
+    with pytest.MonkeyPatch.context() as patch:
+        patch.setattr(route_documentor, "_load_tokenizer", lambda model=route_documentor._SPACY_MODEL: tokenizer)
+        yield tokenizer
+
+@pytest.fixture(scope="session")
+def dataset() -> Tuple[List[RouteSpec], List[SessionSpec]]:
+    generator = SyntheticDataGenerator(seed=14)
+    routes = generator.generate_routes(20)
+    return routes, generator.generate_sessions(routes, 20)
+
+@pytest.fixture(scope="session")
+def queries() -> List[str]:
+    generator = SyntheticDataGenerator(seed=14)
+    routes = generator.generate_routes(20)
+    return [s.context for s in SyntheticDataGenerator(seed=15).generate_sessions(routes, 2)]
+
+@pytest.fixture(scope="module")
+def mock_openai_server() -> Iterator[str]:
+    """`scripts/mock_openai_server.py` on a free port with a 10 requests per second quota, yields its root URL"""
+    from scripts.mock_openai_server import create_app
+
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        port = sock.getsockname()[1]
+    server = uvicorn.Server(uvicorn.Config(create_app(requests_per_second=10, latency_ms=20), host="127.0.0.1", port=port, log_level="warning"))
+    thread = threading.Thread(target=server.run, daemon=True)
+    thread.start()
+    while not server.started:
+        time.sleep(0.01)
+    yield f"http://127.0.0.1:{port}"
+    server.should_exit = True
+    thread.join()
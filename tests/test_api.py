@@ -0,0 +1,59 @@
+import pytest
+from fastapi.testclient import TestClient
+
+from api import main
+from sailor import SVCSailorEngine
+
+@pytest.fixture(scope="module")
+def engine(dataset):
+    routes, sessions = dataset
+    engine = SVCSailorEngine()
+    engine.fit(routes, sessions)
+    return engine
+
+@pytest.fixture
+def client(monkeypatch, engine):
+    async def load(model_name, context=None):
+        return engine
+    monkeypatch.setattr(main.model_loader, "load", load)
+    main.result_cache.invalidate()
+    return TestClient(main.app)
+
+def test_predict_batch_endpoint_matches_single_predictions(client, queries):
+    response = client.post("/predict/batch", json={"queries": queries[:4], "top_k": 3})
+    assert response.status_code == 200
+    batch = response.json()["predictions"]
+
+    for query, predictions in zip(queries[:4], batch):
+        single = client.post("/predict/svc", json={"query": query, "top_k": 3}).json()["predictions"]
+        assert predictions == single
+        assert len(predictions) == 3
+
+def test_typeahead_keeps_session_state_apart_from_results(client, engine):
+    main.session_states.invalidate()
+    first = client.post("/suggest/typeahead", json={"query": "us", "session_id": "Client-1", "top_k": 3})
+    second = client.post("/suggest/typeahead", json={"query": "use", "session_id": "Client-1", "top_k": 3})
+    assert first.status_code == second.status_code == 200
+
+    key = main.session_states.key("svc_model", engine.version, "Client-1", "typeahead")
+    assert main.session_states.get(key).prefix == "use"
+    assert main.result_cache.stats()["size"] == 0
+
+    expected, _ = engine.typeahead.suggest("use", top_k=3)
+    assert [p["id"] for p in second.json()["predictions"]] == [r.id for r in expected]
+
+def _metric(text: str, sample: str) -> float:
+    line = next((l for l in text.splitlines() if l.startswith(sample + " ")), None)
+    return float(line.split()[-1]) if line is not None else 0.0
+
+def test_cache_requests_are_counted(client, queries):
+    hit = 'sailor_cache_requests_total{cache="results",result="hit"}'
+    miss = 'sailor_cache_requests_total{cache="results",result="miss"}'
+    before = client.get("/metrics").text
+    assert "# TYPE sailor_cache_requests_total counter" in before
+
+    for _ in range(3):
+        client.post("/predict/svc", json={"query": queries[0]})
+    after = client.get("/metrics").text
+    assert _metric(after, miss) - _metric(before, miss) == 1
+    assert _metric(after, hit) - _metric(before, hit) == 2
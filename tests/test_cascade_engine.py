@@ -0,0 +1,41 @@
+import numpy as np
+import pytest
+
+from sailor import CascadeSailorEngine
+from sailor.cascade_engine import STAGE_SVC, STAGE_SVC_KNN
+
+@pytest.fixture(scope="module")
+def engine(dataset):
+    routes, sessions = dataset
+    engine = CascadeSailorEngine()
+    engine.fit(routes, sessions)
+    return engine
+
+def test_stages_batch_matches_single_queries(engine, queries):
+    batch = engine.predict_batch_with_stages(queries, top_k=3)
+    for query, (routes, stage) in zip(queries, batch):
+        [(single, single_stage)] = engine.predict_batch_with_stages([query], top_k=3)
+        assert stage == single_stage
+        assert [r.id for r in routes] == [r.id for r in single]
+
+def test_missing_queries_get_their_own_empty_results(engine, queries):
+    results = engine.predict_batch_with_stages([None, queries[0], None])
+    assert results[0] == ([], None) and results[2] == ([], None)
+    assert results[0][0] is not results[2][0]
+    assert results[1][1] in (STAGE_SVC, STAGE_SVC_KNN)
+
+def test_margin_threshold_controls_escalation(engine, queries):
+    engine.margin_threshold = 0.0
+    try:
+        scores, stages = engine.decision_stages(queries)
+        assert set(stages) == {STAGE_SVC}
+        svc_scores = scores
+
+        engine.margin_threshold = np.inf
+        scores, stages = engine.decision_stages(queries)
+        assert set(stages) == {STAGE_SVC_KNN}
+        # Fused scores are reciprocal ranks, bounded by both stages ranking a route first
+        assert scores.max() <= 2 / (engine.fusion_k + 1)
+        assert not np.allclose(scores, svc_scores)
+    finally:
+        engine.margin_threshold = CascadeSailorEngine().margin_threshold
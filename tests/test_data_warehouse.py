@@ -0,0 +1,162 @@
+import asyncio
+import itertools
+import httpx
+import pytest
+
+from sailor import RouteGenConfig, SailorDataWarehouse
+from sailor.session_dedup import text_hash
+from sailor.types import RouteSpec, SessionSpec
+
+# Shared by every fake generator, sessions of separate runs never collide
+_session_numbers = itertools.count()
+
+_routes = [RouteSpec(id=f"route-{i}", path=f"/billing/invoice/action{i}", tags=["billing"]) for i in range(3)]
+
+def _warehouse(db_dir: str, base_url: str = "http://127.0.0.1:9/v1", **kwargs) -> SailorDataWarehouse:
+    return SailorDataWarehouse(RouteGenConfig(api_key="test", model="mock", base_url=base_url), "test admin", db_dir, **kwargs)
+
+@pytest.fixture
+def warehouse(tmp_path):
+    warehouse = _warehouse(str(tmp_path))
+    yield warehouse
+    warehouse.close()
+
+class _FakeGenerator:
+    """Unique sessions per request, `fail` picks requests raising instead"""
+
+    def __init__(self, fail=lambda route, variant: False):
+        self.fail = fail
+        self.requests = []
+
+    async def __call__(self, route, count, variant=""):
+        self.requests.append((route.id, count, variant))
+        if self.fail(route, variant):
+            # Fails once the other batches went through
+            await asyncio.sleep(0.05)
+            raise RuntimeError("provider down")
+        return [SessionSpec(id="x", route_id=route.id, context=f"find invoice number {next(_session_numbers)}") for _ in range(count)]
+
+def test_failed_batch_cancels_the_other_batches(warehouse, monkeypatch):
+    cancelled = []
+
+    async def generate_session_batch(route, count, variant=""):
+        if route.id == "route-0":
+            raise RuntimeError("provider down")
+        try:
+            await asyncio.sleep(10)
+        except asyncio.CancelledError:
+            cancelled.append(route.id)
+            raise
+    monkeypatch.setattr(warehouse.enginner, "generate_session_batch", generate_session_batch)
+
+    async def run():
+        with pytest.raises(RuntimeError, match="provider down"):
+            await asyncio.wait_for(warehouse.create_sessions(_routes, 10), timeout=5)
+        # Cancelled before the error surfaced, not only when the loop shuts down
+        assert sorted(cancelled) == ["route-1", "route-2"]
+
+    asyncio.run(run())
+
+def test_rerun_only_requests_missing_batches(warehouse, monkeypatch):
+    failing = _FakeGenerator(fail=lambda route, variant: variant.endswith(":1"))
+    monkeypatch.setattr(warehouse.enginner, "generate_session_batch", failing)
+    with pytest.raises(RuntimeError):
+        asyncio.run(warehouse.create_sessions(_routes[:1], 100))
+
+    generator = _FakeGenerator()
+    monkeypatch.setattr(warehouse.enginner, "generate_session_batch", generator)
+    [sessions] = asyncio.run(warehouse.create_sessions(_routes[:1], 100))
+
+    assert len(sessions) == 100
+    assert generator.requests == [("route-0", 50, "route-0:0:1")]
+    assert asyncio.run(warehouse.create_sessions(_routes[:1], 100)) == [sessions]
+    assert len(generator.requests) == 1
+
+def test_rerun_with_another_count_updates_the_running_job(warehouse, monkeypatch):
+    failing = _FakeGenerator(fail=lambda route, variant: variant.endswith(":1"))
+    monkeypatch.setattr(warehouse.enginner, "generate_session_batch", failing)
+    with pytest.raises(RuntimeError):
+        asyncio.run(warehouse.create_sessions(_routes[:1], 100))
+
+    generator = _FakeGenerator()
+    monkeypatch.setattr(warehouse.enginner, "generate_session_batch", generator)
+    [sessions] = asyncio.run(warehouse.create_sessions(_routes[:1], 60))
+
+    assert len(sessions) == 60
+    assert [count for _, count, _ in generator.requests] == [10]
+    assert len(asyncio.run(warehouse._get_sessions("route-0"))) == 60
+
+def test_force_new_returns_only_the_new_sessions(warehouse, monkeypatch):
+    monkeypatch.setattr(warehouse.enginner, "generate_session_batch", _FakeGenerator())
+    [stored] = asyncio.run(warehouse.create_sessions(_routes[:1], 20))
+    [new] = asyncio.run(warehouse.create_sessions(_routes[:1], 10, force_new=True))
+
+    assert len(new) == 10
+    assert not {s.id for s in new} & {s.id for s in stored}
+    assert len(asyncio.run(warehouse._get_sessions("route-0"))) == 30
+
+def test_duplicate_sessions_are_dropped(warehouse, monkeypatch):
+    async def generate_session_batch(route, count, variant=""):
+        return [SessionSpec(id="x", route_id=route.id, context=f"Find invoice {i % 3}!") for i in range(count)]
+    monkeypatch.setattr(warehouse.enginner, "generate_session_batch", generate_session_batch)
+
+    [sessions] = asyncio.run(warehouse.create_sessions(_routes[:1], 10))
+    assert sorted(s.context for s in sessions) == ["Find invoice 0!", "Find invoice 1!", "Find invoice 2!"]
+
+@pytest.mark.parametrize("force_new", [False, True])
+def test_stored_duplicates_are_skipped_on_later_runs(warehouse, monkeypatch, force_new):
+    # Sessions from before dedup, the same context stored twice
+    legacy = "Find invoice 0!"
+    def seed(db):
+        db.executemany(
+            'INSERT INTO sessions_registry (id, route_id, intention_context, context_hash) VALUES (?, ?, ?, ?)',
+            [(f"legacy-{i}", "route-0", legacy, text_hash(legacy)) for i in range(2)])
+        db.commit()
+    warehouse.db.run_sync(seed)
+
+    async def generate_session_batch(route, count, variant=""):
+        return [SessionSpec(id="x", route_id=route.id, context=legacy)] + [
+            SessionSpec(id="x", route_id=route.id, context=f"find invoice number {next(_session_numbers)}") for _ in range(count - 1)]
+    monkeypatch.setattr(warehouse.enginner, "generate_session_batch", generate_session_batch)
+
+    [sessions] = asyncio.run(warehouse.create_sessions(_routes[:1], 5, force_new=force_new))
+    assert legacy not in {s.context for s in sessions if not s.id.startswith("legacy")}
+    stored = asyncio.run(warehouse._get_sessions("route-0"))
+    assert [s.context for s in stored].count(legacy) == 2
+
+def test_concurrent_batches_share_the_near_duplicate_index(tmp_path, monkeypatch):
+    warehouse = _warehouse(str(tmp_path), near_duplicate_threshold=0.8)
+    variants = itertools.count()
+
+    async def generate_session_batch(route, count, variant=""):
+        # Every batch says the same with a different ending
+        await asyncio.sleep(0)
+        ending = next(variants)
+        return [SessionSpec(id="x", route_id=route.id, context=f"where can i download the monthly invoice report for accounting {ending}")]
+    monkeypatch.setattr(warehouse.enginner, "generate_session_batch", generate_session_batch)
+
+    async def run():
+        await asyncio.gather(*(warehouse._run_batch(_routes[0], 0, batch_no, 1) for batch_no in range(4)))
+        return await warehouse._get_sessions("route-0")
+
+    try:
+        assert len(asyncio.run(run())) == 1
+    finally:
+        warehouse.close()
+
+def test_responses_are_reused_from_the_cache(tmp_path, mock_openai_server):
+    warehouse = _warehouse(str(tmp_path), base_url=f"{mock_openai_server}/v1")
+    before = httpx.get(f"{mock_openai_server}/stats").json()["accepted"]
+
+    async def run():
+        first = await warehouse.enginner.generate_session_batch(_routes[0], 5, variant="batch")
+        second = await warehouse.enginner.generate_session_batch(_routes[0], 5, variant="batch")
+        other = await warehouse.enginner.generate_session_batch(_routes[0], 5, variant="other")
+        return first, second, other
+
+    try:
+        first, second, other = asyncio.run(run())
+    finally:
+        warehouse.close()
+    assert first == second and len(other) == 5
+    assert httpx.get(f"{mock_openai_server}/stats").json()["accepted"] - before == 2
@@ -0,0 +1,75 @@
+import asyncio
+import threading
+from typing import List, Optional
+
+from api.inference_scheduler import InferenceScheduler
+
+class _RecordingEngine:
+    def __init__(self, fail: bool = False):
+        self.fail = fail
+        self.calls: List[List[str]] = []
+        self.threads: List[str] = []
+
+    def predict_batch(self, queries: List[str], top_k: Optional[int] = None):
+        self.calls.append(list(queries))
+        self.threads.append(threading.current_thread().name)
+        if self.fail: raise RuntimeError("engine failed")
+        return [f"{q}:{top_k}" for q in queries]
+
+def test_concurrent_queries_run_as_one_batch_off_the_loop():
+    scheduler = InferenceScheduler(max_wait_ms=20, max_batch_size=64, max_workers=1)
+    engine = _RecordingEngine()
+
+    async def main():
+        return await asyncio.gather(*(scheduler.predict(engine, f"q{i}", top_k=3) for i in range(10)))
+
+    try:
+        results = asyncio.run(main())
+    finally:
+        scheduler.shutdown()
+
+    assert results == [f"q{i}:3" for i in range(10)]
+    assert engine.calls == [[f"q{i}" for i in range(10)]]
+    assert engine.threads[0].startswith("sailor-inference")
+    assert not scheduler._tasks
+
+def test_full_batch_flushes_without_waiting():
+    scheduler = InferenceScheduler(max_wait_ms=10_000, max_batch_size=4, max_workers=1)
+    engine = _RecordingEngine()
+
+    async def main():
+        return await asyncio.wait_for(asyncio.gather(*(scheduler.predict(engine, f"q{i}") for i in range(8))), timeout=5)
+
+    try:
+        results = asyncio.run(main())
+    finally:
+        scheduler.shutdown()
+
+    assert len(results) == 8
+    assert [len(c) for c in engine.calls] == [4, 4]
+
+def test_batches_are_split_by_top_k():
+    scheduler = InferenceScheduler(max_wait_ms=20, max_workers=1)
+    engine = _RecordingEngine()
+
+    async def main():
+        return await asyncio.gather(scheduler.predict(engine, "a", top_k=1), scheduler.predict(engine, "b", top_k=2))
+
+    try:
+        assert asyncio.run(main()) == ["a:1", "b:2"]
+    finally:
+        scheduler.shutdown()
+    assert sorted(engine.calls) == [["a"], ["b"]]
+
+def test_engine_errors_reach_every_waiting_query():
+    scheduler = InferenceScheduler(max_wait_ms=20, max_workers=1)
+    engine = _RecordingEngine(fail=True)
+
+    async def main():
+        return await asyncio.gather(*(scheduler.predict(engine, f"q{i}") for i in range(3)), return_exceptions=True)
+
+    try:
+        results = asyncio.run(main())
+    finally:
+        scheduler.shutdown()
+    assert all(isinstance(r, RuntimeError) for r in results)
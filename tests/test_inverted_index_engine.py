@@ -0,0 +1,31 @@
+import numpy as np
+import pytest
+
+from sailor import InvertedIndexSailorEngine
+
+@pytest.fixture(scope="module")
+def engine(dataset):
+    routes, sessions = dataset
+    engine = InvertedIndexSailorEngine()
+    engine.fit(routes, sessions)
+    return engine
+
+@pytest.fixture(scope="module")
+def long_queries(queries):
+    # Many query terms, so MaxScore has non-essential terms to skip
+    return [" ".join(queries[i:i + 4]) for i in range(0, len(queries), 4)]
+
+def test_decision_scores_are_cosine_similarities(engine, queries):
+    tfidf = engine.pipeline.named_steps['tfidf']
+    routes = tfidf.transform([r.context for r in engine.documentor.label_routes])
+    expected = (tfidf.transform(queries) @ routes.T).toarray()
+    np.testing.assert_allclose(engine.decision_scores(queries), expected, atol=1e-12)
+
+@pytest.mark.parametrize("top_k", [1, 3, 10])
+def test_max_score_top_k_matches_brute_force(engine, queries, long_queries, top_k):
+    all_queries = queries + long_queries
+    brute_force = engine.decision_scores(all_queries)
+    for query, scores, routes in zip(all_queries, brute_force, engine.predict_batch(all_queries, top_k=top_k)):
+        expected = engine.scored_routes(scores, top_k=top_k)
+        assert [r.id for r in routes] == [r.id for r in expected], query
+        assert [r.score for r in routes] == pytest.approx([r.score for r in expected])
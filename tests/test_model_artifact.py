@@ -0,0 +1,94 @@
+import os
+import numpy as np
+import pytest
+
+from sailor import SailorEngine, SVCSailorEngine, KNNSailorEngine, CascadeSailorEngine
+from sailor import model_artifact
+from sailor.model_artifact import ARTIFACT_FORMAT_VERSION, pack_strings, read_manifest, unpack_strings
+
+@pytest.mark.parametrize("engine_cls", [SVCSailorEngine, KNNSailorEngine, CascadeSailorEngine])
+def test_artifact_round_trip_keeps_predictions(tmp_path, dataset, queries, engine_cls):
+    routes, sessions = dataset
+    engine = engine_cls()
+    engine.fit(routes, sessions)
+
+    artifact_dir = engine.save_artifact("model", str(tmp_path))
+    loaded = SailorEngine.load_artifact(artifact_dir, verify=True)
+
+    assert type(loaded) is engine_cls
+    assert loaded.version == engine.version
+    np.testing.assert_allclose(loaded.decision_scores(queries), engine.decision_scores(queries))
+    assert [r.id for r in loaded.predict(queries[0], top_k=3)] == [r.id for r in engine.predict(queries[0], top_k=3)]
+
+def test_artifact_has_no_pickles(tmp_path, dataset):
+    routes, sessions = dataset
+    engine = KNNSailorEngine()
+    engine.fit(routes, sessions)
+    artifact_dir = engine.save_artifact("model", str(tmp_path))
+
+    manifest = read_manifest(artifact_dir)
+    assert manifest["format_version"] == ARTIFACT_FORMAT_VERSION
+    assert manifest["engine"] == "KNNSailorEngine"
+    assert all(entry["dtype"] != "object" for entry in manifest["arrays"].values())
+    assert not [f for f in os.listdir(artifact_dir) if f.endswith(".pkl")]
+
+def test_verify_detects_corrupted_arrays(tmp_path, dataset):
+    routes, sessions = dataset
+    engine = SVCSailorEngine()
+    engine.fit(routes, sessions)
+    artifact_dir = engine.save_artifact("model", str(tmp_path))
+
+    coef_path = os.path.join(artifact_dir, "svc_coef.npy")
+    coef = np.load(coef_path)
+    np.save(coef_path, coef + 1)
+
+    with pytest.raises(ValueError, match="corrupted"):
+        SailorEngine.load_artifact(artifact_dir, verify=True)
+
+def test_packed_strings_round_trip():
+    values = ["", "route", "rota çãé", "/a/b"]
+    assert unpack_strings(*pack_strings(values)) == values
+
+def test_rewrite_publishes_a_new_version_directory(tmp_path, dataset):
+    routes, sessions = dataset
+    engine = SVCSailorEngine()
+    engine.fit(routes, sessions)
+
+    engine.version = "v1"
+    artifact_dir = engine.save_artifact("model", str(tmp_path))
+    first = os.path.realpath(artifact_dir)
+    first_coef = np.load(os.path.join(artifact_dir, "svc_coef.npy"), mmap_mode="r")
+
+    engine.version = "v2"
+    engine.save_artifact("model", str(tmp_path))
+
+    assert os.path.islink(artifact_dir)
+    assert os.path.realpath(artifact_dir) != first
+    # Files a reader already resolved stay untouched
+    assert read_manifest(first)["model_version"] == "v1"
+    np.testing.assert_array_equal(first_coef, np.load(os.path.join(first, "svc_coef.npy")))
+    assert SailorEngine.load_artifact(artifact_dir).version == "v2"
+
+def test_old_versions_are_pruned(tmp_path, dataset):
+    routes, sessions = dataset
+    engine = KNNSailorEngine()
+    engine.fit(routes, sessions)
+    for _ in range(5):
+        artifact_dir = engine.save_artifact("model", str(tmp_path))
+
+    versions = [entry for entry in os.listdir(tmp_path) if entry.startswith(".model@")]
+    assert len(versions) == 1 + model_artifact._KEEP_VERSIONS
+    assert os.path.basename(os.path.realpath(artifact_dir)) in versions
+
+def test_plain_directory_is_replaced_by_a_version(tmp_path, dataset):
+    routes, sessions = dataset
+    engine = SVCSailorEngine()
+    engine.fit(routes, sessions)
+    legacy_dir = tmp_path / "model"
+    legacy_dir.mkdir()
+    (legacy_dir / "manifest.json").write_text("{}")
+
+    artifact_dir = engine.save_artifact("model", str(tmp_path))
+
+    assert os.path.islink(artifact_dir)
+    assert SailorEngine.load_artifact(artifact_dir).version == engine.version
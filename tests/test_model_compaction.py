@@ -0,0 +1,61 @@
+import json
+import os
+import numpy as np
+import pytest
+
+from sailor import SailorEngine, SVCSailorEngine, KNNSailorEngine, CascadeSailorEngine, IncrementalSailorEngine, ModelCompactor
+from sailor.model_compaction import model_footprint
+
+@pytest.fixture(scope="module")
+def engines(dataset):
+    routes, sessions = dataset
+    engines = {}
+    for engine_cls in (SVCSailorEngine, KNNSailorEngine, CascadeSailorEngine):
+        engine = engine_cls()
+        engine.fit(routes, sessions)
+        engines[engine_cls] = engine
+    return engines
+
+@pytest.mark.parametrize("engine_cls", [SVCSailorEngine, KNNSailorEngine, CascadeSailorEngine])
+def test_compacted_engine_stays_within_tolerance(tmp_path, dataset, engines, engine_cls):
+    _, sessions = dataset
+    engine = engines[engine_cls]
+    report_path = str(tmp_path / "report.json")
+    compacted, report = ModelCompactor(tolerance=0.02).compact(engine, sessions, report_path=report_path)
+
+    chosen = report["compacted"]
+    assert chosen["within_tolerance"]
+    assert report["baseline"]["top_k_accuracy"] - chosen["top_k_accuracy"] <= 0.02
+    assert chosen["terms"] <= report["baseline"]["terms"]
+    assert model_footprint(compacted)["artifact_bytes"] <= model_footprint(engine)["artifact_bytes"]
+    with open(report_path) as f:
+        assert json.load(f)["compacted"] == chosen
+
+def test_compacted_artifact_round_trip(tmp_path, engines, queries):
+    compacted = engines[SVCSailorEngine].compact(0.5, "int8")
+    loaded = SailorEngine.load_artifact(compacted.save_artifact("model", str(tmp_path)), verify=True)
+    np.testing.assert_allclose(loaded.decision_scores(queries), compacted.decision_scores(queries), rtol=1e-6)
+
+def test_compacted_artifact_replaces_the_full_one(tmp_path, engines, queries):
+    engine = engines[KNNSailorEngine]
+    artifact_dir = engine.save_artifact("model", str(tmp_path))
+    compacted = engine.compact(0.5, "float32")
+    compacted.save_artifact("model", str(tmp_path))
+
+    # Nothing of the full model is left next to the compacted arrays
+    files = set(os.listdir(artifact_dir))
+    assert "compact_tfidf_terms.npy" in files
+    assert not {f for f in files if f.startswith("tfidf_")}
+    loaded = SailorEngine.load_artifact(artifact_dir)
+    np.testing.assert_allclose(loaded.decision_scores(queries), compacted.decision_scores(queries), rtol=1e-6)
+
+def test_unsupported_engines_raise(dataset, engines):
+    routes, sessions = dataset
+    incremental = IncrementalSailorEngine()
+    incremental.fit(routes, sessions)
+    with pytest.raises(ValueError, match="no TF-IDF vocabulary"):
+        incremental.compact()
+    with pytest.raises(ValueError, match="already compacted"):
+        engines[SVCSailorEngine].compact().compact()
+    with pytest.raises(ValueError, match="Unsupported compact dtype"):
+        engines[SVCSailorEngine].compact(dtype="float16")
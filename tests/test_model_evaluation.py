@@ -0,0 +1,36 @@
+from sailor import KNNSailorEngine, SVCSailorEngine
+from sailor.model_evaluation import DEFAULT_ENGINE_GRID, ModelEvaluator
+
+def test_knn_configs_larger_than_the_route_set_are_skipped(tmp_path, dataset):
+    routes, sessions = dataset
+    routes = routes[:4]
+    route_ids = {r.id for r in routes}
+    sessions = [s for s in sessions if s.target in route_ids]
+
+    evaluator = ModelEvaluator(
+        str(tmp_path),
+        engine_grid={**DEFAULT_ENGINE_GRID, "svc": (SVCSailorEngine, {"svc__C": [1.0]})},
+        tfidf_grid={"min_df": [1]},
+        n_splits=2,
+        max_workers=1)
+    report = evaluator.evaluate(routes, sessions, str(tmp_path / "report.json"))
+
+    knn_results = [r for r in report["results"] if r["engine"] == "knn"]
+    assert [r["params"]["knn__n_neighbors"] for r in knn_results] == [3]
+    assert set(report["best"]) == {"svc", "knn"}
+    assert (tmp_path / "report.json").exists()
+
+def test_grid_without_a_fitting_config_has_no_best(tmp_path, dataset):
+    routes, sessions = dataset
+    routes = routes[:2]
+    route_ids = {r.id for r in routes}
+    sessions = [s for s in sessions if s.target in route_ids]
+
+    evaluator = ModelEvaluator(
+        str(tmp_path),
+        engine_grid={"knn": (KNNSailorEngine, {"knn__n_neighbors": [3, 5]})},
+        tfidf_grid={"min_df": [1]},
+        n_splits=2,
+        max_workers=1)
+    report = evaluator.evaluate(routes, sessions)
+    assert report["results"] == [] and report["best"] == {}
@@ -0,0 +1,98 @@
+import asyncio
+import pickle
+import threading
+import numpy as np
+import pytest
+
+from api import models_loader
+from api.models_loader import SearchModelLoader, resident_size
+from sailor import SailorEngine, SVCSailorEngine
+
+@pytest.fixture(scope="module")
+def engine(dataset):
+    routes, sessions = dataset
+    engine = SVCSailorEngine()
+    engine.fit(routes, sessions)
+    return engine
+
+@pytest.fixture
+def model_dir(tmp_path, monkeypatch):
+    monkeypatch.setattr(models_loader, "_MODEL_DIR", tmp_path)
+    return tmp_path
+
+def test_load_is_shared_by_concurrent_callers(model_dir, engine):
+    engine.save_artifact("svc_model", str(model_dir))
+    loader = SearchModelLoader()
+
+    async def run():
+        return await asyncio.gather(loader.load_svc(), loader.load_svc())
+
+    first, second = asyncio.run(run())
+    assert first is second
+
+def test_reload_does_not_join_a_load_in_flight(model_dir, engine, monkeypatch):
+    engine.version = "v1"
+    engine.save_artifact("svc_model", str(model_dir))
+    loader = SearchModelLoader()
+
+    load_artifact = SailorEngine.load_artifact
+    first_read = threading.Event()
+    release = threading.Event()
+    def slow_first_load(*args, **kwargs):
+        model = load_artifact(*args, **kwargs)
+        if not first_read.is_set():
+            first_read.set()
+            release.wait(5)
+        return model
+    monkeypatch.setattr(SailorEngine, "load_artifact", staticmethod(slow_first_load))
+
+    async def run():
+        stale = asyncio.ensure_future(loader.load_svc())
+        await asyncio.to_thread(first_read.wait, 5)
+
+        engine.version = "v2"
+        engine.save_artifact("svc_model", str(model_dir))
+        reloaded = await loader.reload("svc_model")
+        release.set()
+        return await stale, reloaded
+
+    stale, reloaded = asyncio.run(run())
+    assert reloaded.version == "v2"
+    # The older load finishing last doesn't swap the previous version back in
+    assert stale.version == "v2"
+    assert loader.models[(None, "svc_model")].version == "v2"
+
+def test_least_recently_used_model_is_evicted_over_the_memory_budget(model_dir, engine):
+    engine.save_artifact("svc_model", str(model_dir))
+    engine.save_artifact("svc_model", str(model_dir / "tenant"))
+    loader = SearchModelLoader(memory_budget_mb=0)
+
+    asyncio.run(loader.load_svc())
+    size = loader.memory_usage
+    assert size > 0
+    loader.memory_budget = size
+
+    asyncio.run(loader.load_svc("tenant"))
+    assert list(loader.models) == [("tenant", "svc_model")]
+    assert loader.memory_usage == size
+
+def test_resident_size_counts_arrays_by_nbytes():
+    array = np.zeros((1000, 100))
+    # Shared arrays count once, the rest is measured by its pickled size
+    state = {"weights": array, "alias": array, "labels": ["a", "b"]}
+    rest = len(pickle.dumps({"weights": None, "alias": None, "labels": ["a", "b"]}, protocol=pickle.HIGHEST_PROTOCOL))
+
+    assert array.nbytes < resident_size(state) < array.nbytes + rest + 64
+
+def test_resident_size_is_close_for_mapped_and_pickled_models(model_dir, engine):
+    engine.save_artifact("svc_model", str(model_dir))
+    (model_dir / "knn_model.pkl").write_bytes(pickle.dumps(engine))
+    loader = SearchModelLoader()
+
+    asyncio.run(loader.load_svc())
+    asyncio.run(loader.load_knn())
+    stats = {s["model"]: s for s in loader.stats()}
+    assert stats["knn_model"]["size_bytes"] == resident_size(engine)
+    # Mapped arrays count in full, only the layout of the remaining state differs
+    assert stats["svc_model"]["size_bytes"] == pytest.approx(stats["knn_model"]["size_bytes"], rel=0.1)
+    assert stats["svc_model"]["disk_bytes"] > 0
@@ -0,0 +1,112 @@
+import asyncio
+import time
+import httpx
+import pytest
+from openai import RateLimitError
+
+from sailor import RouteGenConfig, SailorDataEngineer
+from sailor.rate_controller import AdaptiveRateController, retry_after
+from sailor.types import RouteSpec
+
+def _rate_limit_error(headers: dict) -> RateLimitError:
+    response = httpx.Response(429, headers=headers, request=httpx.Request("POST", "http://mock/v1/chat/completions"))
+    return RateLimitError("Rate limit reached", response=response, body=None)
+
+def test_retry_after_reads_provider_hints():
+    assert retry_after(_rate_limit_error({"retry-after-ms": "250"})) == 0.25
+    assert retry_after(_rate_limit_error({"retry-after": "2"})) == 2.0
+    assert retry_after(_rate_limit_error({})) is None
+    assert retry_after(ValueError()) is None
+
+def test_rate_limit_halves_the_limit_and_pauses():
+    controller = AdaptiveRateController(initial_concurrency=8)
+    calls = []
+
+    async def request():
+        calls.append(time.monotonic())
+        if len(calls) == 1:
+            raise _rate_limit_error({"retry-after-ms": "50"})
+        return "ok"
+
+    assert asyncio.run(controller.run(request)) == "ok"
+    assert controller.stats["rate_limited"] == 1 and controller.stats["retried"] == 1
+    assert int(controller.limit) == 4
+    assert calls[1] - calls[0] >= 0.05
+
+def test_successes_grow_the_limit_additively():
+    # Instant requests have noisy latencies, only rate limits may shrink the limit here
+    controller = AdaptiveRateController(initial_concurrency=2, max_concurrency=3, latency_tolerance=float("inf"))
+
+    async def request():
+        return None
+
+    async def run():
+        for _ in range(20):
+            await controller.run(request)
+
+    asyncio.run(run())
+    assert controller.limit == 3.0
+
+def test_raised_limit_admits_waiting_requests():
+    controller = AdaptiveRateController(initial_concurrency=1)
+
+    async def run():
+        await controller._acquire()
+        waiter = asyncio.ensure_future(controller._acquire())
+        await asyncio.sleep(0.01)
+        assert not waiter.done()
+
+        # No slot is released, only the limit grows
+        await controller._on_success(0.01)
+        await asyncio.wait_for(waiter, timeout=1)
+        assert controller._in_flight == 2
+
+    asyncio.run(run())
+
+def test_cancelled_requests_release_their_slots():
+    controller = AdaptiveRateController(initial_concurrency=2)
+
+    async def hang():
+        await asyncio.Event().wait()
+
+    async def request():
+        return "ok"
+
+    async def run():
+        # One cancelled in the request, one while waiting out a pause after taking its slot
+        in_request = asyncio.ensure_future(controller.run(hang))
+        await asyncio.sleep(0.01)
+        controller._paused_until = time.monotonic() + 60
+        in_pause = asyncio.ensure_future(controller.run(request))
+        await asyncio.sleep(0.01)
+        assert controller._in_flight == 2
+
+        for task in (in_request, in_pause):
+            task.cancel()
+        await asyncio.gather(in_request, in_pause, return_exceptions=True)
+        assert controller._in_flight == 0
+
+        controller._paused_until = 0.0
+        return await asyncio.wait_for(controller.run(request), timeout=1)
+
+    assert asyncio.run(run()) == "ok"
+    assert controller.limit == 2.0 + 1 / 2.0
+
+def test_controller_stays_within_the_mock_server_quota(mock_openai_server):
+    engineer = SailorDataEngineer(
+        RouteGenConfig(api_key="test", model="mock", base_url=f"{mock_openai_server}/v1"),
+        controller=AdaptiveRateController(initial_concurrency=16, backoff_base=0.05))
+    route = RouteSpec(id="route", path="/billing/invoice/create", tags=["billing", "invoice"])
+    before = httpx.get(f"{mock_openai_server}/stats").json()
+
+    async def run():
+        return await asyncio.gather(*(engineer.generate_session_batch(route, 5, variant=str(i)) for i in range(20)))
+
+    batches = asyncio.run(run())
+    stats = httpx.get(f"{mock_openai_server}/stats").json()
+
+    assert all(len(batch) == 5 for batch in batches)
+    assert engineer.controller.stats["failed"] == 0
+    assert stats["accepted"] - before["accepted"] == 20
+    assert engineer.controller.stats["rate_limited"] == stats["rejected"] - before["rejected"] > 0
+    assert int(engineer.controller.limit) < 16
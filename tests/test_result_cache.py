@@ -0,0 +1,69 @@
+import pytest
+
+from api import result_cache
+from api.result_cache import QueryResultCache, SessionStateCache, normalize_query
+
+def test_normalize_query_ignores_case_and_spacing():
+    assert normalize_query("  Book   a\tFlight ") == "book a flight"
+
+def test_normalize_query_matches_token_boundaries():
+    # Punctuation separates tokens like spaces do, underscores stay inside terms
+    assert normalize_query("user-list") == normalize_query("user list")
+    assert normalize_query("Users, list!") == "users list"
+    assert normalize_query("user_list") != normalize_query("user list")
+
+def test_queries_differing_by_case_share_an_entry():
+    cache = QueryResultCache(max_size=10, ttl_seconds=60)
+    cache.set(cache.key("svc", "v1", "Book Flight"), ["route"])
+
+    assert cache.get(cache.key("svc", "v1", "book  flight")) == ["route"]
+    assert cache.get(cache.key("svc", "v2", "book flight")) is None
+    assert cache.get(cache.key("svc", "v1", "book flight", 5)) is None
+
+def test_least_recently_used_entry_is_evicted():
+    cache = QueryResultCache(max_size=2, ttl_seconds=60)
+    a, b, c = (cache.key("svc", "v1", q) for q in "abc")
+    cache.set(a, 1)
+    cache.set(b, 2)
+    assert cache.get(a) == 1
+
+    cache.set(c, 3)
+    assert cache.get(b) is None
+    assert cache.get(a) == 1 and cache.get(c) == 3
+
+def test_entries_expire_after_ttl(monkeypatch):
+    now = [100.0]
+    monkeypatch.setattr(result_cache.time, "monotonic", lambda: now[0])
+    cache = QueryResultCache(max_size=10, ttl_seconds=5)
+    key = cache.key("svc", "v1", "query")
+    cache.set(key, "value")
+
+    now[0] += 4
+    assert cache.get(key) == "value"
+    now[0] += 2
+    assert cache.get(key) is None
+    assert cache.stats()["size"] == 0
+
+def test_invalidate_and_stats():
+    cache = QueryResultCache(max_size=10, ttl_seconds=60)
+    cache.set(cache.key("svc", "v1", "a"), 1)
+    cache.set(cache.key("knn", "v1", "a"), 2)
+    cache.invalidate("svc")
+
+    assert cache.get(cache.key("svc", "v1", "a")) is None
+    assert cache.get(cache.key("knn", "v1", "a")) == 2
+    stats = cache.stats()
+    assert (stats["hits"], stats["misses"], stats["size"]) == (1, 1, 1)
+    assert stats["hit_ratio"] == pytest.approx(0.5)
+
+def test_disabled_cache_stores_nothing():
+    cache = QueryResultCache(max_size=0)
+    key = cache.key("svc", "v1", "a")
+    cache.set(key, 1)
+    assert cache.get(key) is None
+
+def test_session_ids_are_not_normalized():
+    cache = SessionStateCache()
+    cache.set(cache.key("svc", "v1", "Client 1", "typeahead"), "state")
+    assert cache.get(cache.key("svc", "v1", "client  1", "typeahead")) is None
+    assert cache.get(cache.key("svc", "v1", "Client 1", "typeahead")) == "state"
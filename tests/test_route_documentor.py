@@ -0,0 +1,90 @@
+import pickle
+import string
+from typing import List
+import pytest
+
+from sailor import route_documentor, SVCSailorEngine
+from sailor.route_documentor import RouteDocumentor
+from sailor.types import RouteSpec, SessionSpec
+
+_routes = [
+    RouteSpec(id="invoices", path="/billing/invoices", tags=["billing", "invoice"]),
+    RouteSpec(id="users", path="/admin/users/", tags=["admin"]),
+    RouteSpec(id="empty", path="/settings", tags=[]),
+]
+
+# Sessions of a route next to each other, the old per-route scan skipped every second one
+_sessions = [
+    SessionSpec(id="1", route_id="invoices", context="Where are my unpaid invoices?"),
+    SessionSpec(id="2", route_id="invoices", context="download invoice pdf"),
+    SessionSpec(id="3", route_id="users", context="create a new user account"),
+    SessionSpec(id="4", route_id="invoices", context="invoice history for 2024"),
+    SessionSpec(id="5", route_id="users", context="reset the password of a user"),
+    SessionSpec(id="6", route_id="users", context="disable user"),
+    SessionSpec(id="7", route_id="unknown", context="orphan session"),
+]
+
+def _previous_context(tokenizer, route: RouteSpec, sessions: List[SessionSpec], skip_popped: bool) -> str:
+    """Per-route algorithm the documentor had before grouping, optionally with its pop-while-iterating skip"""
+    context = [path for path in route.path.split('/') if path not in string.punctuation]
+    context.extend(route.tags)
+
+    session_context: List[str] = []
+    for i, s in enumerate(sessions):
+        if s.target == route.id:
+            session_context.append(s.context)
+            if skip_popped: sessions.pop(i)
+
+    docs = tokenizer.pipe(session_context)
+    context.append(" ".join(t.text for d in docs for t in d if not t.is_stop and t.is_alpha))
+    return " ".join(context)
+
+@pytest.fixture
+def tokenizer_loads(monkeypatch, blank_tokenizer):
+    loads = []
+    def load(model=route_documentor._SPACY_MODEL):
+        loads.append(model)
+        return blank_tokenizer
+    monkeypatch.setattr(route_documentor, "_load_tokenizer", load)
+    return loads
+
+def test_spacy_is_loaded_on_fit_only(tokenizer_loads, dataset, queries):
+    routes, sessions = dataset
+    engine = SVCSailorEngine()
+    assert tokenizer_loads == []
+
+    engine.fit(routes, sessions)
+    assert tokenizer_loads == [route_documentor._SPACY_MODEL]
+
+    payload = pickle.dumps(engine)
+    assert b"spacy" not in payload
+    restored = pickle.loads(payload)
+    restored.predict(queries[0], top_k=3)
+    assert len(tokenizer_loads) == 1
+
+    # Refitting a restored engine loads it again on first use
+    restored.fit(routes, sessions)
+    assert len(tokenizer_loads) == 2
+
+def test_unused_pipeline_components_are_excluded():
+    assert {"parser", "ner", "lemmatizer", "tagger", "vectors"} <= set(route_documentor._SPACY_EXCLUDE)
+    assert "_tokenizer" not in vars(RouteDocumentor())
+
+def test_contexts_match_the_previous_per_route_algorithm(blank_tokenizer):
+    documentor = RouteDocumentor(batch_size=2)
+    documentor.fit_transform(_routes, _sessions)
+
+    expected = [_previous_context(blank_tokenizer, r, list(_sessions), skip_popped=False) for r in _routes]
+    assert [documentor.get_route(r.id).context for r in _routes] == expected
+    assert documentor.get_route("invoices").context == "billing invoices billing invoice unpaid invoices download invoice pdf invoice history"
+
+def test_adjacent_sessions_are_not_skipped(blank_tokenizer):
+    remaining = list(_sessions)
+    popped = [_previous_context(blank_tokenizer, r, remaining, skip_popped=True) for r in _routes]
+    documentor = RouteDocumentor()
+    documentor.fit_transform(_routes, _sessions)
+
+    # The old loop lost "download invoice pdf" and "reset the password of a user"
+    assert "download" not in popped[0] and "password" not in popped[1]
+    assert "download" in documentor.get_route("invoices").context
+    assert "password" in documentor.get_route("users").context
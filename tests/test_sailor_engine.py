@@ -0,0 +1,83 @@
+import numpy as np
+import pytest
+
+from api.result_cache import normalize_query
+from sailor import SVCSailorEngine, KNNSailorEngine, IncrementalSailorEngine
+
+@pytest.fixture(scope="module", params=[SVCSailorEngine, KNNSailorEngine])
+def engine(request, dataset):
+    routes, sessions = dataset
+    engine = request.param()
+    engine.fit(routes, sessions)
+    return engine
+
+@pytest.mark.parametrize("top_k", [None, 1, 5])
+def test_predict_batch_matches_predict(engine, queries, top_k):
+    batch = engine.predict_batch(queries, top_k=top_k)
+
+    assert len(batch) == len(queries)
+    for query, routes in zip(queries, batch):
+        single = engine.predict(query, top_k=top_k)
+        assert [r.id for r in routes] == [r.id for r in single]
+        assert [r.score for r in routes] == pytest.approx([r.score for r in single])
+
+def test_predict_batch_keeps_none_queries_in_place(engine, queries):
+    batch = engine.predict_batch([None, queries[0], None], top_k=3)
+
+    assert batch[0] == [] and batch[2] == []
+    assert [r.id for r in batch[1]] == [r.id for r in engine.predict(queries[0], top_k=3)]
+
+def test_predict_batch_ranks_by_score(engine, queries):
+    for routes in engine.predict_batch(queries[:5]):
+        scores = [r.score for r in routes]
+        assert scores == sorted(scores, reverse=True)
+        assert len(routes) == len(engine.documentor.label_routes)
+
+# liblinear shuffles samples, seeded so both fits see the same order
+@pytest.mark.parametrize("engine_cls, params", [(SVCSailorEngine, {"svc__random_state": 0}), (KNNSailorEngine, {})])
+def test_fit_stream_matches_fit(dataset, queries, engine_cls, params):
+    routes, sessions = dataset
+    engine = engine_cls()
+    engine.pipeline.set_params(**params)
+    engine.fit(routes, sessions)
+    streamed = engine_cls()
+    streamed.pipeline.set_params(**params)
+    streamed.fit_stream(routes, (sessions[i:i + 7] for i in range(0, len(sessions), 7)))
+
+    assert [r.context for r in streamed.documentor.label_routes] == [r.context for r in engine.documentor.label_routes]
+    np.testing.assert_allclose(streamed.decision_scores(queries), engine.decision_scores(queries))
+
+def test_incremental_refit_forgets_previous_routes(dataset, queries):
+    routes, sessions = dataset
+    first, second = routes[:10], routes[10:]
+    second_ids = {r.id for r in second}
+    second_sessions = [s for s in sessions if s.target in second_ids]
+
+    engine = IncrementalSailorEngine()
+    engine.fit(first, [s for s in sessions if s.target not in second_ids])
+    engine.fit(second, second_sessions)
+    fresh = IncrementalSailorEngine()
+    fresh.fit(second, second_sessions)
+
+    assert [r.id for r in engine.documentor.label_routes] == [r.id for r in second]
+    assert {r.id for r in engine.predict(queries[0])} == second_ids
+    np.testing.assert_allclose(engine.decision_scores(queries), fresh.decision_scores(queries))
+
+@pytest.mark.parametrize("top_k", [1, 3, 7, 20, 25])
+def test_scored_routes_top_k_matches_full_sort(dataset, top_k):
+    routes, sessions = dataset
+    engine = SVCSailorEngine()
+    engine.fit(routes, sessions)
+    rng = np.random.default_rng(top_k)
+    # Few distinct values, ties inside the top-k and across its cut
+    scores = rng.integers(0, 4, len(routes)).astype(np.float64)
+
+    full = [engine.documentor.label_routes[i].id for i in np.argsort(-scores, kind="stable")]
+    ranked = engine.scored_routes(scores, top_k=top_k)
+    assert [r.id for r in ranked] == full[:top_k]
+    assert [r.score for r in ranked] == sorted(scores, reverse=True)[:top_k]
+
+def test_queries_equal_after_cache_normalization_rank_the_same(engine, queries):
+    query = queries[0].replace(" ", "-", 1) + "?"
+    assert normalize_query(query) == normalize_query(queries[0])
+    np.testing.assert_allclose(engine.decision_scores([query]), engine.decision_scores([queries[0]]))
@@ -0,0 +1,36 @@
+import pytest
+
+from sailor.synthetic_data import SyntheticDataGenerator
+from scripts.benchmark import compare
+
+def test_same_seed_yields_the_same_data():
+    first, second = SyntheticDataGenerator(seed=3), SyntheticDataGenerator(seed=3)
+    routes = first.generate_routes(10)
+    assert routes == second.generate_routes(10)
+    assert first.generate_sessions(routes, 5) == second.generate_sessions(routes, 5)
+    assert routes != SyntheticDataGenerator(seed=4).generate_routes(10)
+
+def test_routes_and_sessions_have_the_generated_shape():
+    generator = SyntheticDataGenerator()
+    routes = generator.generate_routes(30)
+    sessions = generator.generate_sessions(routes, 4)
+
+    assert len({r.id for r in routes}) == len({r.path for r in routes}) == 30
+    for route in routes:
+        module, entity, action = route.path.strip("/").split("/")
+        assert route.tags[:3] == [module, entity, action]
+    assert len(sessions) == 4 * len(routes)
+    assert {s.target for s in sessions} == {r.id for r in routes}
+    assert all(s.context for s in sessions)
+
+def test_route_count_is_bounded():
+    with pytest.raises(ValueError, match="synthetic routes"):
+        SyntheticDataGenerator().generate_routes(10**6)
+
+def test_compare_flags_regressions_in_both_directions():
+    baseline = {"predict_ms_p95": 10.0, "http_requests_per_second": 100.0, "fit_seconds": 0.0}
+    results = {"predict_ms_p95": 13.0, "http_requests_per_second": 70.0, "fit_seconds": 5.0, "new_metric": 1.0}
+
+    regressions = compare(results, baseline, tolerance=0.2)
+    assert [r.split(":")[0] for r in regressions] == ["predict_ms_p95", "http_requests_per_second"]
+    assert compare({"predict_ms_p95": 11.0, "http_requests_per_second": 120.0}, baseline, tolerance=0.2) == []
@@ -0,0 +1,71 @@
+import numpy as np
+import pytest
+from sklearn.feature_extraction.text import TfidfVectorizer
+
+from sailor import training_pipeline, SailorEngine, SVCSailorEngine, KNNSailorEngine, TrainingPipeline
+from sailor.training_pipeline import build_features, data_hash, load_features
+
+def _engines():
+    svc = SVCSailorEngine()
+    svc.pipeline.set_params(svc__random_state=0)
+    return {"svc_model": svc, "knn_model": KNNSailorEngine()}
+
+@pytest.fixture
+def feature_builds(monkeypatch):
+    builds = []
+    def counting_build(routes, sessions, features_dir, tfidf=None):
+        builds.append(features_dir)
+        return build_features(routes, sessions, features_dir, tfidf=tfidf)
+    monkeypatch.setattr(training_pipeline, "build_features", counting_build)
+    return builds
+
+def test_data_hash_follows_data_and_vectorizer_params(dataset):
+    routes, sessions = dataset
+    tfidf = TfidfVectorizer(stop_words='english')
+    assert data_hash(routes, sessions, tfidf) == data_hash(list(routes), list(sessions), TfidfVectorizer(stop_words='english'))
+    assert data_hash(routes, sessions[:-1], tfidf) != data_hash(routes, sessions, tfidf)
+    assert data_hash(routes, sessions, TfidfVectorizer()) != data_hash(routes, sessions, tfidf)
+
+def test_engines_share_one_fitted_vectorizer(tmp_path, dataset, monkeypatch):
+    routes, sessions = dataset
+    fits = []
+    fit_transform = TfidfVectorizer.fit_transform
+    def counting_fit_transform(self, *args, **kwargs):
+        fits.append(self)
+        return fit_transform(self, *args, **kwargs)
+    monkeypatch.setattr(TfidfVectorizer, "fit_transform", counting_fit_transform)
+
+    features_dir = build_features(routes, sessions, str(tmp_path / "features"))
+    shared = load_features(features_dir)
+    engines = _engines()
+    for engine in engines.values():
+        engine.fit_features(*shared)
+
+    assert len(fits) == 1
+    assert all(engine.pipeline.named_steps['tfidf'] is shared[3] for engine in engines.values())
+
+def test_unchanged_data_reuses_the_cached_features(tmp_path, dataset, feature_builds):
+    routes, sessions = dataset
+    pipeline = TrainingPipeline(_engines(), cache_dir=str(tmp_path))
+
+    features_dir = pipeline.features(routes, sessions)
+    assert pipeline.features(routes, sessions) == features_dir
+    assert feature_builds == [features_dir]
+
+    changed_dir = pipeline.features(routes, sessions[:-1])
+    assert changed_dir != features_dir
+    assert feature_builds == [features_dir, changed_dir]
+
+def test_parallel_artifacts_load_back_like_in_process_engines(tmp_path, dataset, queries, feature_builds):
+    routes, sessions = dataset
+    pipeline = TrainingPipeline(_engines(), cache_dir=str(tmp_path / "cache"), max_workers=2)
+    artifacts = pipeline.run(routes, sessions, str(tmp_path / "models"))
+    pipeline.run(routes, sessions, str(tmp_path / "models"))
+    assert len(feature_builds) == 1
+
+    shared = load_features(feature_builds[0])
+    for model_name, engine in _engines().items():
+        engine.fit_features(*shared)
+        loaded = SailorEngine.load_artifact(artifacts[model_name])
+        assert type(loaded) is type(engine)
+        np.testing.assert_allclose(loaded.decision_scores(queries), engine.decision_scores(queries), rtol=1e-6)
@@ -0,0 +1,99 @@
+import numpy as np
+import pytest
+from spacy.vocab import Vocab
+from types import SimpleNamespace
+
+from sailor import vector_engine, SailorEngine, VectorSailorEngine
+from sailor.types import RouteSpec, SessionSpec
+
+# Words per topic, each topic gets its own axis so synonyms share a direction
+_topics = {
+    "billing": ["invoice", "invoices", "bill", "payment", "receipt", "billing"],
+    "users": ["user", "users", "account", "member", "profile", "admin"],
+    "settings": ["settings", "preferences", "options", "configure", "theme"],
+}
+_rare_words = ["subscription"]
+
+_routes = [
+    RouteSpec(id="billing", path="/billing/invoices", tags=["billing"]),
+    RouteSpec(id="users", path="/admin/users", tags=["admin"]),
+    RouteSpec(id="settings", path="/settings", tags=["preferences"]),
+]
+
+_sessions = [
+    SessionSpec(id="1", route_id="billing", context="download my invoice"),
+    SessionSpec(id="2", route_id="billing", context="payment receipt"),
+    SessionSpec(id="3", route_id="users", context="create a member account"),
+    SessionSpec(id="4", route_id="users", context="edit user profile"),
+    SessionSpec(id="5", route_id="settings", context="change the theme options"),
+]
+
+def _vectors_vocab() -> Vocab:
+    vocab = Vocab()
+    rng = np.random.default_rng(0)
+    for axis, words in enumerate(_topics.values()):
+        for word in words:
+            vector = np.zeros(8, dtype=np.float32)
+            vector[axis] = 1.0
+            vector[3:] = rng.normal(scale=0.1, size=5)
+            vocab.set_vector(word, vector)
+    for word in _rare_words:
+        vocab.set_vector(word, np.eye(8, dtype=np.float32)[0])
+    return vocab
+
+@pytest.fixture
+def vectors_loads(monkeypatch):
+    loads = []
+    def load_vectors(model):
+        loads.append(model)
+        return SimpleNamespace(vocab=_vectors_vocab())
+    monkeypatch.setattr(vector_engine, "_load_vectors", load_vectors)
+    return loads
+
+@pytest.fixture
+def engine(vectors_loads):
+    engine = VectorSailorEngine()
+    engine.fit(_routes, _sessions)
+    return engine
+
+def test_synonyms_rank_their_route_first(engine, vectors_loads):
+    assert len(vectors_loads) == 1
+    # The first two share no word with their route's documents
+    assert engine.predict("bill")[0].id == "billing"
+    assert engine.predict("configure")[0].id == "settings"
+    assert engine.predict("member profile")[0].id == "users"
+
+def test_scores_are_cosine_similarities(engine):
+    scores = engine.decision_scores(["invoice", "member profile"])
+    assert scores.shape == (2, len(_routes))
+    assert np.all(scores <= 1 + 1e-6)
+    ranked = engine.predict("invoice")
+    assert [r.score for r in ranked] == sorted((r.score for r in ranked), reverse=True)
+
+def test_predict_batch_matches_predict(engine):
+    queries = ["invoice payment", "account", "theme", "unknown words only", ""]
+    for query, routes in zip(queries, engine.predict_batch(queries, top_k=2)):
+        expected = engine.predict(query, top_k=2)
+        assert [r.id for r in routes] == [r.id for r in expected], query
+        assert [r.score for r in routes] == pytest.approx([r.score for r in expected])
+
+def test_out_of_vocabulary_queries_score_zero(engine):
+    scores = engine.decision_scores(["qwerty zxcv", "1234", ""])
+    np.testing.assert_array_equal(scores, np.zeros((3, len(_routes)), dtype=np.float32))
+    assert len(engine.predict("qwerty zxcv")) == len(_routes)
+
+def test_rare_words_are_kept_only_when_documents_use_them(vectors_loads):
+    engine = VectorSailorEngine(max_vectors=3)
+    engine.fit(_routes, _sessions)
+    vocabulary = engine.pipeline.named_steps['vectors'].vocabulary_
+    assert "invoice" in vocabulary and "theme" in vocabulary
+    assert "subscription" not in vocabulary
+
+def test_artifact_round_trip(engine, tmp_path):
+    artifact_dir = engine.save_artifact("vector_model", str(tmp_path))
+    restored = SailorEngine.load_artifact(artifact_dir)
+
+    assert isinstance(restored, VectorSailorEngine)
+    queries = ["invoice", "edit profile", "qwerty"]
+    np.testing.assert_array_equal(restored.decision_scores(queries), engine.decision_scores(queries))
+    assert restored.pipeline.named_steps['vectors'].vocabulary_ == engine.pipeline.named_steps['vectors'].vocabulary_